@@ -1,26 +1,86 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for
+from flask import Flask, Response, g, request, jsonify, render_template, redirect, url_for
 from flask_cors import CORS
 
 
-import numpy as np
+import argparse
+import atexit
+import logging
 import math
-from pathfinding3d.core.grid import Grid
-from pathfinding3d.finder.a_star import AStarFinder
+import random
+import time
+
+import numpy as np
+
+import metrics
+from change_log import ChangeLog
+from path_cache import PathCache
+from persistence import Persistence
+from planning_pool import MineTask, PlanningPool, Tour, join_points, leg_snapshot
+from route_planner import RoutePlanner
+from scan_format import PaletteMismatch, decode_scan, record_size, scan_origin
+from scan_tracker import ScanTracker
+from survey import SurveyScheduler
+from task_allocator import allocate_targets, parse_fuel
+from task_queue import TaskQueue
+from turtle_registry import TurtleRegistry
+from veins import VeinIndex, is_vein_block, order_veins
+from waypoints import waypoint_commands
+from world_query import CELL_SIZES, FAR_MODES, OCCUPANCY_COLOR, encode_query, encode_unchanged, query_box, query_world, uncovered_blocks
+from world_store import AIR_ID, AIR_NAMES, WorldStore, pack_coords, sphere_offsets
 
 
 
 app = Flask(__name__)
 CORS(app)
 
-# --- Data Storage ---
-turtles = {}
-next_id = 1
+log = logging.getLogger(__name__)
 
-# Using a NumPy array for world block coordinates for memory efficiency.
-world_blocks = np.empty((0, 3), dtype=int)
-# Storing non-numerical block data (name, color) in a separate dictionary,
-# keyed by a coordinate string for easy lookup.
-block_info = {}
+# --- Data Storage ---
+# Shared between request threads: the registry, world store, path cache and
+# planning pool each guard their own state with a lock.
+turtles = TurtleRegistry()
+
+# Every scanned block, stored in chunk sections of palette-indexed IDs.
+world = WorldStore()
+# Pathfinding cost per palette index, see get_block_costs().
+block_costs = np.empty(0, dtype=np.uint8)
+# Viewer colour per palette index, see get_block_colors().
+block_colors = np.empty((0, 3), dtype=np.uint8)
+# The long-lived section graph, kept in sync with the world store. The
+# planning pool's routing thread searches it for each leg's abstract route
+# and the workers refine that route.
+route_planner = RoutePlanner(world, lambda: get_block_costs())
+# Recently planned long routes, evicted when their sections change.
+path_cache = PathCache(world)
+# Worker processes that plan queued legs off the request thread. Finished
+# jobs are queued straight away, waking turtles waiting in a long poll.
+planning_pool = PlanningPool(on_done=lambda job: apply_planned_jobs())
+# Each turtle's backlog of mine tasks, planned one at a time as the turtle
+# reaches them and planned again when scans change the terrain on the way.
+task_queue = TaskQueue(
+    lambda start, dest, callback: planning_pool.plan(
+        start, dest, lambda legs: leg_snapshot(route_planner, get_block_costs(), legs), callback),
+    lambda x, y, z: world.get_id(x, y, z) != AIR_ID,
+    on_ready=lambda turtle_id: release_tasks(turtle_id),
+)
+world.add_listener(task_queue.on_blocks_changed)
+# Ore blocks grouped into connected veins, each mined as one task.
+vein_index = VeinIndex(world)
+world.add_listener(vein_index.on_blocks_changed)
+# Versioned block changes, streamed to the world viewer as diffs.
+change_log = ChangeLog(world)
+# Identifies this server's block palette to turtles sending compact scan
+# reports. The palette is rebuilt on every start, so the epoch changes too.
+palette_epoch = random.randrange(1, 1 << 31)
+# Each turtle's last accepted scan, which its delta scan reports build on.
+scan_tracker = ScanTracker()
+# Which chunks turtles have scanned and how recently, and the background
+# survey that sends idle turtles to scan more (see /survey).
+survey = SurveyScheduler()
+# Snapshot and write-ahead log on disk, once open_data_dir() has run.
+persistence = None
+# Stack sampler behind /profiler, off unless started.
+profiler = metrics.SamplingProfiler()
 
 
 # Add any block name (e.g., "minecraft:lava", "minecraft:oak_log") to this set.
@@ -40,6 +100,91 @@ DIRECTIONS = {
     3: "West"
 }
 
+# Routes at least this long are cached and reused between turtles.
+PATH_CACHE_MIN_DISTANCE = 32
+
+# Request threads for the production (waitress) server. Each turtle waiting
+# in a long poll holds one, so keep this well above the fleet size.
+SERVER_THREADS = 64
+
+# Longest a /poll request may be held open waiting for commands. Kept under
+# ComputerCraft's 30 second HTTP timeout.
+LONG_POLL_MAX_WAIT = 25
+
+# /world_query defaults and limits, in blocks: the box returned around the
+# camera and the part of it sent block by block rather than summarised.
+QUERY_RADIUS = 128
+QUERY_MAX_RADIUS = 1024
+QUERY_NEAR = 32
+QUERY_MAX_NEAR = 64
+
+# Most veins /veins lists unless asked for more.
+VEIN_LIST_LIMIT = 100
+
+# Largest scan radius a report may claim (see scan_report). The geo
+# scanner's own limit is 16.
+MAX_SCAN_RADIUS = 16
+
+# Where the world and turtles are kept between restarts.
+DATA_DIR = "data"
+
+# --- Metrics ---
+# Served at /metrics; see metrics.py for the stage timers in the hot paths.
+REQUEST_SECONDS = metrics.registry.add(metrics.Histogram(
+    "turtle_http_request_seconds", "Time to handle a request, by route.", ("route", "method", "status")))
+
+def _queue_depths():
+    with turtles.lock:
+        return {(turtle_id,): turtles.queue_length(turtle_id) for turtle_id in turtles.ids()}
+
+for _metric in (
+    metrics.Callback("turtle_world_blocks", "Blocks in the world store.", lambda: len(world)),
+    metrics.Callback("turtle_world_sections", "Chunk sections holding blocks.", lambda: len(world.section_counts)),
+    metrics.Callback("turtle_world_observed_sections", "Chunk sections with observed positions, 512 bytes each.",
+                     lambda: world.observed.section_count),
+    metrics.Callback("turtle_palette_size", "Block names in the palette.", lambda: len(world.palette)),
+    metrics.Callback("turtle_turtles", "Registered turtles.", lambda: len(turtles)),
+    metrics.Callback("turtle_queue_depth", "Commands waiting in each turtle's queue.", _queue_depths,
+                     labels=("turtle",)),
+    metrics.Callback("turtle_planning_jobs", "Planning jobs on record, by status.",
+                     lambda: {(status,): n for status, n in planning_pool.status_counts().items()},
+                     labels=("status",)),
+    metrics.Callback("turtle_task_backlog", "Mine tasks waiting in each turtle's backlog.",
+                     lambda: {(turtle_id,): n for turtle_id, n in task_queue.task_counts().items()},
+                     labels=("turtle",)),
+    metrics.Callback("turtle_tasks_total", "Task backlog counters, see /tasks.",
+                     lambda: {(name,): n for name, n in task_queue.snapshot().items() if name != "backlogs"},
+                     kind="counter", labels=("stat",)),
+    metrics.Callback("turtle_path_cache_entries", "Routes in the path cache.", lambda: len(path_cache)),
+    metrics.Callback("turtle_world_version", "Change log version of the world.", lambda: change_log.version),
+    metrics.Callback("turtle_wal_bytes", "Size of the write-ahead log.",
+                     lambda: persistence.log_size() if persistence else None),
+    metrics.Callback("turtle_scan_total", "Scan report counters, see /scan_stats.",
+                     lambda: {(name,): n for name, n in scan_tracker.snapshot().items()},
+                     kind="counter", labels=("stat",)),
+    metrics.Callback("turtle_survey_coverage", "Share of the survey area scanned recently.",
+                     lambda: survey.snapshot()["coverage"]),
+    metrics.Callback("process_resident_memory_bytes", "Resident memory of the server process.",
+                     metrics.process_memory_bytes),
+):
+    metrics.registry.add(_metric)
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_time(response):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method, response.status_code)
+    return response
+
+def _is_idle(turtle_id):
+    return not (turtles.queue_length(turtle_id) or planning_pool.has_pending(turtle_id)
+                or task_queue.has_tasks(turtle_id))
+
 def get_best_turtle():
     """
     Finds the best turtle to receive a new command.
@@ -55,26 +200,33 @@ def get_best_turtle():
     Returns:
         str: The ID of the selected turtle, or None if no turtles are available.
     """
+    turtle_ids = turtles.ids()
+
     # Return None immediately if there are no turtles registered.
-    if not turtles:
+    if not turtle_ids:
         return None
 
     # First priority: Find any turtle that is completely idle.
-    # An idle turtle is one with an empty command queue.
-    for turtle_id, turtle_data in turtles.items():
-        if not turtle_data['queue']:
-            print(f"Found idle turtle: {turtle_id}")
+    # An idle turtle is one with an empty command queue and nothing being planned
+    # or waiting in its task backlog.
+    for turtle_id in turtle_ids:
+        if _is_idle(turtle_id):
+            log.debug("Found idle turtle: %s", turtle_id)
             return turtle_id
 
     # If no idle turtles were found, find the one with the shortest queue.
     # This is achieved by using the min() function on the turtle IDs,
     # with a key that specifies we should compare them based on the length
     # of their command queue.
-    best_turtle = min(turtles, key=lambda tid: len(turtles[tid]['queue']))
-    print(f"No idle turtles. Found turtle with shortest queue: {best_turtle}")
+    best_turtle = min(turtle_ids, key=turtles.queue_length)
+    log.debug("No idle turtles. Found turtle with shortest queue: %s", best_turtle)
     
     return best_turtle
 
+def get_idle_turtles():
+    """Returns the IDs of every turtle with an empty queue and nothing being planned or backlogged."""
+    return [turtle_id for turtle_id in turtles.ids() if _is_idle(turtle_id)]
+
 def get_block_properties(block_name):
     """Returns the color and pathfinding cost for a given block name."""
     
@@ -92,42 +244,37 @@ def get_block_properties(block_name):
     else:
         return "#808080", 1
 
-def translate_path_to_waypoint_commands(path):
+def get_block_costs():
     """
-    Converts a path into an optimized list of goto() commands, only issuing
-    a command when the direction of travel changes.
-    """
-    if len(path) < 2:
-        return []
-
-    waypoints = []
-    # Calculate the initial direction vector.
-    last_direction = (
-        path[1][0] - path[0][0],
-        path[1][1] - path[0][1],
-        path[1][2] - path[0][2],
-    )
-
-    # Iterate from the third point to the end.
-    for i in range(2, len(path)):
-        # Calculate the vector from the previous point to the current one.
-        current_direction = (
-            path[i][0] - path[i-1][0],
-            path[i][1] - path[i-1][1],
-            path[i][2] - path[i-1][2],
-        )
-        
-        # If the direction changes, the previous point was a "corner".
-        if current_direction != last_direction:
-            waypoints.append(path[i-1])
-            last_direction = current_direction
+    Returns a uint8 array mapping palette index -> pathfinding cost.
 
-    # The final destination is always the last waypoint.
-    waypoints.append(path[-1])
+    get_block_properties is only called once per palette entry; the table
+    is extended as new block names show up in the world store.
+    """
+    global block_costs
+    with world.lock:
+        known = len(block_costs)
+        if known < len(world.palette):
+            new_costs = [get_block_properties(name)[1] for name in world.palette[known:]]
+            block_costs = np.concatenate([block_costs, np.array(new_costs, dtype=np.uint8)])
+        return block_costs
+
+def get_block_colors():
+    """Returns a (palette size, 3) uint8 array of viewer colours, extended like get_block_costs."""
+    global block_colors
+    with world.lock:
+        known = len(block_colors)
+        if known < len(world.palette):
+            new_colors = [bytes.fromhex(get_block_properties(name)[0][1:]) for name in world.palette[known:]]
+            block_colors = np.concatenate([block_colors, np.frombuffer(b"".join(new_colors), dtype=np.uint8).reshape(-1, 3)])
+        return block_colors
 
-    # Format the waypoints into goto commands.
-    commands = [f"goto {p[0]} {p[1]} {p[2]}" for p in waypoints]
-    return commands
+def translate_path_to_waypoint_commands(path):
+    """
+    Converts a path into goto() commands. A command is only issued where the
+    turtle's goto, which moves along y, then z, then x, would leave the path.
+    """
+    return waypoint_commands(path)
 
 def get_chunk_center(x, y, z):
   """
@@ -161,128 +308,250 @@ def get_chunk_center(x, y, z):
   
   return (center_x, y, center_z)
 
+def dispatch_survey(turtle_id):
+    """
+    Sends an idle turtle to sweep the chunk the survey most wants scanned,
+    if the survey is on and the turtle has nothing else to do.
+
+    Returns:
+        PlanningJob: The job, or None if the turtle was left alone.
+    """
+    if not survey.wants(turtle_id):
+        return None
+    if not _is_idle(turtle_id):
+        return None
+    status = turtles.status(turtle_id)
+    try:
+        start = (int(status['x']), int(status['y']), int(status['z']))
+    except (KeyError, TypeError, ValueError):
+        return None
+    chunk = survey.assign(turtle_id, start, parse_fuel(status))
+    if chunk is None:
+        return None
+    # Plan the way over to the chunk's centre column; scanChunk sweeps it from there.
+    center = get_chunk_center(chunk[0] * 16, start[1], chunk[1] * 16)
+    log.debug("Survey: turtle %s scans chunk %s", turtle_id, chunk)
+    return queue_steps(turtle_id, [(start, center), f"scanChunk {chunk[0]} {chunk[1]}"])
+
 def response_to_alone_turtle():
     return jsonify({"error": "re-register"}), 200
 
+def clear_turtle_position(status):
+    """
+    The block a turtle is standing in has been dug out (or was never there),
+    so drop it from the world store and mark it observed. This is what keeps
+    mined ores out of the block index.
+    """
+    try:
+        x, y, z = int(status['x']), int(status['y']), int(status['z'])
+    except (KeyError, TypeError, ValueError):
+        return
+    with world.lock:
+        world.remove_block(x, y, z)
+        world.observed.observe((x, y, z))
+
 
 
-def path_to_block(turtle_id, start_x, start_y, start_z, dest_x, dest_y, dest_z):
-    global world_blocks
-    
-    # Determine grid boundaries
-    min_x = min(start_x, dest_x) - 5
-    max_x = max(start_x, dest_x) + 5
-    min_y = min(start_y, dest_y) - 5
-    max_y = max(start_y, dest_y) + 5
-    min_z = min(start_z, dest_z) - 5
-    max_z = max(start_z, dest_z) + 5
-
-    # Create cost matrix
-    grid_matrix = np.ones((max_x - min_x + 1, max_y - min_y + 1, max_z - min_z + 1), dtype=np.uint8)
-    
-    # Populate with known block costs
-    for coords in world_blocks:
-        x, y, z = coords
-        if min_x <= x <= max_x and min_y <= y <= max_y and min_z <= z <= max_z:
-            block_key = f"{x},{y},{z}"
-            name = block_info.get(block_key, {}).get('name', 'unknown')
-            
-            _, cost = get_block_properties(name)
-            
-            grid_matrix[x - min_x, y - min_y, z - min_z] = cost
+def queue_steps(turtle_id, steps):
+    """
+    Queues an ordered mix of command strings, (start, dest) legs and
+    MineTasks for a turtle. Legs are planned in the worker pool and become
+    goto commands; long legs near a cached route are planned only onto
+    and off it. MineTasks go to the turtle's task backlog, planned later.
 
-    grid = Grid(matrix=grid_matrix)
-    start_node = grid.node(start_x - min_x, start_y - min_y, start_z - min_z)
-    end_node = grid.node(dest_x - min_x, dest_y - min_y, dest_z - min_z)
+    Returns:
+        PlanningJob: The job, whose ID can be polled at /jobs/<job_id>.
+    """
+    joins = {}
+    for index, step in enumerate(steps):
+        if isinstance(step, (str, MineTask, Tour)):
+            continue
+        start, dest = step
+        if sum(abs(d - s) for s, d in zip(start, dest)) < PATH_CACHE_MIN_DISTANCE:
+            continue
+        cached = path_cache.get(start, dest)
+        if cached is not None:
+            enter, leave = join_points(start, dest, cached)
+            joins[index] = cached[enter:leave + 1]
+
+    costs = get_block_costs()
+    job = planning_pool.submit(
+        turtle_id, steps, joins,
+        lambda legs: leg_snapshot(route_planner, costs, legs),
+    )
+    apply_planned_jobs()
+    return job
+
+def apply_planned_jobs():
+    """
+    Moves the commands of finished planning jobs onto their turtles' queues.
 
-    finder = AStarFinder()
-    path, _ = finder.find_path(start_node, end_node, grid)
+    Runs under the registry lock so that two request threads collecting jobs
+    for the same turtle cannot queue them out of order. Turtles whose jobs
+    went to their task backlog are then offered their next task.
+    """
+    with turtles.lock:
+        backlogged = {job.turtle_id for job in planning_pool.collect() if _apply_job(job)}
+    for turtle_id in backlogged:
+        release_tasks(turtle_id)
 
-    if path:
-        # Translate grid path back to world coordinates
-        world_path = [(p.x + min_x, p.y + min_y, p.z + min_z) for p in path]
-        
+def _apply_job(job):
+    """
+    Translates one finished job into commands on its turtle's queue, or
+    into its task backlog if the job has MineTasks or the backlog already
+    holds work that must run first. Returns True in the latter case.
+    """
+    if job.turtle_id not in turtles:
+        return False
+    commands = []
+    for index, step in enumerate(job.steps):
+        if isinstance(step, (str, MineTask)):
+            commands.append(step)
+            continue
+        if isinstance(step, Tour):
+            # The tasks in the worker's order, or as given if that failed.
+            commands.extend(job.paths.get(index) or step.tasks)
+            continue
+        path = job.paths.get(index)
+        if not path:
+            continue
+        start, dest = step
+        if sum(abs(d - s) for s, d in zip(start, dest)) >= PATH_CACHE_MIN_DISTANCE:
+            path_cache.put(start, dest, path)
         # Use the new, simpler translation function to generate goto() commands
-        commands = translate_path_to_waypoint_commands(world_path)
-        
-        turtles[turtle_id]['queue'].extend(commands)
-        print(f"Path for turtle {turtle_id}: {commands}")
+        with metrics.stage("waypoints"):
+            leg_commands = translate_path_to_waypoint_commands(path)
+        commands.extend(leg_commands)
+        log.debug("Path for turtle %s: %s", job.turtle_id, leg_commands)
+    if task_queue.has_tasks(job.turtle_id) or any(isinstance(c, MineTask) for c in commands):
+        task_queue.extend(job.turtle_id, commands)
+        return True
+    turtles.extend_queue(job.turtle_id, commands)
+    return False
+
+def release_tasks(turtle_id):
+    """
+    Queues the next piece of a turtle's task backlog, planned from where
+    the turtle is, unless it is still busy with what it was given last.
+    """
+    status = turtles.status(turtle_id)
+    if status is None:
+        task_queue.clear(turtle_id)
+        return
+    try:
+        position = (int(status['x']), int(status['y']), int(status['z']))
+    except (KeyError, TypeError, ValueError):
+        return
+    # Under the registry lock, like apply_planned_jobs, so nothing is queued
+    # between taking commands off the backlog and queueing them.
+    with turtles.lock:
+        with metrics.stage("waypoints"):
+            commands, starts = task_queue.release(turtle_id, position)
+        if commands:
+            turtles.extend_queue(turtle_id, commands)
+            log.debug("Released to turtle %s: %s", turtle_id, commands)
+    task_queue.start_plans(starts)
 
 
 @app.route('/find_and_mine/<turtle_id>/<block_name>', methods=['POST'])
 def find_and_mine(turtle_id, block_name):
-    if turtle_id not in turtles:
+    status = turtles.status(turtle_id)
+    if status is None:
         return "Turtle not found", 404
 
-    status = turtles[turtle_id]['status']
-    start_x, start_y, start_z = status['x'], status['y'], status['z']
-
-    # Find all blocks of the specified type
-    target_blocks = []
-    for coords in world_blocks:
-        block_key = f"{coords[0]},{coords[1]},{coords[2]}"
-        if block_info.get(block_key, {}).get('name') == block_name:
-            target_blocks.append(coords)
-
-    if not target_blocks:
+    # Mine the whole vein of the nearest block of the specified type
+    task = nearest_vein_task(block_name, (status['x'], status['y'], status['z']))
+    if task is None:
         return "No blocks of that type found", 404
+    queue_steps(turtle_id, [task])
 
-    # Find the nearest block
-    nearest_block = min(target_blocks, key=lambda p: math.sqrt((p[0] - start_x)**2 + (p[1] - start_y)**2 + (p[2] - start_z)**2))
-    dest_x, dest_y, dest_z = nearest_block
+    return redirect(url_for('index'))
 
-    # Pathfind to the nearest block
-    path_to_block(turtle_id, start_x, start_y, start_z, dest_x, dest_y, dest_z)
-    
-    # Add a command to mine the block
-    turtles[turtle_id]['queue'].append(f"mine {dest_x} {dest_y} {dest_z}")
+def nearest_vein_task(block_name, position):
+    """
+    A MineTask for the vein holding the block of this name nearest to
+    position, entered at that block, or for that block alone if the name
+    does not form veins (see is_vein_block). None if no such block is known.
+    """
+    nearest = world.nearest_blocks(block_name, position, k=1)
+    if not len(nearest):
+        return None
+    vein = vein_index.vein_at(block_name, nearest[0])
+    return vein_task(nearest[0], vein if len(vein) else nearest)
 
-    return redirect(url_for('index'))
+def vein_task(position, vein):
+    """
+    A MineTask entering a vein at its block nearest position and digging
+    the rest in a short tour, up to MAX_VEIN_SIZE (veins.py) blocks.
+    """
+    entry, rest = order_veins(position, vein)[0]
+    return MineTask(entry, rest)
 
 
-def find_and_mine_all(turtle_id, block_name):
+def find_and_mine_all(turtle_ids, block_name):
     """
-    Finds all blocks of a specified type and queues commands for a turtle
-    to navigate to and mine each one sequentially.
+    Finds all blocks of a specified type and splits them across the given
+    turtles by spatial clustering, within each turtle's fuel. Each turtle's
+    share is grouped into veins, one MineTask per vein, and queued as a
+    Tour: a worker orders the veins by the cost of the paths planned
+    between them. The approach legs are then planned again one at a time
+    as the turtle gets to them, from where it is by then.
     """
-    if turtle_id not in turtles:
+    statuses = {turtle_id: turtles.status(turtle_id) for turtle_id in turtle_ids}
+    statuses = {turtle_id: status for turtle_id, status in statuses.items() if status is not None}
+    if not statuses:
         return "Turtle not found", 404
 
-    status = turtles[turtle_id]['status']
-    current_x, current_y, current_z = status['x'], status['y'], status['z']
-
-    # Find all blocks of the specified type
-    target_blocks = []
-    for coords in world_blocks:
-        block_key = f"{coords[0]},{coords[1]},{coords[2]}"
-        if block_info.get(block_key, {}).get('name') == block_name:
-            target_blocks.append(coords)
+    target_blocks, target_veins = vein_index.blocks(block_name)
 
-    if not target_blocks:
+    if not len(target_blocks):
         return jsonify({"status": "error", "message": f"Sorry, I can't find any {block_name}."})
 
-    # Sort the blocks by distance from the turtle's starting position for a more efficient path
-    target_blocks.sort(key=lambda p: math.sqrt((p[0] - current_x)**2 + (p[1] - current_y)**2 + (p[2] - current_z)**2))
-
-    # Iterate through all target blocks, pathfind, and queue a mine command for each. [4]
-    for block_coords in target_blocks:
-        dest_x, dest_y, dest_z = block_coords
-
-        # Pathfind from the turtle's last known position to the next block
-        path_to_block(turtle_id, current_x, current_y, current_z, dest_x, dest_y, dest_z)
-        
-        # Add a command to mine the block at the destination
-        turtles[turtle_id]['queue'].append(f"goto {dest_x} {dest_y} {dest_z}")
-
-        # Update the current position to the location of the block just mined
-        # This ensures the next pathfinding operation starts from the correct location
-        current_x, current_y, current_z = dest_x, dest_y, dest_z
-
-    return jsonify({"status": "ok", "message": f"Task assigned to turtle {turtle_id}: mine {block_name}"})
+    fleet = []
+    for turtle_id, status in statuses.items():
+        fleet.append((turtle_id, (status['x'], status['y'], status['z']), parse_fuel(status)))
+    assignment, unassigned = allocate_targets(fleet, target_blocks)
+
+    if not assignment:
+        return jsonify({"status": "error", "message": f"Not enough fuel to reach any {block_name}."})
+
+    vein_of = dict(zip(pack_coords(target_blocks).tolist(), target_veins.tolist()))
+    jobs = {}
+    for turtle_id, start, fuel in fleet:
+        if turtle_id in assignment:
+            targets = assignment[turtle_id]
+            labels = [vein_of[key] for key in pack_coords(targets).tolist()]
+            # Grouped into veins in a straight-line order, which the Tour improves on.
+            with metrics.stage("vein_order"):
+                tasks = [MineTask(entry, rest) for entry, rest in order_veins(start, targets, labels)]
+            jobs[turtle_id] = queue_steps(turtle_id, [Tour(start, tasks)] if len(tasks) > 1 else tasks).id
+
+    message = f"Task assigned to turtle {', '.join(jobs)}: mine {block_name}"
+    if len(unassigned):
+        message += f" ({len(unassigned)} out of fuel range)"
+    return jsonify({"status": "ok", "message": message, "jobs": jobs})
+
+@app.route('/mine_vein/<turtle_id>/<int:vein_id>', methods=['POST'])
+def mine_vein(turtle_id, vein_id):
+    """Queues a whole vein, by its id in /veins, for a turtle."""
+    status = turtles.status(turtle_id)
+    if status is None:
+        return jsonify({"status": "error", "message": "Turtle not found."}), 404
+    found = vein_index.vein(vein_id)
+    if found is None:
+        return jsonify({"status": "error", "message": f"No vein {vein_id}."}), 404
+    name, vein = found
+    task = vein_task((status['x'], status['y'], status['z']), vein)
+    job = queue_steps(turtle_id, [task])
+    message = f"Turtle {turtle_id} mines {1 + len(task.vein)} {name}"
+    if len(vein) > 1 + len(task.vein):
+        message += f" of {len(vein)} in the vein"
+    return jsonify({"status": "ok", "message": message + ".", "job": job.id})
 
 @app.route('/pathfind/<turtle_id>/<x>/<y>/<z>', methods=['GET'])
 def pathfind(turtle_id,x,y,z):
-    if turtle_id not in turtles:
+    status = turtles.status(turtle_id)
+    if status is None:
         return "Turtle not found", 404
     
     try:
@@ -292,121 +561,379 @@ def pathfind(turtle_id,x,y,z):
     except ValueError:
         return "Invalid coordinates", 400
 
-    status = turtles[turtle_id]['status']
     start_x, start_y, start_z = status['x'], status['y'], status['z']
     
-    path_to_block(turtle_id, start_x, start_y, start_z, dest_x, dest_y, dest_z)
+    queue_steps(turtle_id, [((start_x, start_y, start_z), (dest_x, dest_y, dest_z))])
 
     return redirect(url_for('index'))
 
 @app.route('/')
 def index():
-    return render_template('index.html', turtles=turtles, DIRECTIONS=DIRECTIONS)
+    apply_planned_jobs()
+    return render_template('index.html', turtles=turtles.snapshot(), DIRECTIONS=DIRECTIONS)
 
 @app.route('/world')
 def world_view():
     return render_template('world.html')
 
+@app.route('/jobs')
+def list_jobs():
+    apply_planned_jobs()
+    return jsonify({"jobs": planning_pool.job_dicts()})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    apply_planned_jobs()
+    job = planning_pool.job_dict(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/path_cache')
+def path_cache_stats():
+    return jsonify(path_cache.stats())
+
 @app.route('/world_data')
 def world_data():
     """
     Prepares world data for JSON serialization.
     - Turtles are read directly from the dictionary.
-    - Blocks are constructed by combining the NumPy coordinates with the metadata dict.
-    """
-    blocks_list = []
-    # Iterate through each coordinate row in the NumPy array
-    for coords in world_blocks:
-        # Create the same key used for storing to look up metadata
-        block_key = f"{coords[0]},{coords[1]},{coords[2]}"
-        info = block_info.get(block_key, {"name": "unknown", "color": "#808080"})
-
-        # Append a JSON-friendly dictionary to the list.
-        # It's important to cast NumPy integers to standard Python ints.
-        blocks_list.append({
-            "x": int(coords[0]),
-            "y": int(coords[1]),
-            "z": int(coords[2]),
-            "name": info['name'],
-            "color": info['color']
-        })
+    - Blocks are read from the world store, with names and colors looked up
+      once per palette entry rather than once per block.
+    """
+    with world.lock:
+        coords, ids = world.blocks()
+        palette = list(world.palette)
+    colors = [get_block_properties(name)[0] for name in palette]
+
+    # It's important to cast NumPy integers to standard Python ints.
+    blocks_list = [
+        {"x": x, "y": y, "z": z, "name": palette[block_id], "color": colors[block_id]}
+        for (x, y, z), block_id in zip(coords.tolist(), ids.tolist())
+    ]
 
     # Return the data in the format the frontend expects
-    return jsonify({"turtles": turtles, "blocks": blocks_list})
+    return jsonify({"turtles": turtles.snapshot(), "blocks": blocks_list})
+
+@app.route('/world_changes')
+def world_changes():
+    """
+    Blocks added, changed or removed since the version a viewer already has
+    (?since=<version>), so steady-state traffic follows what changed rather
+    than the size of the world.
+
+    Blocks are sent as flat columns: coords is [x0, y0, z0, x1, ...] and ids
+    holds palette indices, with 0 meaning the block was removed. The known
+    blocks next to a removed one follow it, as a viewer that leaves out
+    hidden blocks (see /world_query) may not have them. With "full" set
+    the viewer must drop what it has and load the blocks sent; this happens
+    for ?since=0 and for viewers too far behind the change log.
+    """
+    since = request.args.get('since', default=0, type=int)
+    changes = change_log.changes_since(since) if since else None
+
+    with world.lock:
+        if changes is None:
+            coords, ids = world.blocks()
+            version = change_log.version
+        else:
+            coords, ids, version = changes
+            removed = coords[ids == AIR_ID]
+            if len(removed):
+                # Blocks a removal uncovered, for viewers that only drew the exposed ones.
+                uncovered, uncovered_ids = uncovered_blocks(world, removed)
+                coords = np.concatenate([coords, uncovered])
+                ids = np.concatenate([ids, uncovered_ids.astype(ids.dtype)])
+        palette = list(world.palette)
+
+    return jsonify({
+        "version": version,
+        "full": changes is None,
+        "palette": [[name, get_block_properties(name)[0]] for name in palette],
+        "coords": coords.reshape(-1).tolist(),
+        "ids": ids.tolist(),
+        "turtles": turtles.snapshot(),
+    })
+
+@app.route('/world_query')
+def world_query():
+    """
+    What the viewer should draw around its camera, as typed binary arrays
+    (layout in world_query.py).
+
+    ?x, ?y, ?z is the point the camera looks at. Blocks within ?near of it
+    come back one by one, minus those hidden on every side; beyond that,
+    up to ?radius, the world comes back as summary cells CELL_SIZES[?detail]
+    blocks across, in the ?far form: "cells", "surface" or "occupancy".
+
+    ?since is the version of the last response for the same query. If no
+    block the query depends on has changed since, only the turtles are
+    sent, with the current version.
+    """
+    try:
+        center = [int(request.args.get(axis, 0)) for axis in "xyz"]
+        radius = int(request.args.get('radius', QUERY_RADIUS))
+        near = int(request.args.get('near', QUERY_NEAR))
+        detail = int(request.args.get('detail', 2))
+        since = int(request.args.get('since', -1))
+    except ValueError:
+        return jsonify({"error": "Bad query"}), 400
+    far = request.args.get('far', 'cells')
+    if far not in FAR_MODES or not 0 <= detail < len(CELL_SIZES):
+        return jsonify({"error": "Bad query"}), 400
+    radius = min(max(radius, 0), QUERY_MAX_RADIUS)
+    near = min(max(near, 0), QUERY_MAX_NEAR)
+
+    positions = []
+    for turtle in turtles.snapshot().values():
+        status = turtle["status"] or {}
+        try:
+            positions.append((float(status['x']), float(status['y']), float(status['z'])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if since >= 0:
+        changes = change_log.changes_since(since)
+        if changes is not None:
+            coords, _, current = changes
+            lo, hi = query_box(center, radius, near, detail, far)
+            if not np.all((coords >= lo) & (coords <= hi), axis=1).any():
+                return Response(encode_unchanged(current, positions), mimetype='application/octet-stream')
+    version = change_log.version
+    centres, sizes, ids, fills = query_world(world, center, radius, near, detail, far)
+    colors = get_block_colors()[ids]
+    colors[ids == AIR_ID] = OCCUPANCY_COLOR
+    return Response(encode_query(version, centres, sizes, colors, fills, positions),
+                    mimetype='application/octet-stream')
 
 @app.route('/register', methods=['POST'])
 def register_turtle():
-    global next_id
-    turtle_id = str(next_id)
     initial_status = request.json or {"x": 0, "y": 0, "z": 0, "dir": 0, "fuel": "N/A", "inventory": {}}
-    turtles[turtle_id] = { "status": initial_status, "queue": [] }
-    print(f"Registered new turtle with ID: {turtle_id}")
-    next_id += 1
+    turtle_id = turtles.register(initial_status)
+    log.info("Registered new turtle with ID: %s", turtle_id)
     return jsonify({"id": turtle_id})
 
 @app.route('/get_position/<turtle_id>', methods=['GET'])
 def get_position(turtle_id):
-    if turtle_id in turtles:
-        status = turtles[turtle_id].get("status", {})
+    status = turtles.status(turtle_id)
+    if status is not None:
         pos_data = { "x": status.get("x"), "y": status.get("y"), "z": status.get("z"), "dir": status.get("dir") }
         return jsonify(pos_data)
     return jsonify({"error": "Turtle not found"}), 404
 
 @app.route('/poll/<turtle_id>', methods=['POST'])
 def poll_for_command(turtle_id):
+    """
+    Hands a turtle its queued commands.
+
+    With ?wait=<seconds> the request is held open until commands are queued
+    or the wait runs out (capped at LONG_POLL_MAX_WAIT), so commands reach
+    the turtle as soon as they exist without it polling on a timer. An empty
+    body means the turtle's status has not changed since its last poll.
+
+    A turtle polls once it has run all its commands, so while the survey
+    is on an idle turtle is given a chunk to scan here.
+    """
     if turtle_id not in turtles:
         return response_to_alone_turtle()
-    turtles[turtle_id]["status"] = request.json
-    commands_to_send = turtles[turtle_id]["queue"][:]
-    turtles[turtle_id]["queue"] = []
-    return jsonify({"commands": commands_to_send})
+    status = request.get_json(silent=True)
+    if status:
+        turtles.update_status(turtle_id, status)
+        clear_turtle_position(status)
+    apply_planned_jobs()
+    task_queue.polled(turtle_id)
+    release_tasks(turtle_id)
+    dispatch_survey(turtle_id)
+    wait = min(request.args.get("wait", default=0, type=float), LONG_POLL_MAX_WAIT)
+    if wait > 0:
+        commands = turtles.wait_for_queue(turtle_id, wait)
+    else:
+        commands = turtles.take_queue(turtle_id)
+    if commands:
+        task_queue.hold(turtle_id)
+    if wait > 0:
+        return jsonify({"commands": commands, "long_poll": True})
+    return jsonify({"commands": commands})
 
 @app.route('/scan_report/<turtle_id>', methods=['POST'])
 def scan_report(turtle_id):
     """
     Processes incoming block data and stores it efficiently.
-    - Coordinates are added to the NumPy array.
-    - Metadata is stored in the block_info dictionary.
-    """
-    global world_blocks # Declare that we are modifying the global variable
 
+    Reports sent as application/octet-stream use the compact format in
+    scan_format.py and are decoded with array operations. The response
+    carries the palette entries the turtle does not have yet, so its next
+    report can refer to blocks by ID.
+
+    Compact reports may also be deltas (see ScanTracker): ?seq=N numbers the
+    scan, ?base=M says it only holds the blocks that changed since scan M and
+    ?blocks=K gives the size of the whole scan, for the counters at
+    /scan_stats. A delta against any scan but the last one accepted is
+    refused with error "scan-base", and the turtle sends the scan in full.
+
+    ?radius=R says the scan saw everything within R blocks of its origin,
+    so those positions are marked observed (see ObservedMap) and count as
+    survey coverage; anything there not reported is air. So is any
+    position a report names as air. Stored blocks need no marking, their
+    IDs say they are known.
+
+    JSON reports, {"blocks": {"x,y,z": name}}, are still accepted:
+    - Coordinates are parsed into one array and written to the world store
+      in a single bulk insert.
+    - Air names in the report remove whatever block was stored there.
+    - Having no origin, they only mark the air they name as observed.
+    """
     if turtle_id not in turtles:
         return response_to_alone_turtle()
 
-    scan_data = request.json
+    if request.mimetype == 'application/octet-stream':
+        return compact_scan_report(
+            turtle_id, request.get_data(),
+            request.args.get('seq', type=int), request.args.get('base', type=int),
+            request.args.get('blocks', type=int),
+            min(max(request.args.get('radius', default=0, type=int), 0), MAX_SCAN_RADIUS),
+        )
 
-    if 'blocks' in scan_data and isinstance(scan_data['blocks'], dict):
-        new_coords_list = []
-        for loc_str, block_name in scan_data['blocks'].items():
-            try:
-                # Parse coordinates from the string key
-                coords = [int(coord) for coord in loc_str.split(',')]
-                new_coords_list.append(coords)
+    new_coords_list = []
+    new_names = []
+    with metrics.stage("scan_parse"):
+        scan_data = request.json
+        if 'blocks' in scan_data and isinstance(scan_data['blocks'], dict):
+            for loc_str, block_name in scan_data['blocks'].items():
+                try:
+                    # Parse coordinates from the string key
+                    coords = [int(coord) for coord in loc_str.split(',')]
+                    if len(coords) != 3:
+                        raise ValueError(loc_str)
+                    new_coords_list.append(coords)
+                    new_names.append(block_name)
+                except ValueError:
+                    log.warning("Could not parse location: %s", loc_str)
+
+    # If any new blocks were successfully parsed, add them to the store
+    if new_coords_list:
+        with metrics.stage("scan_merge"):
+            with world.lock:
+                world.insert_many(new_coords_list, new_names)
+                world.observed.observe([c for c, name in zip(new_coords_list, new_names)
+                                        if not name or name in AIR_NAMES])
 
-                # Store the metadata (name, color) in the dictionary using the string as a key
-                block_key = f"{coords[0]},{coords[1]},{coords[2]}"
-                color, _ = get_block_properties(block_name)
-                block_info[block_key] = {"name": block_name, "color": color}
+    return jsonify({"status": "ok", "message": "Scan data processed."})
 
-            except ValueError:
-                print(f"Could not parse location: {loc_str}")
+def compact_scan_report(turtle_id, data, seq=None, base=None, full_blocks=None, radius=0):
+    """Stores a binary scan report and answers with the turtle's missing palette entries."""
+    with world.lock:
+        try:
+            with metrics.stage("scan_parse"):
+                coords, ids, known = decode_scan(data, world, palette_epoch)
+        except PaletteMismatch:
+            # The turtle's IDs are from before a restart: send the whole
+            # palette so it can re-encode the scan. Like re-register, this is
+            # a 200 so the turtle's http.post hands back the body.
+            return jsonify({
+                "status": "error", "error": "palette",
+                "palette_epoch": palette_epoch, "palette_start": 0, "palette": list(world.palette),
+            }), 200
+        except ValueError as e:
+            return jsonify({"status": "error", "message": f"Bad scan report: {e}"}), 400
+        # Checked under the world lock so reports from one turtle apply in
+        # the order they were accepted.
+        if not scan_tracker.accept(turtle_id, seq, base):
+            return jsonify({"status": "error", "error": "scan-base"}), 200
+        with metrics.stage("scan_merge"):
+            if len(ids):
+                world.insert_ids(coords, ids)
+            world.observed.observe(np.concatenate([
+                np.asarray(scan_origin(data)) + sphere_offsets(radius), coords[ids == AIR_ID]]))
+        palette = world.palette[known:]
+    survey.mark_scanned(scan_origin(data), radius)
+
+    blocks = len(ids)
+    scan_tracker.record(base is not None, blocks, full_blocks if full_blocks is not None else blocks,
+                        len(data), record_size(data))
+
+    return jsonify({
+        "status": "ok", "message": "Scan data processed.",
+        "palette_epoch": palette_epoch, "palette_start": known, "palette": palette,
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Request and stage timings and server gauges, in Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/profiler', methods=['GET', 'POST'])
+def profiler_endpoint():
+    """
+    POST {"enabled": true} starts the sampling profiler and false stops it.
+    GET returns the stacks sampled so far, collapsed for flame graph tools.
+    """
+    if request.method == 'POST':
+        if (request.get_json(silent=True) or {}).get("enabled"):
+            profiler.start()
+        else:
+            profiler.stop()
+        return jsonify({"running": profiler.running, "samples": profiler.samples})
+    return Response(profiler.collapsed(), mimetype="text/plain")
 
-        # If any new blocks were successfully parsed, add them to the main array
-        if new_coords_list:
-            # Convert the list of new coordinates to a NumPy array
-            new_blocks_arr = np.array(new_coords_list, dtype=int)
-            # Vertically stack the old and new arrays
-            combined_blocks = np.vstack([world_blocks, new_blocks_arr])
-            # Use np.unique to remove any duplicate coordinates efficiently
-            world_blocks = np.unique(combined_blocks, axis=0)
+@app.route('/scan_stats', methods=['GET'])
+def scan_stats():
+    """Counts of scan reports ingested and what delta reports saved."""
+    return jsonify(scan_tracker.snapshot())
 
-    return jsonify({"status": "ok", "message": "Scan data processed."})
+@app.route('/veins', methods=['GET'])
+def list_veins():
+    """
+    Known ore veins, largest first. ?name= lists the veins of one ore
+    (other blocks do not form veins, see is_vein_block), ?min_size= leaves
+    out smaller veins and ?limit= caps how many are listed.
+    """
+    name = request.args.get("name")
+    if name and not is_vein_block(name):
+        return jsonify({"error": f"{name} does not form veins"}), 400
+    min_size = request.args.get("min_size", default=1, type=int)
+    limit = request.args.get("limit", default=VEIN_LIST_LIMIT, type=int)
+    found = vein_index.summary([name] if name else None, min_size)
+    return jsonify({"veins": found[:limit], "count": len(found), "blocks": sum(vein["size"] for vein in found)})
+
+@app.route('/tasks', methods=['GET'])
+def task_stats():
+    """Task backlog counters and what each turtle has waiting."""
+    return jsonify(task_queue.snapshot())
+
+@app.route('/survey', methods=['GET', 'POST'])
+def survey_endpoint():
+    """
+    GET returns the survey's state and how much of its area is covered.
+
+    POST {"enabled": true} starts the background survey: idle turtles are
+    sent to scan the chunks within "radius" chunks of "center" ([x, z],
+    default the fleet's mean position) that have gone longest unscanned
+    for the least travel. "turtles" limits it to some turtles. false stops
+    it; turtles finish the chunk they are on.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        center = data.get("center")
+        if data.get("enabled") and center is None:
+            statuses = [status for status in (turtles.status(t) for t in turtles.ids()) if status]
+            if statuses:
+                center = (int(np.mean([s.get('x', 0) for s in statuses])),
+                          int(np.mean([s.get('z', 0) for s in statuses])))
+        try:
+            survey.configure(data.get("enabled"), center, data.get("radius"), data.get("turtles"))
+        except (TypeError, ValueError, IndexError):
+            return jsonify({"status": "error", "message": "Bad survey settings."}), 400
+        if data.get("enabled"):
+            for turtle_id in turtles.ids():
+                dispatch_survey(turtle_id)
+    return jsonify(survey.snapshot())
 
 @app.route('/update/<turtle_id>', methods=['POST'])
 def update_status(turtle_id):
-    if turtle_id not in turtles:
+    if not turtles.update_status(turtle_id, request.json):
         return response_to_alone_turtle()
-    turtles[turtle_id]["status"] = request.json
+    clear_turtle_position(request.json)
+    apply_planned_jobs()
     return jsonify({"status": "ok"})
 
 @app.route('/chat_command', methods=['POST'])
@@ -420,58 +947,46 @@ def chat_command():
 
     data = request.json
     command_str = data.get('command')
-    
-    print(data)
+    log.debug("Chat command for turtle %s: %s", turtle_id, command_str)
 
     if command_str:
         parts = command_str.split()
         cmd_type = parts[0].lower()
-        
-        print(cmd_type)
-        print(parts)
 
         if cmd_type == "mine" and len(parts) > 1:
             block_name = parts[1]
-            status = turtles[turtle_id]['status']
-            start_x, start_y, start_z = status['x'], status['y'], status['z']
-
-            target_blocks = [coords for coords in world_blocks if block_info.get(f"{coords[0]},{coords[1]},{coords[2]}", {}).get('name') == block_name]
-
-            if target_blocks:
-                nearest_block = min(target_blocks, key=lambda p: math.sqrt((p[0] - start_x)**2 + (p[1] - start_y)**2 + (p[2] - start_z)**2))
-                dest_x, dest_y, dest_z = nearest_block
-                path_to_block(turtle_id, start_x, start_y, start_z, dest_x, dest_y, dest_z)
-                turtles[turtle_id]['queue'].append(f"mine {dest_x} {dest_y} {dest_z}")
-                turtles[turtle_id]['queue'].append(f"say Task received: mining {block_name}")
-                return jsonify({"status": "ok", "message": f"Task assigned to turtle {turtle_id}: mine {block_name}"})
+            status = turtles.status(turtle_id)
+            task = nearest_vein_task(block_name, (status['x'], status['y'], status['z']))
+
+            if task is not None:
+                job = queue_steps(turtle_id, [task, f"say Task received: mining {block_name}"])
+                return jsonify({"status": "ok", "message": f"Task assigned to turtle {turtle_id}: mine {block_name}", "job": job.id})
             else:
                 # No need to queue a 'say' command if the server can respond directly.
                 return jsonify({"status": "error", "message": f"Sorry, I can't find any {block_name}."})
             
         elif cmd_type == "mineall" and len(parts) > 1:
-            print("WE ARE MINING ALLLLLLL")
             block_name = parts[1]
 
-            status = turtles[turtle_id]['status']
-            start_x, start_y, start_z = status['x'], status['y'], status['z']
-
-            return find_and_mine_all(turtle_id, block_name)
+            # Split the work across every idle turtle, or the best one if all are busy.
+            return find_and_mine_all(get_idle_turtles() or [turtle_id], block_name)
 
         elif cmd_type == "goto" and len(parts) == 4:
             try:
                 
                 
-                status = turtles[turtle_id]['status']
+                status = turtles.status(turtle_id)
                 start_x, start_y, start_z = status['x'], status['y'], status['z']
                 dest_x, dest_y, dest_z = map(int, parts[1:])
-                path_to_block(turtle_id, start_x, start_y, start_z, dest_x, dest_y, dest_z)
+                job = queue_steps(turtle_id, [((start_x, start_y, start_z), (dest_x, dest_y, dest_z))])
                 
-                return jsonify({"status": "ok", "message": f"Turtle {turtle_id} is now moving to ({dest_x}, {dest_y}, {dest_z})."})
+                return jsonify({"status": "ok", "message": f"Turtle {turtle_id} is now moving to ({dest_x}, {dest_y}, {dest_z}).", "job": job.id})
             except ValueError:
                 return jsonify({"status": "error", "message": "Invalid coordinates for 'goto' command."})
         else:
             # For other simple commands like "dig", "forward", etc.
-            turtles[turtle_id]['queue'].append(command_str)
+            # These still wait behind any legs being planned for the turtle.
+            queue_steps(turtle_id, [command_str])
             return jsonify({"status": "ok", "message": f"Command '{command_str}' queued for turtle {turtle_id}."})
 
     return jsonify({"status": "error", "message": "Invalid or empty command."}), 400
@@ -485,6 +1000,8 @@ def add_commands():
     if turtle_id in turtles and commands_str:
         # Split commands by comma or newline for flexibility
         commands_list = [cmd.strip() for cmd in commands_str.replace(',', '\n').split('\n') if cmd.strip()]
+        # Commands and legs to plan, queued together as one job in order.
+        steps = []
         
         for command in commands_list:
             parts = command.split()
@@ -493,51 +1010,35 @@ def add_commands():
             if cmd_type == "mine" and len(parts) > 1:
                 block_name = parts[1]
                 
-                # Trigger the find_and_mine logic
-                status = turtles[turtle_id]['status']
-                start_x, start_y, start_z = status['x'], status['y'], status['z']
-
-                # Find all blocks of the specified type
-                target_blocks = []
-                for coords in world_blocks:
-                    block_key = f"{coords[0]},{coords[1]},{coords[2]}"
-                    if block_info.get(block_key, {}).get('name') == block_name:
-                        target_blocks.append(coords)
+                # Trigger the find_and_mine logic: the nearest vein, as one task
+                status = turtles.status(turtle_id)
+                task = nearest_vein_task(block_name, (status['x'], status['y'], status['z']))
 
-                if target_blocks:
-                    # Find the nearest block
-                    nearest_block = min(target_blocks, key=lambda p: math.sqrt((p[0] - start_x)**2 + (p[1] - start_y)**2 + (p[2] - start_z)**2))
-                    dest_x, dest_y, dest_z = nearest_block
-
-                    # Pathfind to the nearest block
-                    path_to_block(turtle_id, start_x, start_y, start_z, dest_x, dest_y, dest_z)
-                    
-                    # Add a command to mine the block
-                    turtles[turtle_id]['queue'].append(f"mine {dest_x} {dest_y} {dest_z}")
+                if task is not None:
+                    steps.append(task)
                 else:
-                    print(f"No blocks of type {block_name} found for turtle {turtle_id}")
+                    log.info("No blocks of type %s found for turtle %s", block_name, turtle_id)
                     
             
             elif cmd_type == "mineall" and len(parts) > 1:
-                print("WE ARE MINING ALLLLLLL")
                 block_name = parts[1]
 
-                status = turtles[turtle_id]['status']
-                start_x, start_y, start_z = status['x'], status['y'], status['z']
-
-                return find_and_mine_all(turtle_id, block_name)
+                if steps:
+                    queue_steps(turtle_id, steps)
+                return find_and_mine_all([turtle_id], block_name)
         
             elif cmd_type == "goto" and len(parts) == 4:
                 # Handle direct goto commands as before
-                status = turtles[turtle_id]['status']
+                status = turtles.status(turtle_id)
                 start_x, start_y, start_z = status['x'], status['y'], status['z']
                 dest_x, dest_y, dest_z = map(int, parts[1:])
-                path_to_block(turtle_id, start_x, start_y, start_z, dest_x, dest_y, dest_z)
+                steps.append(((start_x, start_y, start_z), (dest_x, dest_y, dest_z)))
             else:
                 # Handle other simple commands
-                turtles[turtle_id]['queue'].append(command)
+                steps.append(command)
                 
-        print(f"Added commands to turtle {turtle_id}: {commands_list}")
+        queue_steps(turtle_id, steps)
+        log.debug("Added commands to turtle %s: %s", turtle_id, commands_list)
         
     return redirect(url_for('index'))
 
@@ -545,8 +1046,50 @@ def add_commands():
 def clear_queue():
     turtle_id = request.form.get('turtle_id')
     if turtle_id in turtles:
-        turtles[turtle_id]['queue'] = []
+        planning_pool.cancel(turtle_id)
+        task_queue.clear(turtle_id)
+        turtles.clear_queue(turtle_id)
     return redirect(url_for('index'))
 
-if __name__ == '__main__': 
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+def open_data_dir(data_dir=DATA_DIR):
+    """
+    Restores the world and turtles saved in data_dir, then keeps logging
+    every change there, compacting in the background.
+    """
+    global persistence, palette_epoch
+    persistence = Persistence(data_dir, world, turtles)
+    # The saved palette keeps its epoch, so turtles' palette IDs stay valid.
+    palette_epoch = persistence.load(palette_epoch)
+    # Replayed changes are not diffs any viewer has a base for.
+    change_log.reset()
+    persistence.start_compactor()
+    atexit.register(persistence.close)
+
+def serve(host='0.0.0.0', port=5000, threads=SERVER_THREADS):
+    """Serves the app with waitress, a multi-threaded production WSGI server."""
+    from waitress import serve as waitress_serve
+    waitress_serve(app, host=host, port=port, threads=threads)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Turtle control server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS, help="request threads for waitress")
+    parser.add_argument("--dev", action="store_true", help="use Flask's development server instead of waitress")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where the world and turtles are saved")
+    parser.add_argument("--no-persist", action="store_true", help="keep everything in memory only")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG shows every command and path")
+    parser.add_argument("--profile", action="store_true", help="start the sampling profiler (see /profiler)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.profile:
+        profiler.start()
+
+    if not args.no_persist:
+        open_data_dir(args.data_dir)
+
+    if args.dev:
+        app.run(host=args.host, port=args.port, threaded=True)
+    else:
+        serve(args.host, args.port, args.threads)
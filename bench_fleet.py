@@ -0,0 +1,240 @@
+"""
+Load benchmark with a simulated turtle fleet (fleet_sim.py).
+
+For each fleet size the server runs in its own process (python app.py) and
+that many headless turtles register, long-poll, report status and send
+delta scans of a synthetic ore-bearing world while an operator hands idle
+turtles "mine <ore>" and "goto" jobs, plus a periodic "mineall". With
+--survey there is no operator: the server's background survey (survey.py)
+keeps the fleet sweeping chunks, and the survey's coverage is reported.
+
+Prints one JSON document: per-endpoint p50/p99 latency, request and scan
+ingest throughput, planning job times from /jobs, time spent planning
+and task backlog counters from /tasks, the server's CPU time and memory
+(with its planning workers) at the start, end and peak, and what the
+turtles did, including ores mined. Compare runs to catch regressions.
+
+    python bench_fleet.py [--fleet 10 50] [--seconds 30] [--move-seconds 0.4] [--survey 3] [--output results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from bench_server import start_server
+from fleet_sim import BLOCK_NAMES, ORES, Client, SimTurtle, SyntheticWorld, Timings
+
+
+# Stages in /metrics that time route planning, in the server or its workers.
+# tour_order is left out: it times the A* of the legs it compares.
+PLANNING_STAGES = ("snapshot", "section_graph", "grid_build", "astar", "smooth")
+
+
+def rss_mb(pid):
+    """Resident memory of a process and its descendants in MB, or None off Linux."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except (OSError, StopIteration):
+        return None
+    return kb / 1024 + sum(rss_mb(child) or 0 for child in children)
+
+
+def cpu_seconds(pid):
+    """CPU time used by a process and its descendants in seconds, or None off Linux."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except OSError:
+        return None
+    ticks = int(fields[11]) + int(fields[12])  # utime and stime
+    return ticks / os.sysconf("SC_CLK_TCK") + sum(cpu_seconds(child) or 0 for child in children)
+
+
+def stage_seconds(port):
+    """Total seconds per stage from the server's /metrics."""
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+        text = response.read().decode()
+    totals = {}
+    for line in text.splitlines():
+        if line.startswith('turtle_stage_seconds_sum{stage="'):
+            totals[line.split('"')[1]] = float(line.rsplit(" ", 1)[1])
+    return totals
+
+
+def run_operator(port, timings, sims, stop, job_interval, mineall_every, seed):
+    """Gives a random idle turtle a job every job_interval seconds."""
+    rng = np.random.default_rng(seed)
+    client = Client(port, timings)
+    ores = [BLOCK_NAMES[ore] for ore, _, _ in ORES]
+    last_mineall = time.time()
+    while not stop.wait(job_interval):
+        if mineall_every and time.time() - last_mineall >= mineall_every:
+            last_mineall = time.time()
+            client.post_json("chat_command", "/chat_command", {"command": f"mineall {rng.choice(ores)}"})
+            continue
+        idle = [sim for sim in sims if sim.current_job == "idle"]
+        if not idle:
+            continue
+        sim = idle[rng.integers(len(idle))]
+        if rng.random() < 0.7:
+            command = f"mine {rng.choice(ores)}"
+        else:
+            x, z = sim.x + int(rng.integers(-24, 25)), sim.z + int(rng.integers(-24, 25))
+            command = f"goto {x} {int(rng.integers(-40, 30))} {z}"
+        client.post_form("add_commands", "/add_commands", {"turtle_id": sim.turtle_id, "commands": command})
+    client.close()
+
+
+def run_memory_sampler(pid, stop, samples):
+    while True:
+        mb = rss_mb(pid)
+        if mb is not None:
+            samples.append(mb)
+        if stop.wait(1):
+            return
+
+
+def run(fleet, args):
+    world = SyntheticWorld(seed=args.seed)
+    server, port = start_server(fleet + 8)
+    timings = Timings()
+    stop = threading.Event()
+
+    # Spread the fleet over a grid on the surface around the origin.
+    side = int(np.ceil(np.sqrt(fleet)))
+    sims = []
+    for i in range(fleet):
+        x, z = (i % side - side // 2) * 12, (i // side - side // 2) * 12
+        sim = SimTurtle(world, port, timings, (x, world.surface_height(x, z), z), stop,
+                        poll_wait=args.poll_wait, move_seconds=args.move_seconds)
+        sim.register()
+        sims.append(sim)
+
+    memory = []
+    threads = [threading.Thread(target=sim.run) for sim in sims]
+    if args.survey is None:
+        threads.append(threading.Thread(target=run_operator, args=(
+            port, timings, sims, stop, args.job_interval, args.mineall_every, args.seed)))
+    else:
+        # Within the synthetic world, which spans chunks -8 to 7.
+        setup = Client(port, timings)
+        setup.post_json("survey", "/survey", {"enabled": True, "center": [0, 0], "radius": args.survey})
+        setup.close()
+    sampler = threading.Thread(target=run_memory_sampler, args=(server.pid, stop, memory))
+
+    started = time.perf_counter()
+    cpu_started = cpu_seconds(server.pid)
+    sampler.start()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    cpu = cpu_seconds(server.pid)
+
+    # Wake turtles waiting in a long poll, then collect the server's view.
+    client = Client(port, Timings())
+    for sim in sims:
+        client.post_form("add_commands", "/add_commands", {"turtle_id": sim.turtle_id, "commands": "say stop"})
+    for thread in threads:
+        thread.join()
+    sampler.join()
+    jobs = [job for job in client.get("jobs", "/jobs")["jobs"] if job["status"] == "done"]
+    scan_stats = client.get("scan_stats", "/scan_stats")
+    tasks = client.get("tasks", "/tasks")
+    tasks.pop("backlogs")
+    stages = stage_seconds(port)
+    planning_seconds = sum(stages.get(name, 0) for name in PLANNING_STAGES)
+    survey = client.get("survey", "/survey") if args.survey is not None else None
+    client.close()
+    server.terminate()
+    server.wait()
+
+    counts = {}
+    for sim in sims:
+        for key, value in sim.counts.items():
+            counts[key] = counts.get(key, 0) + value
+    endpoints = timings.summary()
+    job_seconds = [job["seconds"] for job in jobs]
+    return {
+        "fleet": fleet,
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round(sum(e["count"] for e in endpoints.values()) / elapsed, 1),
+        "endpoints": endpoints,
+        "ingest": {
+            "reports": counts.get("scan_reports", 0),
+            "blocks": counts.get("scan_blocks", 0),
+            "bytes": counts.get("scan_bytes", 0),
+            "blocks_per_second": round(counts.get("scan_blocks", 0) / elapsed, 1),
+            "bytes_per_second": round(counts.get("scan_bytes", 0) / elapsed, 1),
+            "server": scan_stats,
+        },
+        "planning": {
+            "jobs": len(jobs),
+            "p50_ms": round(float(np.percentile(job_seconds, 50)) * 1000, 1) if jobs else None,
+            "p99_ms": round(float(np.percentile(job_seconds, 99)) * 1000, 1) if jobs else None,
+            "unreachable": sum(job["unreachable"] for job in jobs),
+            "seconds": round(planning_seconds, 2),
+            "ms_per_ore": round(planning_seconds * 1000 / max(counts.get("ores_mined", 0), 1), 1),
+            "plans_per_ore": round(tasks["plans"] / max(counts.get("ores_mined", 0), 1), 3),
+            "tasks": tasks,
+        },
+        "server_cpu": {
+            "seconds": round(cpu - cpu_started, 2),
+            "ms_per_ore": round((cpu - cpu_started) * 1000 / max(counts.get("ores_mined", 0), 1), 1),
+        } if cpu is not None and cpu_started is not None else None,
+        "memory_mb": {
+            "start": round(memory[0], 1),
+            "end": round(memory[-1], 1),
+            "peak": round(max(memory), 1),
+            "growth": round(memory[-1] - memory[0], 1),
+        } if memory else None,
+        "survey": {
+            "chunks": survey["chunks"],
+            "dispatched": survey["dispatched"],
+            "coverage": survey["coverage"],
+            "chunks_per_minute": round(counts.get("chunks_scanned", 0) / elapsed * 60, 2),
+            "moves_per_chunk": round(counts.get("moves", 0) / max(counts.get("chunks_scanned", 0), 1), 1),
+        } if survey else None,
+        "turtles": counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fleet", type=int, nargs="+", default=[10, 50], help="fleet sizes to run")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--move-seconds", type=float, default=0.4, help="time per move or turn, 0 for flat out")
+    parser.add_argument("--poll-wait", type=float, default=25, help="long poll wait in seconds")
+    parser.add_argument("--job-interval", type=float, default=0.5, help="seconds between operator jobs")
+    parser.add_argument("--mineall-every", type=float, default=10, help="seconds between mineall commands, 0 for none")
+    parser.add_argument("--survey", type=int, metavar="RADIUS",
+                        help="run the background survey over this many chunks around the origin instead of the operator")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    runs = []
+    for fleet in args.fleet:
+        print(f"Running {fleet} turtles for {args.seconds:g}s...", file=sys.stderr)
+        runs.append(run(fleet, args))
+    result = json.dumps({"config": vars(args), "runs": runs}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(result + "\n")
+    else:
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
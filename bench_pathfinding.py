@@ -0,0 +1,69 @@
+"""
+Compares pathfinder.find_path against the pathfinding3d AStarFinder it
+replaced, on the same kind of padded cost grid path_to_block builds.
+
+    python bench_pathfinding.py [--distances 20 50 100] [--seed 0]
+"""
+import argparse
+import time
+
+import numpy as np
+from pathfinding3d.core.grid import Grid
+from pathfinding3d.finder.a_star import AStarFinder
+
+from pathfinder import find_path, path_cost
+
+
+def make_grid(distance, rng):
+    """
+    A padded box like path_to_block's: mostly unscanned (cost 1), with
+    patches of stone, dirt, ore and impassable bedrock.
+    """
+    shape = (distance + 11, 21, distance + 11)
+    costs = rng.choice(
+        np.array([1, 8, 5, 10, 0], dtype=np.uint8),
+        size=shape,
+        p=[0.55, 0.25, 0.1, 0.02, 0.08],
+    )
+    start = (5, 10, 5)
+    end = (distance + 5, 10, distance + 5)
+    costs[start] = costs[end] = 1
+    return costs, start, end
+
+
+def time_call(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def run_pathfinding3d(costs, start, end):
+    grid = Grid(matrix=costs)
+    path, _ = AStarFinder().find_path(grid.node(*start), grid.node(*end), grid)
+    return [(p.x, p.y, p.z) for p in path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--distances", type=int, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'distance':>8} {'voxels':>9} {'finder':>14} {'seconds':>9} {'cost':>6} {'expanded':>9}")
+    for distance in args.distances:
+        costs, start, end = make_grid(distance, rng)
+        rows = [
+            ("pathfinding3d", lambda: (run_pathfinding3d(costs, start, end), None)),
+            ("astar", lambda: find_path(costs, start, end)),
+            ("astar+jump", lambda: find_path(costs, start, end, jump=True)),
+        ]
+        for name, fn in rows:
+            (path, expanded), seconds = time_call(fn)
+            cost = path_cost(costs, path) if path else "-"
+            expanded = "-" if expanded is None else expanded
+            print(f"{distance:>8} {costs.size:>9} {name:>14} {seconds:>9.3f} {cost:>6} {expanded:>9}")
+
+
+if __name__ == "__main__":
+    main()
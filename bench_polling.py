@@ -0,0 +1,121 @@
+"""
+Compares fixed-interval polling with long polling for command delivery.
+
+A simulated fleet polls a server process (python app.py) in one of two ways:
+
+    interval  today's loop: post the full status to /poll, sleep, repeat
+    long      post to /poll?wait=N with an empty body, repeat at once
+
+while a producer queues timestamped "say" commands for random turtles at a
+steady rate. Reports the poll requests the fleet made per second and how
+long commands waited between being queued and reaching their turtle.
+
+    python bench_polling.py [--turtles 16] [--seconds 20] [--interval 5] [--wait 25] [--rate 5]
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from bench_server import Client, start_server
+
+
+def run_turtle(port, turtle_id, mode, stop, interval, wait, polls, latencies):
+    client = Client(port)
+    status = {"x": 0, "y": 0, "z": 0, "dir": 0, "fuel": 1000, "inventory": {}}
+    while not stop.is_set():
+        if mode == "long":
+            response = client.post_json(f"/poll/{turtle_id}?wait={wait}", {})
+        else:
+            response = client.post_json(f"/poll/{turtle_id}", status)
+        received = time.time()
+        polls.append(1)
+        for command in response["commands"]:
+            if command.startswith("say "):
+                latencies.append(received - float(command.split()[-1]))
+        if mode != "long":
+            stop.wait(interval)
+    client.close()
+
+
+def run_producer(port, turtle_ids, stop, rate, seed):
+    rng = np.random.default_rng(seed)
+    client = Client(port)
+    sent = 0
+    while not stop.wait(1 / rate):
+        turtle_id = turtle_ids[rng.integers(len(turtle_ids))]
+        client.post_form("/add_commands", {"turtle_id": turtle_id, "commands": f"say {time.time()}"})
+        sent += 1
+    client.close()
+    return sent
+
+
+def run(mode, turtles, seconds, interval, wait, rate):
+    # One request thread per waiting turtle, plus room for the producer.
+    server, port = start_server(turtles + 4)
+
+    setup = Client(port)
+    turtle_ids = [setup.post_json("/register", {"x": 0, "y": 0, "z": 0, "dir": 0, "fuel": 1000})["id"]
+                  for _ in range(turtles)]
+    setup.close()
+
+    stop, producing = threading.Event(), threading.Event()
+    polls, latencies = [], []
+    workers = [
+        threading.Thread(target=run_turtle, args=(port, turtle_id, mode, stop, interval, wait, polls, latencies))
+        for turtle_id in turtle_ids
+    ]
+    sent = []
+    producer = threading.Thread(target=lambda: sent.append(run_producer(port, turtle_ids, producing, rate, 0)))
+
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    producer.start()
+    time.sleep(seconds)
+    producing.set()
+    producer.join()
+    # Let the last commands reach their turtles before stopping.
+    time.sleep(interval if mode != "long" else 0.5)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    # Wake turtles still waiting in a long poll.
+    wake = Client(port)
+    for turtle_id in turtle_ids:
+        wake.post_form("/add_commands", {"turtle_id": turtle_id, "commands": "wake"})
+    wake.close()
+    for worker in workers:
+        worker.join()
+    server.terminate()
+    server.wait()
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "polls_per_second": len(polls) / elapsed,
+        "sent": sent[0],
+        "received": len(latencies),
+        "mean_ms": latencies.mean() if len(latencies) else float("nan"),
+        "p95_ms": np.percentile(latencies, 95) if len(latencies) else float("nan"),
+        "max_ms": latencies.max() if len(latencies) else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turtles", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--interval", type=float, default=5, help="seconds between interval polls")
+    parser.add_argument("--wait", type=float, default=25, help="seconds a long poll may wait")
+    parser.add_argument("--rate", type=float, default=5, help="commands queued per second")
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'polls/s':>8} {'sent':>5} {'received':>8} {'mean ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for mode in ("interval", "long"):
+        result = run(mode, args.turtles, args.seconds, args.interval, args.wait, args.rate)
+        print(f"{mode:>8} {result['polls_per_second']:>8.2f} {result['sent']:>5} {result['received']:>8} "
+              f"{result['mean_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['max_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Compares JSON, compact binary and delta scan reports: payload size and the
+time the server takes to ingest one, for geo-scanner sized scans.
+
+    python bench_scan.py [--radius 8] [--scans 50] [--seed 0]
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import numpy as np
+
+import app
+from scan_format import encode_scan
+
+BLOCK_NAMES = [
+    "minecraft:stone", "minecraft:deepslate", "minecraft:dirt", "minecraft:gravel",
+    "minecraft:andesite", "minecraft:iron_ore", "minecraft:coal_ore", "minecraft:deepslate_diamond_ore",
+]
+
+
+def make_scans(count, radius, rng):
+    """
+    Scans every block step along a tunnel through one fixed random world,
+    so consecutive scans overlap like a moving turtle's do. About 30% of
+    positions are air, which the geo scanner leaves out.
+    """
+    size = count + 2 * radius + 1
+    world = rng.choice(len(BLOCK_NAMES) + 1, size=(size, 2 * radius + 1, 2 * radius + 1),
+                       p=[0.3, 0.28, 0.175, 0.07, 0.056, 0.07, 0.021, 0.021, 0.007])
+    span = np.arange(-radius, radius + 1)
+    offsets = np.stack(np.meshgrid(span, span, span, indexing="ij"), axis=-1).reshape(-1, 3)
+    scans = []
+    for n in range(count):
+        cells = world[n + offsets[:, 0] + radius, offsets[:, 1] + radius, offsets[:, 2] + radius]
+        solid = cells > 0
+        origin = (1000 + n, -20, -3000)
+        scans.append((origin, offsets[solid], [BLOCK_NAMES[c - 1] for c in cells[solid].tolist()]))
+    return scans
+
+
+def as_json(origin, offsets, names):
+    coords = (offsets + np.asarray(origin)).tolist()
+    return json.dumps({"blocks": {f"{x},{y},{z}": name for (x, y, z), name in zip(coords, names)}}).encode()
+
+
+def as_deltas(scans, radius):
+    """
+    Each scan as turtle.lua sends it: the blocks that differ from the
+    previous scan, plus air for blocks of the previous scan within reach
+    that are gone. Returns (origin, offsets, names, full block count) tuples.
+    """
+    deltas = []
+    last = None
+    for origin, offsets, names in scans:
+        current = dict(zip(map(tuple, (offsets + np.asarray(origin)).tolist()), names))
+        if last is None:
+            deltas.append((origin, offsets, names, len(names)))
+        else:
+            changed = [(c, n) for c, n in current.items() if last.get(c) != n]
+            changed += [(c, "minecraft:air") for c in last if c not in current
+                        and sum((a - b) ** 2 for a, b in zip(c, origin)) <= radius ** 2]
+            delta_offsets = np.array([c for c, _ in changed], dtype=np.int64).reshape(-1, 3) - np.asarray(origin)
+            deltas.append((origin, delta_offsets, [n for _, n in changed], len(names)))
+        last = current
+    return deltas
+
+
+def ingest(client, turtle_id, payloads, content_type, queries=None):
+    queries = queries or [""] * len(payloads)
+    started = time.perf_counter()
+    for payload, query in zip(payloads, queries):
+        client.post(f"/scan_report/{turtle_id}{query}", data=payload, content_type=content_type)
+    return (time.perf_counter() - started) / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--radius", type=int, default=8)
+    parser.add_argument("--scans", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    scans = make_scans(args.scans, args.radius, rng)
+    client = app.app.test_client()
+    with contextlib.redirect_stdout(io.StringIO()):
+        turtle_id = client.post("/register", json={"x": 0, "y": 0, "z": 0, "dir": 0}).json["id"]
+
+    json_payloads = [as_json(*scan) for scan in scans]
+    # Palette as a turtle would know it after its first compact report.
+    palette_ids = {name: app.world.name_id(name) for name in BLOCK_NAMES}
+    palette_ids.update((name, i) for i, name in enumerate(app.world.palette))
+    # Same scans somewhere else, so neither format finds the other's blocks already stored.
+    compact_payloads = [
+        encode_scan((origin[0] + 100000, *origin[1:]), offsets, names, palette_ids, app.palette_epoch)
+        for origin, offsets, names in scans
+    ]
+
+    # And once more as deltas against the previous scan.
+    delta_payloads, delta_queries = [], []
+    for n, (origin, offsets, names, full) in enumerate(as_deltas(scans, args.radius), start=1):
+        delta_payloads.append(encode_scan((origin[0] + 200000, *origin[1:]), offsets, names,
+                                          palette_ids, app.palette_epoch))
+        delta_queries.append(f"?seq={n}&blocks={full}&radius={args.radius}" + (f"&base={n - 1}" if n > 1 else ""))
+
+    json_seconds = ingest(client, turtle_id, json_payloads, "application/json")
+    compact_seconds = ingest(client, turtle_id, compact_payloads, "application/octet-stream",
+                             [f"?radius={args.radius}"] * len(compact_payloads))
+    delta_seconds = ingest(client, turtle_id, delta_payloads, "application/octet-stream", delta_queries)
+
+    blocks = np.mean([len(scan[2]) for scan in scans])
+    json_bytes = np.mean([len(p) for p in json_payloads])
+    compact_bytes = np.mean([len(p) for p in compact_payloads])
+    delta_bytes = np.mean([len(p) for p in delta_payloads])
+    print(f"{blocks:.0f} blocks per scan")
+    print(f"{'format':>8} {'bytes':>9} {'ms/scan':>8}")
+    print(f"{'json':>8} {json_bytes:>9.0f} {json_seconds * 1000:>8.2f}")
+    print(f"{'compact':>8} {compact_bytes:>9.0f} {compact_seconds * 1000:>8.2f}")
+    print(f"{'delta':>8} {delta_bytes:>9.0f} {delta_seconds * 1000:>8.2f}")
+    print(f"compact vs json: size x{json_bytes / compact_bytes:.1f}, ingest x{json_seconds / compact_seconds:.1f}")
+    print(f"delta vs compact: size x{compact_bytes / delta_bytes:.1f}, ingest x{compact_seconds / delta_seconds:.1f}")
+    print("scan stats:", json.dumps(client.get("/scan_stats").json))
+
+
+if __name__ == "__main__":
+    main()
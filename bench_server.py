@@ -0,0 +1,180 @@
+"""
+Load test for the turtle server under waitress.
+
+The server runs in its own process (python app.py --threads N). Simulated
+turtles poll and send scan reports while a producer queues
+numbered "say" commands for each of them through /add_commands. Every run
+checks that each turtle received every command exactly once and in order,
+then reports request throughput for each server thread count.
+
+    python bench_server.py [--threads 1 2 4 8] [--turtles 16] [--seconds 5]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+
+def make_scan(rng, origin, size=5):
+    """A scan report around a point: mostly stone with a few ores."""
+    names = rng.choice(["minecraft:stone", "minecraft:dirt", "minecraft:iron_ore", "minecraft:air"],
+                       size=size ** 3, p=[0.6, 0.2, 0.05, 0.15])
+    offsets = np.indices((size, size, size)).reshape(3, -1).T - size // 2
+    return {
+        f"{x},{y},{z}": name
+        for (x, y, z), name in zip((offsets + origin).tolist(), names.tolist())
+    }
+
+
+class Client:
+    """One keep-alive HTTP connection to the server under test."""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def post_json(self, path, body):
+        self.conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+        response = self.conn.getresponse()
+        return json.loads(response.read() or b"null")
+
+    def post_form(self, path, fields):
+        self.conn.request("POST", path, urllib.parse.urlencode(fields),
+                          {"Content-Type": "application/x-www-form-urlencoded"})
+        response = self.conn.getresponse()
+        response.read()
+        return response.status
+
+    def close(self):
+        self.conn.close()
+
+
+def run_turtle(port, turtle_id, origin, stop, scan_every, seed, counts, received):
+    rng = np.random.default_rng(seed)
+    client = Client(port)
+    status = {"x": origin[0], "y": origin[1], "z": origin[2], "dir": 0, "fuel": 1000, "inventory": {}}
+    polls = scans = 0
+    while not stop.is_set():
+        received.extend(client.post_json(f"/poll/{turtle_id}", status)["commands"])
+        polls += 1
+        if polls % scan_every == 0:
+            client.post_json(f"/scan_report/{turtle_id}", {"blocks": make_scan(rng, origin)})
+            scans += 1
+    client.close()
+    counts.append((polls, scans))
+
+
+def run_producer(port, turtle_ids, stop, sent):
+    client = Client(port)
+    while not stop.is_set():
+        for turtle_id in turtle_ids:
+            command = f"say {turtle_id}-{sent[turtle_id]}"
+            client.post_form("/add_commands", {"turtle_id": turtle_id, "commands": command})
+            sent[turtle_id] += 1
+    client.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(threads, timeout=30):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"),
+         "--host", "127.0.0.1", "--port", str(port), "--threads", str(threads), "--no-persist"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def run(threads, turtles, seconds, scan_every):
+    server, port = start_server(threads)
+
+    setup = Client(port)
+    turtle_ids = [setup.post_json("/register", {"x": 0, "y": 0, "z": 0, "dir": 0, "fuel": 1000})["id"]
+                  for _ in range(turtles)]
+    setup.close()
+
+    stop, producing = threading.Event(), threading.Event()
+    counts = []
+    received = {turtle_id: [] for turtle_id in turtle_ids}
+    sent = {turtle_id: 0 for turtle_id in turtle_ids}
+    workers = [
+        threading.Thread(target=run_turtle, args=(
+            port, turtle_id, (i * 40, 0, 0), stop, scan_every, i, counts, received[turtle_id]))
+        for i, turtle_id in enumerate(turtle_ids)
+    ]
+    producer = threading.Thread(target=run_producer, args=(port, turtle_ids, producing, sent))
+
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    producer.start()
+    time.sleep(seconds)
+    producing.set()
+    producer.join()
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    # Drain whatever was queued after each turtle's last poll.
+    drain = Client(port)
+    for turtle_id in turtle_ids:
+        received[turtle_id].extend(drain.post_json(f"/poll/{turtle_id}", {"x": 0, "y": 0, "z": 0, "dir": 0})["commands"])
+    drain.close()
+    server.terminate()
+    server.wait()
+
+    polls = sum(p for p, _ in counts)
+    scans = sum(s for _, s in counts)
+    total_sent = sum(sent.values())
+    intact = all(
+        received[turtle_id] == [f"say {turtle_id}-{n}" for n in range(sent[turtle_id])]
+        for turtle_id in turtle_ids
+    )
+    return {
+        "requests_per_second": (polls + scans + total_sent) / elapsed,
+        "polls": polls,
+        "scans": scans,
+        "sent": total_sent,
+        "received": sum(len(r) for r in received.values()),
+        "intact": intact,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--turtles", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--scan-every", type=int, default=10, help="polls between scan reports")
+    args = parser.parse_args()
+
+    print(f"{'threads':>7} {'req/s':>8} {'polls':>7} {'scans':>6} {'sent':>6} {'received':>8} {'intact':>6}")
+    for threads in args.threads:
+        result = run(threads, args.turtles, args.seconds, args.scan_every)
+        print(f"{threads:>7} {result['requests_per_second']:>8.0f} {result['polls']:>7} {result['scans']:>6} "
+              f"{result['sent']:>6} {result['received']:>8} {str(result['intact']):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Measures what pricing unknown space does to planned routes, on a synthetic
+world (fleet_sim.SyntheticWorld) that turtles have only partly scanned.
+
+Branch-mining tunnels are dug at a few heights and scanned every few
+blocks along their length, the way turtles fill the world store. Routes
+between random points in the tunnels are then planned once per unknown
+cost ("none" costs unknown space as air, as the planner used to). For each:
+
+    cost        block cost of the route in the real world
+    digs        blocks the turtle digs through on the route
+    unplanned   of those, blocks the route took for air because nothing
+                had been scanned there
+    unknown     route blocks no scan had reached
+    plan_ms     time to plan a route, on one thread, and its planning
+                stages per route in stage_ms
+    grid_ms     time to build the cost grid of each route's search box,
+                once planning has cached its sections' costs, and straight
+                from the world store in grid_store_ms
+
+The observed bitmap's size is reported too, in bits per observed block.
+
+    python bench_unknown.py [--size 128] [--routes 200] [--seed 0] [--unknown-costs none 3 6 10]
+"""
+import argparse
+import json
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from app import get_block_properties
+from fleet_sim import AIR, BEDROCK, BLOCK_NAMES, SyntheticWorld
+from metrics import recorded_stages
+from route_planner import BOX_PADDING, RoutePlanner
+from section_graph import box_costs
+from world_store import SECTION_BYTES, WorldStore, sphere_offsets
+
+# Heights of the tunnel levels, branch spacing and scan spacing along them.
+TUNNEL_LEVELS = (-40, -12, 16)
+BRANCH_SPACING = 16
+SCAN_EVERY = 3
+SCAN_RADIUS = 8
+
+
+def dig_tunnels(synthetic):
+    """Digs a main tunnel along x with branches along z on each level. Returns the tunnel blocks."""
+    sx, _, sz = synthetic.blocks.shape
+    cells = []
+    for level in TUNNEL_LEVELS:
+        y = level - synthetic.origin[1]
+        cells += [(x, y, sz // 2) for x in range(4, sx - 4)]
+        for x in range(8, sx - 8, BRANCH_SPACING):
+            cells += [(x, y, z) for z in range(4, sz - 4)]
+    cells = np.unique(np.array(cells, dtype=np.int64), axis=0)
+    keep = synthetic.blocks[cells[:, 0], cells[:, 1], cells[:, 2]] != BEDROCK
+    cells = cells[keep]
+    synthetic.blocks[cells[:, 0], cells[:, 1], cells[:, 2]] = AIR
+    return cells + synthetic.origin
+
+
+def scan_tunnels(synthetic, world, tunnels, remap):
+    """Scans a sphere around every SCAN_EVERY-th tunnel block, storing what it finds."""
+    offsets = sphere_offsets(SCAN_RADIUS)
+    for origin in tunnels[::SCAN_EVERY]:
+        cells = origin + offsets - synthetic.origin
+        cells = cells[np.all((cells >= 0) & (cells < synthetic.blocks.shape), axis=1)]
+        ids = synthetic.blocks[cells[:, 0], cells[:, 1], cells[:, 2]]
+        solid = ids != AIR
+        world.insert_ids(cells[solid] + synthetic.origin, remap[ids[solid]])
+        world.observed.observe(origin, SCAN_RADIUS)
+
+
+def pick_routes(tunnels, count, rng):
+    routes = []
+    while len(routes) < count:
+        start, dest = tunnels[rng.integers(len(tunnels), size=2)]
+        if 16 <= np.abs(dest - start).sum() <= 80:
+            routes.append((tuple(start.tolist()), tuple(dest.tolist())))
+    return routes
+
+
+def measure(synthetic, world, costs, true_costs, routes, unknown_cost):
+    planner = RoutePlanner(world, lambda: costs, unknown_cost=unknown_cost)
+    rows = []
+    started = time.perf_counter()
+    with recorded_stages() as stages:
+        paths = [planner.plan(start, dest) for start, dest in routes]
+    plan_ms = (time.perf_counter() - started) * 1000 / len(routes)
+    stage_ms = defaultdict(float)
+    for name, seconds in stages:
+        stage_ms[name] += seconds * 1000 / len(routes)
+    for path in paths:
+        if len(path) < 2:
+            continue
+        points = np.asarray(path[1:], dtype=np.int64)
+        local = points - synthetic.origin
+        inside = np.all((local >= 0) & (local < synthetic.blocks.shape), axis=1)
+        real = np.full(len(points), AIR, dtype=synthetic.blocks.dtype)
+        real[inside] = synthetic.blocks[local[inside, 0], local[inside, 1], local[inside, 2]]
+        known = world.ids_at(points) != 0
+        observed = world.observed.observed_at(points)
+        rows.append((
+            int(true_costs[real].sum()),
+            int((real != AIR).sum()),
+            int(((real != AIR) & ~known & ~observed).sum()),
+            int((~known & ~observed).sum()),
+        ))
+
+    boxes = [(np.minimum(start, dest) - BOX_PADDING, np.maximum(start, dest) + BOX_PADDING) for start, dest in routes]
+    for lo, hi in boxes:
+        assert np.array_equal(planner.section_graph.box_costs(lo, hi), box_costs(world, costs, lo, hi, unknown_cost))
+    started = time.perf_counter()
+    for lo, hi in boxes:
+        planner.section_graph.box_costs(lo, hi)
+    grid_ms = (time.perf_counter() - started) * 1000 / len(routes)
+    started = time.perf_counter()
+    for lo, hi in boxes:
+        box_costs(world, costs, lo, hi, unknown_cost)
+    grid_store_ms = (time.perf_counter() - started) * 1000 / len(routes)
+
+    rows = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    return {
+        "unknown_cost": unknown_cost,
+        "planned": len(rows),
+        "cost": round(float(rows[:, 0].mean()), 1),
+        "digs": round(float(rows[:, 1].mean()), 2),
+        "unplanned": round(float(rows[:, 2].mean()), 2),
+        "unknown": round(float(rows[:, 3].mean()), 2),
+        "plan_ms": round(plan_ms, 2),
+        "stage_ms": {name: round(ms, 3) for name, ms in stage_ms.items()},
+        "grid_ms": round(grid_ms, 3),
+        "grid_store_ms": round(grid_store_ms, 3),
+    }
+
+
+def unknown_cost_arg(value):
+    return None if value == "none" else int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=128, help="world width and depth in blocks")
+    parser.add_argument("--routes", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--unknown-costs", type=unknown_cost_arg, nargs="+", default=[None, 3, 6, 10])
+    args = parser.parse_args()
+
+    synthetic = SyntheticWorld(size=(args.size, 112, args.size), seed=args.seed)
+    tunnels = dig_tunnels(synthetic)
+    world = WorldStore()
+    remap = world.names_to_ids([name or "minecraft:air" for name in BLOCK_NAMES])
+    started = time.perf_counter()
+    scan_tunnels(synthetic, world, tunnels, remap)
+    scan_seconds = time.perf_counter() - started
+    costs = np.array([get_block_properties(name)[1] for name in world.palette], dtype=np.uint8)
+    true_costs = costs[remap]
+    true_costs[AIR] = 1
+
+    routes = pick_routes(tunnels, args.routes, np.random.default_rng(args.seed))
+    observed = world.observed.count()
+    sections = world.observed.section_count
+    print(json.dumps({
+        "config": {**vars(args), "unknown_costs": [c if c is not None else "none" for c in args.unknown_costs]},
+        "scans": len(tunnels[::SCAN_EVERY]),
+        "scan_seconds": round(scan_seconds, 2),
+        "observed": {
+            "blocks": observed,
+            "sections": sections,
+            "bytes": sections * SECTION_BYTES,
+            "bits_per_block": round(sections * SECTION_BYTES * 8 / max(observed, 1), 2),
+        },
+        "results": [measure(synthetic, world, costs, true_costs, routes, cost) for cost in args.unknown_costs],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
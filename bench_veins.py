@@ -0,0 +1,84 @@
+"""
+Benchmarks vein labelling (veins.py) on the ores of a synthetic world
+(fleet_sim.SyntheticWorld), and what mining by vein saves in planning.
+
+For each ore: blocks, veins and their mean and largest size, the time to
+label every block from scratch, and the time per block change once
+labelled, as turtles dig blocks out one at a time and scans add ore in
+batches. "plans" compares planned legs for mining every block: one per
+block, against one per vein.
+
+    python bench_veins.py [--size 256] [--seed 0] [--changes 500]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from fleet_sim import BLOCK_NAMES, ORES, SyntheticWorld
+from veins import VeinIndex
+from world_store import WorldStore
+
+# Blocks per simulated scan batch of new ore.
+SCAN_BATCH = 16
+
+
+def run(args):
+    synthetic = SyntheticWorld(size=(args.size, 112, args.size), seed=args.seed)
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for ore, _, _ in ORES:
+        name = BLOCK_NAMES[ore]
+        local = np.argwhere(synthetic.blocks == ore)
+        coords = local + synthetic.origin
+        world = WorldStore()
+        # Hold back some blocks to add later, as if found by new scans.
+        held = rng.random(len(coords)) < 0.1
+        world.insert_many(coords[~held], [name] * int((~held).sum()))
+        veins = VeinIndex(world)
+        world.add_listener(veins.on_blocks_changed)
+
+        started = time.perf_counter()
+        _, labels = veins.blocks(name)
+        label_ms = (time.perf_counter() - started) * 1000
+        sizes = np.bincount(np.unique(labels, return_inverse=True)[1])
+
+        later = coords[held]
+        started = time.perf_counter()
+        for i in range(0, len(later), SCAN_BATCH):
+            batch = later[i:i + SCAN_BATCH]
+            world.insert_many(batch, [name] * len(batch))
+        add_us = (time.perf_counter() - started) * 1e6 / max(len(later), 1)
+
+        dug = coords[rng.permutation(len(coords))[:args.changes]]
+        started = time.perf_counter()
+        for x, y, z in dug.tolist():
+            world.remove_block(x, y, z)
+        remove_us = (time.perf_counter() - started) * 1e6 / max(len(dug), 1)
+
+        results.append({
+            "ore": name,
+            "blocks": len(coords),
+            "veins": len(sizes),
+            "mean_size": round(float(sizes.mean()), 2) if len(sizes) else 0,
+            "max_size": int(sizes.max()) if len(sizes) else 0,
+            "label_ms": round(label_ms, 2),
+            "add_us_per_block": round(add_us, 1),
+            "dig_us_per_block": round(remove_us, 1),
+            "plans": {"per_block": len(coords), "per_vein": len(sizes)},
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=256, help="world width and depth in blocks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--changes", type=int, default=500, help="blocks dug out one at a time per ore")
+    args = parser.parse_args()
+    print(json.dumps({"config": vars(args), "ores": run(args)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
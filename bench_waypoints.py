@@ -0,0 +1,144 @@
+"""
+Compares ways of turning planned paths into goto commands, on paths
+recorded from the planner over a synthetic world (fleet_sim.SyntheticWorld):
+
+    legacy      the old per-point Python loop, a goto per direction change
+    diff        compress_path without goto merging (same commands, NumPy)
+    goto        compress_path merging runs goto walks in one go
+    smooth      smooth_path, then goto
+    replanned   planned again without turn costs, smoothed, then goto
+    turn-aware  planned again with turn costs in A*, smoothed, then goto
+
+For each: commands per path, turtle moves and turns to follow them, block
+cost of the route and time per path (including planning for the last two).
+
+    python bench_waypoints.py [--paths 200] [--seed 0] [--record paths.json | --load paths.json]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app import get_block_properties
+from fleet_sim import BLOCK_NAMES, SyntheticWorld
+from route_planner import TURN_COST, RoutePlanner
+from waypoints import compress_path, smooth_path, turtle_moves, waypoint_commands
+from world_store import WorldStore
+
+WORLD_SIZE = (128, 112, 128)
+
+
+def legacy_commands(path):
+    """translate_path_to_waypoint_commands as it was: a goto at every direction change."""
+    if len(path) < 2:
+        return []
+    waypoints = []
+    last_direction = tuple(b - a for a, b in zip(path[0], path[1]))
+    for i in range(2, len(path)):
+        current_direction = tuple(b - a for a, b in zip(path[i - 1], path[i]))
+        if current_direction != last_direction:
+            waypoints.append(path[i - 1])
+            last_direction = current_direction
+    waypoints.append(path[-1])
+    return [f"goto {p[0]} {p[1]} {p[2]}" for p in waypoints]
+
+
+def build_world(seed):
+    synthetic = SyntheticWorld(size=WORLD_SIZE, seed=seed)
+    world = WorldStore()
+    coords = np.argwhere(synthetic.blocks != 0)
+    ids = synthetic.blocks[coords[:, 0], coords[:, 1], coords[:, 2]]
+    remap = world.names_to_ids([name or "minecraft:air" for name in BLOCK_NAMES])
+    world.insert_ids(coords + synthetic.origin, remap[ids])
+    # The whole box is known, air included.
+    world.observed.observe(np.argwhere(np.ones(synthetic.blocks.shape, dtype=bool)) + synthetic.origin)
+    costs = np.array([get_block_properties(name)[1] for name in world.palette], dtype=np.uint8)
+    return synthetic, world, costs
+
+
+def record_paths(synthetic, world, costs, count, rng):
+    """Plans routes between random underground points as the planner did before smoothing."""
+    planner = RoutePlanner(world, lambda: costs, turn_cost=0, smooth=False)
+    low = synthetic.origin + [8, 4, 8]
+    high = synthetic.origin + np.array(WORLD_SIZE) - [8, 40, 8]
+    routes, paths = [], []
+    while len(paths) < count:
+        start = rng.integers(low, high)
+        dest = np.clip(start + rng.integers(-40, 41, size=3), low, high - 1)
+        path = planner.plan(tuple(start.tolist()), tuple(dest.tolist()))
+        if len(path) > 1:
+            routes.append((tuple(start.tolist()), tuple(dest.tolist())))
+            paths.append([tuple(int(v) for v in p) for p in path])
+    return routes, paths
+
+
+def measure(name, paths, translate):
+    """Runs translate(path) -> (path followed, waypoints, commands) over every path."""
+    results = []
+    started = time.perf_counter()
+    for path in paths:
+        results.append(translate(path))
+    seconds = (time.perf_counter() - started) / len(paths)
+    return name, results, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", help="save the recorded routes and paths here")
+    parser.add_argument("--load", help="use routes and paths saved by --record")
+    args = parser.parse_args()
+
+    if args.load:
+        with open(args.load) as f:
+            saved = json.load(f)
+        args.seed = saved["seed"]
+    synthetic, world, costs = build_world(args.seed)
+    if args.load:
+        routes = [tuple(map(tuple, r)) for r in saved["routes"]]
+        paths = [[tuple(p) for p in path] for path in saved["paths"]]
+    else:
+        routes, paths = record_paths(synthetic, world, costs, args.paths, np.random.default_rng(args.seed))
+    if args.record:
+        with open(args.record, "w") as f:
+            json.dump({"seed": args.seed, "routes": routes, "paths": paths}, f)
+
+    def cost_at(points):
+        return costs[world.ids_at(points)]
+
+    def replan(planner):
+        def translate(path):
+            planned = planner.plan(path[0], path[-1])
+            return planned, compress_path(planned), waypoint_commands(planned)
+        return translate
+    variants = [
+        measure("legacy", paths, lambda p: (p, None, legacy_commands(p))),
+        measure("diff", paths, lambda p: (p, compress_path(p, goto_aware=False),
+                                          waypoint_commands(p, goto_aware=False))),
+        measure("goto", paths, lambda p: (p, compress_path(p), waypoint_commands(p))),
+        measure("smooth", paths, lambda p: (lambda s: (s, compress_path(s), waypoint_commands(s)))(
+            smooth_path(p, cost_at, TURN_COST))),
+        measure("replanned", paths, replan(RoutePlanner(world, lambda: costs, turn_cost=0))),
+        measure("turn-aware", paths, replan(RoutePlanner(world, lambda: costs, turn_cost=TURN_COST))),
+    ]
+
+    print(f"{len(paths)} paths, {np.mean([len(p) - 1 for p in paths]):.1f} steps on average")
+    print(f"{'variant':>10} {'commands':>9} {'moves':>7} {'turns':>7} {'cost':>8} {'ms/path':>8}")
+    for name, results, seconds in variants:
+        commands = np.mean([len(r[2]) for r in results])
+        moves, turns = [], []
+        for followed, waypoints, command_list in results:
+            if waypoints is None:
+                waypoints = [tuple(map(int, c.split()[1:])) for c in command_list]
+            m, t = turtle_moves(followed[0], waypoints)
+            moves.append(m)
+            turns.append(t)
+        cost = np.mean([int(cost_at(np.asarray(r[0][1:])).sum(dtype=np.int64)) for r in results])
+        print(f"{name:>10} {commands:>9.2f} {np.mean(moves):>7.1f} {np.mean(turns):>7.2f} "
+              f"{cost:>8.1f} {seconds * 1000:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
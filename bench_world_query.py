@@ -0,0 +1,75 @@
+"""
+Compares what the viewer downloads for a large mapped world: the whole
+world as JSON (/world_data, /world_changes?since=0) against level-of-detail
+queries around one point (/world_query) at each far mode and detail level.
+
+The world is a synthetic one (fleet_sim.SyntheticWorld) loaded straight
+into the server's store. For each request: response size, instances the
+viewer would draw and the server's time to answer. The last line is the
+viewer's periodic refresh of a query while the world has not changed.
+
+    python bench_world_query.py [--size 192 112 192] [--radius 128] [--near 32] [--seed 0]
+"""
+import argparse
+import json
+import struct
+import time
+
+import numpy as np
+
+import app
+from fleet_sim import BLOCK_NAMES, SyntheticWorld
+
+
+def load_world(size, seed):
+    synthetic = SyntheticWorld(size=tuple(size), seed=seed)
+    coords = np.argwhere(synthetic.blocks != 0)
+    ids = synthetic.blocks[coords[:, 0], coords[:, 1], coords[:, 2]]
+    remap = app.world.names_to_ids([name or "minecraft:air" for name in BLOCK_NAMES])
+    app.world.insert_ids(coords + synthetic.origin, remap[ids])
+    return synthetic
+
+
+def timed_get(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    return response, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, nargs=3, default=[192, 112, 192])
+    parser.add_argument("--radius", type=int, default=128)
+    parser.add_argument("--near", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    synthetic = load_world(args.size, args.seed)
+    client = app.app.test_client()
+    x, z = 0, 0
+    y = synthetic.surface_height(x, z)
+    print(f"{len(app.world)} blocks in the world, querying around ({x}, {y}, {z})")
+    print(f"{'request':>34} {'bytes':>11} {'instances':>10} {'ms':>8}")
+
+    for url in ("/world_data", "/world_changes?since=0"):
+        response, seconds = timed_get(client, url)
+        data = json.loads(response.data)
+        count = len(data["blocks"]) if "blocks" in data else len(data["ids"])
+        print(f"{url:>34} {len(response.data):>11} {count:>10} {seconds * 1000:>8.1f}")
+
+    for far in ("cells", "surface", "occupancy"):
+        for detail in ((0, 1, 2, 3) if far != "occupancy" else (0,)):
+            url = (f"/world_query?x={x}&y={y}&z={z}&radius={args.radius}&near={args.near}"
+                   f"&detail={detail}&far={far}")
+            timed_get(client, url)  # warm up
+            response, seconds = timed_get(client, url)
+            version, count = struct.unpack_from("<III", response.data)[:2]
+            label = f"query {far} detail={detail}"
+            print(f"{label:>34} {len(response.data):>11} {count:>10} {seconds * 1000:>8.1f}")
+
+    response, seconds = timed_get(client, url + f"&since={version}")
+    print(f"{'refresh, unchanged':>34} {len(response.data):>11} {0:>10} {seconds * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
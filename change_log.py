@@ -0,0 +1,87 @@
+from collections import deque
+
+import numpy as np
+
+from world_store import pack_coords
+
+
+# --- Constants ---
+# Block changes kept for viewers catching up. A viewer that fell further
+# behind than this reloads the whole world instead.
+CHANGE_LOG_SIZE = 200000
+
+
+class ChangeLog:
+    """
+    Versioned log of block changes, for streaming the world to viewers.
+
+    Registered as a WorldStore listener, it bumps a version number for each
+    batch of changes and remembers the new palette index of every changed
+    block. A client that knows the world as of some version can then fetch
+    only what changed since, instead of the whole world.
+
+    The listener runs under the world store's lock, and changes_since takes
+    the same lock, so the log needs none of its own.
+    """
+
+    def __init__(self, world, max_changes=CHANGE_LOG_SIZE):
+        self.world = world
+        self.max_changes = max_changes
+        # Blocks stored before the log existed cannot be replayed, so a
+        # client starting from version 0 gets a full reload in that case.
+        self.version = 1 if len(world) else 0
+        # Changes up to and including this version have been dropped.
+        self.floor = self.version
+        self.batches = deque()  # (version, coords, new_ids)
+        self.size = 0
+        world.add_listener(self.on_blocks_changed)
+
+    def on_blocks_changed(self, coords, old_ids, new_ids):
+        self.version += 1
+        self.batches.append((
+            self.version,
+            np.array(coords, dtype=np.int64).reshape(-1, 3),
+            np.array(new_ids, dtype=np.uint16).reshape(-1),
+        ))
+        self.size += len(new_ids)
+        while self.size > self.max_changes and len(self.batches) > 1:
+            version, _, dropped = self.batches.popleft()
+            self.size -= len(dropped)
+            self.floor = version
+
+    def reset(self):
+        """
+        Forgets every logged change, so every viewer reloads the world. For
+        when the store was filled without going through the log's view of
+        history, like a restore from disk.
+        """
+        with self.world.lock:
+            self.batches.clear()
+            self.size = 0
+            self.version += 1
+            self.floor = self.version
+
+    def changes_since(self, version):
+        """
+        Returns every block changed after a version, with its latest value.
+
+        Returns:
+            tuple: (coords, ids, version) with an (N, 3) coordinate array, the
+            (N,) palette indices now stored there (AIR_ID for removed
+            blocks) and the current version. None if the log no longer
+            reaches back to the given version.
+        """
+        with self.world.lock:
+            if version < self.floor or version > self.version:
+                return None
+            batches = [(c, i) for v, c, i in self.batches if v > version]
+            current = self.version
+        if not batches:
+            return np.empty((0, 3), dtype=np.int64), np.empty(0, dtype=np.uint16), current
+
+        coords = np.concatenate([c for c, _ in batches])
+        ids = np.concatenate([i for _, i in batches])
+        # Keep only the last change for each coordinate.
+        _, last = np.unique(pack_coords(coords)[::-1], return_index=True)
+        keep = np.sort(coords.shape[0] - 1 - last)
+        return coords[keep], ids[keep], current
@@ -0,0 +1,432 @@
+"""
+Headless turtles for load testing the server without Minecraft.
+
+SyntheticWorld is a block grid with stone, deepslate, dirt, caves and ore
+veins. SimTurtle talks to a running server the way turtle.lua does:
+
+- registers, sends a full scan, then long-polls /poll for commands
+- runs goto (digging through anything but bedrock, vertical first, then
+  z, then x), mine, scanChunk, turns and the movement commands, reporting
+  its status to /update after every move and turn
+- sends a compact scan report after every move, as a delta against the
+  last scan the server accepted, like sendScan
+
+Each request's latency is recorded per endpoint for the benchmark in
+bench_fleet.py.
+"""
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+
+import numpy as np
+
+from scan_format import encode_scan
+from survey import SCAN_BOTTOM, SCAN_TOP
+
+
+# --- Constants ---
+BLOCK_NAMES = [
+    None,  # air
+    "minecraft:bedrock", "minecraft:deepslate", "minecraft:stone", "minecraft:dirt", "minecraft:gravel",
+    "minecraft:coal_ore", "minecraft:iron_ore", "minecraft:copper_ore", "minecraft:redstone_ore",
+    "minecraft:deepslate_diamond_ore",
+]
+AIR, BEDROCK, DEEPSLATE, STONE, DIRT, GRAVEL = range(6)
+# Ore ID, share of blocks that seed a vein, and the band of heights it forms in.
+ORES = [
+    (6, 0.0020, (0, 40)),
+    (7, 0.0015, (-24, 40)),
+    (8, 0.0010, (0, 30)),
+    (9, 0.0006, (-60, -20)),
+    (10, 0.0003, (-60, -40)),
+]
+ORE_IDS = {ore for ore, _, _ in ORES}
+SCAN_RADIUS = 8
+# Directions as in turtle.lua: 0 north (-z), 1 east (+x), 2 south (+z), 3 west (-x).
+DIRECTION_VECTORS = {0: (0, 0, -1), 1: (1, 0, 0), 2: (0, 0, 1), 3: (-1, 0, 0)}
+
+
+class SyntheticWorld:
+    """
+    A box of blocks from y=-64 up: bedrock floor, deepslate below y=0,
+    stone above it with a dirt surface, air pockets for caves and ore veins.
+
+    Blocks are IDs into BLOCK_NAMES. Turtles dig by setting cells to AIR;
+    single-cell numpy writes are atomic enough for concurrent turtles.
+    """
+
+    def __init__(self, size=(256, 112, 256), seed=0, surface=40):
+        rng = np.random.default_rng(seed)
+        sx, sy, sz = size
+        self.origin = np.array([-sx // 2, -64, -sz // 2])
+        y = np.arange(sy) + self.origin[1]
+        blocks = np.where(y < 0, DEEPSLATE, STONE).astype(np.uint8)
+        blocks = np.where(y >= surface - 3, DIRT, blocks)
+        blocks = np.where(y >= surface, AIR, blocks)
+        self.blocks = np.broadcast_to(blocks[None, :, None], size).copy()
+        self.blocks[:, 0, :] = BEDROCK
+
+        solid = self.blocks[:, 1:, :]
+        solid[(rng.random(solid.shape) < 0.02) & (solid == STONE)] = GRAVEL
+        # Caves: blobs of air around random centres.
+        self._blobs(rng, AIR, count=int(self.blocks.size * 0.0004), radius=3, y_range=(-56, surface - 4))
+        for ore, share, y_range in ORES:
+            self._blobs(rng, ore, count=int(self.blocks.size * share / 8), radius=1, y_range=y_range)
+
+    def _blobs(self, rng, block_id, count, radius, y_range):
+        if count == 0:
+            return
+        low = np.array([0, y_range[0] - self.origin[1], 0])
+        high = np.array([self.blocks.shape[0], y_range[1] - self.origin[1], self.blocks.shape[2]])
+        centres = rng.integers(low, high, size=(count, 3))
+        span = np.arange(-radius, radius + 1)
+        offsets = np.stack(np.meshgrid(span, span, span, indexing="ij"), axis=-1).reshape(-1, 3)
+        offsets = offsets[(offsets ** 2).sum(axis=1) <= radius * radius]
+        cells = (centres[:, None, :] + offsets[None, :, :]).reshape(-1, 3)
+        # Ragged edges, so veins are not perfect spheres.
+        cells = cells[rng.random(len(cells)) < 0.7]
+        inside = np.all((cells >= [0, 1, 0]) & (cells < self.blocks.shape), axis=1)
+        cells = cells[inside]
+        target = self.blocks[cells[:, 0], cells[:, 1], cells[:, 2]]
+        cells = cells[target != AIR] if block_id != AIR else cells
+        self.blocks[cells[:, 0], cells[:, 1], cells[:, 2]] = block_id
+
+    def surface_height(self, x, z):
+        """Y of the first air block above the ground at (x, z)."""
+        column = self.blocks[x - self.origin[0], :, z - self.origin[2]]
+        return int(np.flatnonzero(column != AIR).max()) + 1 + int(self.origin[1])
+
+    def get(self, x, y, z):
+        local = np.array([x, y, z]) - self.origin
+        if np.any(local < 0) or np.any(local >= self.blocks.shape):
+            return AIR
+        return int(self.blocks[tuple(local)])
+
+    def dig(self, x, y, z):
+        """Removes a block. Returns False for bedrock."""
+        block = self.get(x, y, z)
+        if block == BEDROCK:
+            return False
+        if block != AIR:
+            self.blocks[tuple(np.array([x, y, z]) - self.origin)] = AIR
+        return True
+
+    def scan(self, position, radius=SCAN_RADIUS):
+        """
+        Blocks within a cube around a position, as a (2r+1)^3 array of IDs
+        (AIR outside the world), like a geo scanner sees them.
+        """
+        low = np.asarray(position) - radius - self.origin
+        high = low + 2 * radius + 1
+        out = np.zeros((2 * radius + 1,) * 3, dtype=np.uint8)
+        src_low = np.maximum(low, 0)
+        src_high = np.minimum(high, self.blocks.shape)
+        if np.any(src_high <= src_low):
+            return out
+        dst = tuple(slice(a - l, b - l) for a, b, l in zip(src_low, src_high, low))
+        src = tuple(slice(a, b) for a, b in zip(src_low, src_high))
+        out[dst] = self.blocks[src]
+        return out
+
+
+class Timings:
+    """Request latencies per endpoint, shared by every turtle in a run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = defaultdict(list)
+
+    def add(self, endpoint, seconds):
+        with self.lock:
+            self.seconds[endpoint].append(seconds)
+
+    def summary(self):
+        with self.lock:
+            return {
+                endpoint: {
+                    "count": len(values),
+                    "p50_ms": round(float(np.percentile(values, 50)) * 1000, 3),
+                    "p99_ms": round(float(np.percentile(values, 99)) * 1000, 3),
+                    "mean_ms": round(float(np.mean(values)) * 1000, 3),
+                }
+                for endpoint, values in sorted(self.seconds.items())
+            }
+
+
+class Client:
+    """One keep-alive HTTP connection, timing every request."""
+
+    def __init__(self, port, timings, timeout=60):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        self.timings = timings
+
+    def request(self, endpoint, method, path, body=None, content_type="application/json"):
+        started = time.perf_counter()
+        self.conn.request(method, path, body, {"Content-Type": content_type} if body is not None else {})
+        response = self.conn.getresponse()
+        data = response.read()
+        self.timings.add(endpoint, time.perf_counter() - started)
+        if response.getheader("Content-Type", "").startswith("application/json"):
+            return json.loads(data)
+        return None  # /add_commands redirects to the dashboard
+
+    def post_json(self, endpoint, path, body):
+        return self.request(endpoint, "POST", path, json.dumps(body))
+
+    def post_form(self, endpoint, path, fields):
+        return self.request(endpoint, "POST", path, urllib.parse.urlencode(fields),
+                            "application/x-www-form-urlencoded")
+
+    def get(self, endpoint, path):
+        return self.request(endpoint, "GET", path)
+
+    def close(self):
+        self.conn.close()
+
+
+class SimTurtle:
+    """
+    One simulated turtle. run() loops until stop is set; commands arriving
+    after that are dropped.
+
+    Args:
+        move_seconds: Time each move or turn takes, like a real turtle's
+            animation. 0 runs flat out.
+    """
+
+    def __init__(self, world, port, timings, position, stop, poll_wait=25, move_seconds=0.4, fuel=20000):
+        self.world = world
+        self.client = Client(port, timings)
+        self.stop = stop
+        self.poll_wait = poll_wait
+        self.move_seconds = move_seconds
+        self.x, self.y, self.z = position
+        self.dir = 0
+        self.fuel = fuel
+        self.current_job = "idle"
+        self.inventory = defaultdict(int)
+        self.turtle_id = None
+        # Compact scan state, as in turtle.lua.
+        self.palette_epoch = 0
+        self.palette_ids = {}
+        self.last_scan = None  # (origin, ID cube) of the last scan the server accepted
+        self.last_scan_seq = 0
+        self.scan_seq = 0
+        self.counts = defaultdict(int)
+
+    # --- Protocol ---
+    def status(self):
+        return {
+            "x": self.x, "y": self.y, "z": self.z, "dir": self.dir, "fuel": self.fuel,
+            "inventory": dict(self.inventory), "equipment": ["minecraft:diamond_pickaxe", "advancedperipherals:geo_scanner"],
+            "current_job": self.current_job,
+        }
+
+    def register(self):
+        self.turtle_id = self.client.post_json("register", "/register", self.status())["id"]
+        self.scan()
+        return self.turtle_id
+
+    def report_status(self):
+        self.client.post_json("update", f"/update/{self.turtle_id}", self.status())
+
+    def run(self):
+        last_status = None
+        while not self.stop.is_set():
+            status = json.dumps(self.status(), sort_keys=True)
+            response = self.client.post_json(
+                "poll", f"/poll/{self.turtle_id}?wait={self.poll_wait}",
+                self.status() if status != last_status else {},
+            )
+            last_status = status
+            self.counts["polls"] += 1
+            for command in response.get("commands", []):
+                if self.stop.is_set():
+                    break
+                self.counts["commands"] += 1
+                if not self.execute(command):
+                    if not self.stop.is_set():
+                        self.counts["failed_commands"] += 1
+                        self.report_status()
+                    break
+        self.client.close()
+
+    # --- Commands ---
+    def execute(self, command):
+        parts = command.split()
+        name, args = parts[0], parts[1:]
+        if name == "goto":
+            return self.goto(*map(int, args))
+        if name == "mine" and len(args) == 3:
+            return self.mine(*map(int, args))
+        if name == "scanChunk":
+            return self.scan_chunk(*map(int, args))
+        if name in ("forward", "back", "up", "down"):
+            return self.move(name)
+        if name in ("turnLeft", "turnRight"):
+            return self.turn(1 if name == "turnRight" else -1)
+        if name == "faceDirection":
+            return self.face(int(args[0]))
+        # say, sethome and the rest have no effect on the server's view.
+        return True
+
+    def goto(self, x, y, z):
+        self.current_job = f"going to {x},{y},{z}"
+        self.report_status()
+        ok = True
+        while ok and self.y != y:
+            ok = self.dig_and_move("up" if self.y < y else "down")
+        for axis, target, minus, plus in (("z", z, 0, 2), ("x", x, 3, 1)):
+            while ok and getattr(self, axis) != target:
+                ok = self.face(minus if getattr(self, axis) > target else plus) and self.dig_and_move("forward")
+        self.current_job = "idle"
+        return ok
+
+    def scan_chunk(self, chunk_x=None, chunk_z=None):
+        """Sweeps a chunk's centre column from SCAN_TOP down, as scanChunk does."""
+        chunk_x = self.x // 16 if chunk_x is None else chunk_x
+        chunk_z = self.z // 16 if chunk_z is None else chunk_z
+        x, z = chunk_x * 16 + 7, chunk_z * 16 + 7
+        ok = self.goto(x, SCAN_TOP, z) and self.goto(x, SCAN_BOTTOM, z)
+        self.counts["chunks_scanned"] += int(ok)
+        return ok
+
+    def mine(self, x, y, z):
+        block = self.world.get(x, y, z)
+        if block != 0 and self.world.dig(x, y, z):
+            self._collect(block)
+        return True
+
+    def dig_and_move(self, direction):
+        dx, dy, dz = self._offset(direction)
+        target = (self.x + dx, self.y + dy, self.z + dz)
+        block = self.world.get(*target)
+        if block != 0:
+            if not self.world.dig(*target):
+                return False
+            self._collect(block)
+            self.counts["blocks_dug"] += 1
+        return self.move(direction)
+
+    def _collect(self, block):
+        self.inventory[BLOCK_NAMES[block]] += 1
+        self.counts["ores_mined"] += int(block in ORE_IDS)
+
+    def _offset(self, direction):
+        if direction == "up":
+            return 0, 1, 0
+        if direction == "down":
+            return 0, -1, 0
+        vx, _, vz = DIRECTION_VECTORS[self.dir]
+        sign = 1 if direction == "forward" else -1
+        return vx * sign, 0, vz * sign
+
+    def move(self, direction):
+        # Stopping the run cancels the current job, like checkCancel.
+        if self.fuel < 1 or self.stop.is_set():
+            return False
+        dx, dy, dz = self._offset(direction)
+        if self.world.get(self.x + dx, self.y + dy, self.z + dz) != 0:
+            return False
+        if self.move_seconds:
+            time.sleep(self.move_seconds)
+        self.x, self.y, self.z = self.x + dx, self.y + dy, self.z + dz
+        self.fuel -= 1
+        self.counts["moves"] += 1
+        self.report_status()
+        self.scan()
+        return True
+
+    def turn(self, step):
+        if self.move_seconds:
+            time.sleep(self.move_seconds)
+        self.dir = (self.dir + step) % 4
+        self.report_status()
+        return True
+
+    def face(self, direction):
+        diff = (direction - self.dir) % 4
+        if diff == 3:
+            return self.turn(-1)
+        for _ in range(diff):
+            self.turn(1)
+        return True
+
+    # --- Scans ---
+    def scan(self):
+        """Scans around the turtle and sends what changed, as sendScan does."""
+        origin = np.array([self.x, self.y, self.z])
+        cube = self.world.scan(origin)
+        changed, full = self._scan_delta(origin, cube)
+        if self.last_scan is not None and not len(changed[0]) and np.array_equal(origin, self.last_scan[0]):
+            self.last_scan = (origin, cube)
+            self.counts["scans_skipped"] += 1
+            return
+
+        self.scan_seq += 1
+        query = f"?seq={self.scan_seq}&blocks={len(full[0])}&radius={SCAN_RADIUS}"
+        response = None
+        if self.last_scan is not None:
+            response = self._post_scan(origin, changed, query + f"&base={self.last_scan_seq}")
+        if self.last_scan is None or (response and response.get("error") == "scan-base"):
+            response = self._post_scan(origin, full, query)
+
+        if response and response.get("status") == "ok":
+            self.last_scan, self.last_scan_seq = (origin, cube), self.scan_seq
+        else:
+            self.last_scan = None
+
+    def _scan_delta(self, origin, cube):
+        """
+        Returns (offsets, names) of the blocks changed since the last
+        accepted scan, and of the whole scan.
+        """
+        radius = SCAN_RADIUS
+        solid = cube != 0
+        full = (np.argwhere(solid) - radius, cube[solid])
+        if self.last_scan is None:
+            return full, full
+
+        last_origin, last = self.last_scan
+        shift = origin - last_origin
+        size = 2 * radius + 1
+        # Cells of this scan the last one also covered, and the matching cells there.
+        here = tuple(slice(max(0, -d), min(size, size - d)) for d in shift)
+        there = tuple(slice(max(0, d), min(size, size + d)) for d in shift)
+        previous = np.zeros_like(cube)
+        covered = np.zeros(cube.shape, dtype=bool)
+        previous[here] = last[there]
+        covered[here] = True
+
+        span = np.arange(-radius, radius + 1)
+        in_reach = (span[:, None, None] ** 2 + span[None, :, None] ** 2 + span[None, None, :] ** 2) <= radius * radius
+        changed = (solid & (~covered | (previous != cube))) | (covered & (previous != 0) & ~solid & in_reach)
+        return (np.argwhere(changed) - radius, cube[changed]), full
+
+    def _post_scan(self, origin, blocks, query):
+        offsets, ids = blocks
+        names = [BLOCK_NAMES[i] or "minecraft:air" for i in ids.tolist()]
+        path = f"/scan_report/{self.turtle_id}{query}"
+        body = encode_scan(origin.tolist(), offsets, names, self.palette_ids, self.palette_epoch)
+        response = self.client.request("scan_report", "POST", path, body, "application/octet-stream")
+        if response and response.get("error") == "palette":
+            self._update_palette(response)
+            body = encode_scan(origin.tolist(), offsets, names, self.palette_ids, self.palette_epoch)
+            response = self.client.request("scan_report", "POST", path, body, "application/octet-stream")
+        self._update_palette(response)
+        self.counts["scan_reports"] += 1
+        self.counts["scan_blocks"] += len(names)
+        self.counts["scan_bytes"] += len(body)
+        return response
+
+    def _update_palette(self, response):
+        if not response or "palette" not in response:
+            return
+        if response["palette_epoch"] != self.palette_epoch or response["palette_start"] == 0:
+            self.palette_epoch = response["palette_epoch"]
+            self.palette_ids = {}
+        for i, name in enumerate(response["palette"]):
+            self.palette_ids[name] = response["palette_start"] + i
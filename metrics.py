@@ -0,0 +1,240 @@
+"""
+Timing histograms, gauges and a sampling profiler, served as Prometheus
+text by the /metrics route.
+
+Request handlers are timed per route by app.py. Hot paths time their
+stages with `stage`:
+
+    with stage("scan_merge"):
+        world.insert_ids(coords, ids)
+
+Planning runs in worker processes, which have their own copy of this
+module; `recorded_stages` captures a worker's stage timings so they can be
+sent back with its result and replayed here with `record_stages`.
+"""
+import collections
+import contextlib
+import math
+import os
+import sys
+import threading
+import time
+
+
+# --- Constants ---
+# Histogram bucket upper bounds, in seconds.
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Seconds between profiler samples.
+PROFILE_INTERVAL = 0.005
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """A Prometheus histogram with a fixed set of labels."""
+
+    def __init__(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.lock = threading.Lock()
+        self.series = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted(self.series.items())
+            series = [(labels, list(buckets), total, count) for labels, (buckets, total, count) in series]
+        for label_values, buckets, total, count in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets, buckets):
+                cumulative += n
+                labels = _format_labels(self.labels + ("le",), label_values + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Callback:
+    """
+    A gauge or counter read when metrics are rendered. fn returns a number,
+    or {label values tuple: number} for a labelled metric.
+    """
+
+    def __init__(self, name, help, fn, kind="gauge", labels=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.labels = tuple(labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.fn()
+        if value is None:
+            return []
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        for label_values, v in sorted(values):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(v)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+STAGE_SECONDS = registry.add(Histogram(
+    "turtle_stage_seconds", "Time spent in each stage of the server's hot paths.", ("stage",)))
+
+_recording = threading.local()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Times a block of code as one observation of a stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        recorded = getattr(_recording, "stages", None)
+        if recorded is not None:
+            recorded.append((name, elapsed))
+        else:
+            STAGE_SECONDS.observe(elapsed, name)
+
+
+@contextlib.contextmanager
+def recorded_stages():
+    """Collects this thread's stage timings into a list instead of the histogram."""
+    previous = getattr(_recording, "stages", None)
+    _recording.stages = recorded = []
+    try:
+        yield recorded
+    finally:
+        _recording.stages = previous
+
+
+def record_stages(stages):
+    """Adds (stage, seconds) pairs collected by recorded_stages elsewhere."""
+    for name, seconds in stages:
+        STAGE_SECONDS.observe(seconds, name)
+
+
+def process_memory_bytes():
+    """Resident set size of this process, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class SamplingProfiler:
+    """
+    Samples every thread's stack at a fixed interval while running. The
+    counts come out in the collapsed format flame graph tools read, one
+    "frame;frame;frame count" line per distinct stack, outermost first.
+
+    Costs nothing until started; while running, one thread walks the other
+    threads' frames every interval.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.thread = None
+        self.stopping = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.stacks.clear()
+            self.samples = 0
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.stopping.set()
+            thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopping.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                    frame = frame.f_back
+                with self.lock:
+                    self.stacks[";".join(reversed(stack))] += 1
+            with self.lock:
+                self.samples += 1
+
+    def collapsed(self):
+        with self.lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+from world_store import section_keys
+
+
+# --- Constants ---
+# Start and destination are snapped to this many blocks when building a key,
+# so trips that begin or end a few blocks apart share one cached route.
+PATH_CACHE_QUANTUM = 8
+PATH_CACHE_SIZE = 256
+
+
+class PathCache:
+    """
+    LRU cache of planned routes keyed by quantized start and destination.
+
+    Each entry remembers which 16x16x16 sections its route passes through.
+    Registered as a WorldStore listener, the cache evicts every entry whose
+    sections see a block change, so a cached route never crosses terrain
+    that has been rescanned since it was planned. It listens to the
+    world's ObservedMap too: newly observed blocks no longer cost
+    UNKNOWN_COST, so routes through their sections are evicted as well.
+    Lookups, inserts and evictions hold a lock, so request threads can
+    share one cache.
+    """
+
+    def __init__(self, world, max_entries=PATH_CACHE_SIZE, quantum=PATH_CACHE_QUANTUM):
+        self.max_entries = max_entries
+        self.quantum = quantum
+        self.entries = OrderedDict()  # key -> (path, sections)
+        self.by_section = {}  # section key -> set of cache keys
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.RLock()
+        world.add_listener(self.on_blocks_changed)
+        world.observed.add_listener(self.on_observed)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, start, dest):
+        q = self.quantum
+        return tuple(int(v) // q for v in start) + tuple(int(v) // q for v in dest)
+
+    def get(self, start, dest):
+        """Returns the cached route for a trip, or None."""
+        key = self.key(start, dest)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, start, dest, path):
+        key = self.key(start, dest)
+        sections = set(section_keys(path))
+        with self.lock:
+            self._discard(key)
+            self.entries[key] = (path, sections)
+            for section in sections:
+                self.by_section.setdefault(section, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._discard(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        for section in entry[1]:
+            keys = self.by_section.get(section)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_section[section]
+        return True
+
+    def on_blocks_changed(self, coords, old_ids, new_ids):
+        """Evicts every cached route through a section that changed."""
+        self._invalidate(section_keys(coords))
+
+    def on_observed(self, keys, bits):
+        """Evicts every cached route through a section with newly observed blocks."""
+        self._invalidate([tuple(key) for key in keys.tolist()])
+
+    def _invalidate(self, sections):
+        with self.lock:
+            for section in sections:
+                for key in list(self.by_section.get(section, ())):
+                    if self._discard(key):
+                        self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,265 @@
+import heapq
+
+import numpy as np
+
+
+# --- Constants ---
+# Cost 0 is impassable, matching get_block_properties in app.py.
+IMPASSABLE = 0
+
+
+class CostGrid:
+    """
+    A uint8 cost grid indexed [x, y, z], flattened for searching.
+
+    The grid is copied once into a buffer with a one-voxel impassable border,
+    so neighbours are just `index + step` with no bounds checks, and costs are
+    read straight out of a bytes object instead of per-node Python objects.
+
+    min_cost, the cheapest passable cost, scales the A* heuristic: it stays
+    admissible, and in space that costs the same everywhere (unscanned
+    space, say) the search runs straight to the goal instead of flooding.
+    """
+
+    def __init__(self, costs):
+        costs = np.asarray(costs, dtype=np.uint8)
+        self.shape = costs.shape
+        passable = costs[costs != IMPASSABLE]
+        self.min_cost = int(passable.min()) if passable.size else 1
+        padded = np.zeros(tuple(n + 2 for n in costs.shape), dtype=np.uint8)
+        padded[1:-1, 1:-1, 1:-1] = costs
+        self.cells = padded.tobytes()
+        self.stride_y = padded.shape[2]
+        self.stride_x = padded.shape[1] * padded.shape[2]
+        # The six moves a turtle can make: +-x, +-y, +-z.
+        self.steps = (self.stride_x, -self.stride_x, self.stride_y, -self.stride_y, 1, -1)
+
+    def contains(self, point):
+        return all(0 <= int(v) < n for v, n in zip(point, self.shape))
+
+    def index(self, point):
+        x, y, z = (int(v) + 1 for v in point)
+        return x * self.stride_x + y * self.stride_y + z
+
+    def point(self, index):
+        x, rest = divmod(index, self.stride_x)
+        y, z = divmod(rest, self.stride_y)
+        return (x - 1, y - 1, z - 1)
+
+    def axis(self, step):
+        """Returns which coordinate (0, 1 or 2) a step moves along."""
+        step = abs(step)
+        return 0 if step == self.stride_x else 1 if step == self.stride_y else 2
+
+
+def find_path(costs, start, end, jump=False, max_expansions=None, turn_cost=0):
+    """
+    A* search over a cost grid with the six-neighbour turtle move model.
+
+    Stepping into a voxel costs its grid value, 0 is impassable, and the
+    heuristic is Manhattan distance times the grid's cheapest cost; this is
+    the cost model of pathfinding3d's AStarFinder without diagonal movement.
+
+    With jump=True, moves along a straight line of equal-cost voxels are
+    taken as one jump, stopping next to any cost change, where the line
+    lines up with the destination, or at the destination itself. This
+    expands fewer nodes in open, uniform areas, but around mixed costs the
+    path it finds is not always the cheapest, so it is off by default.
+    Should the jump search run out of nodes, a plain search is run so no
+    reachable path is missed.
+
+    With turn_cost, a horizontal move in a different direction from the
+    last horizontal move into a voxel also costs turn_cost per quarter turn
+    (vertical moves keep the turtle's facing). The search still keeps one
+    state per voxel, so this steers it towards straighter paths rather than
+    guaranteeing the fewest turns.
+
+    Args:
+        costs: (X, Y, Z) array-like of uint8 costs, or a CostGrid.
+        start: (x, y, z) grid coordinates of the start voxel.
+        end: (x, y, z) grid coordinates of the destination voxel.
+        jump: Whether to use jump-point expansion.
+        max_expansions: Give up after expanding this many nodes.
+        turn_cost: Extra cost of each quarter turn.
+
+    Returns:
+        tuple: (path, expanded) where path lists the (x, y, z) grid
+        coordinates of every voxel from start to end inclusive (empty if no
+        path was found) and expanded is the number of nodes expanded.
+    """
+    grid = costs if isinstance(costs, CostGrid) else CostGrid(costs)
+    if not grid.contains(start) or not grid.contains(end):
+        return [], 0
+
+    path, expanded, exhausted = _search(grid, grid.index(start), grid.index(end), jump, max_expansions, turn_cost)
+    if jump and exhausted:
+        path, more, _ = _search(grid, grid.index(start), grid.index(end), False, max_expansions, turn_cost)
+        expanded += more
+    return path, expanded
+
+
+def _search(grid, source, target, jump, max_expansions, turn_cost=0):
+    """Runs one A* search. Returns (path, expanded, exhausted_open_list)."""
+    cells, steps = grid.cells, grid.steps
+    if cells[target] == IMPASSABLE:
+        return [], 0, False
+
+    goal = tuple(v + 1 for v in grid.point(target))
+    stride_x, stride_y = grid.stride_x, grid.stride_y
+    min_cost = grid.min_cost
+
+    def heuristic(index):
+        x, rest = divmod(index, stride_x)
+        y, z = divmod(rest, stride_y)
+        return min_cost * (abs(x - goal[0]) + abs(y - goal[1]) + abs(z - goal[2]))
+
+    if jump:
+        # For each step, the four steps perpendicular to it, and a function
+        # telling whether a voxel lines up with the goal along that step.
+        perpendicular = {s: tuple(p for p in steps if p not in (s, -s)) for s in steps}
+        aligned = {
+            s: (
+                (lambda i: i // stride_x == goal[0]),
+                (lambda i: (i % stride_x) // stride_y == goal[1]),
+                (lambda i: i % stride_y == goal[2]),
+            )[grid.axis(s)]
+            for s in steps
+        }
+
+        def successor(index, step):
+            current = index + step
+            cost = cells[current]
+            if cost == IMPASSABLE:
+                return None, 0
+            total = cost
+            sides = perpendicular[step]
+            lined_up = aligned[step]
+            while current != target and cells[current + step] == cost and not lined_up(current):
+                if any(cells[current + side] != cost for side in sides):
+                    break
+                current += step
+                total += cost
+            return current, total
+    else:
+        def successor(index, step):
+            current = index + step
+            return current, cells[current]
+
+    # Last horizontal step into each voxel, when turns cost anything.
+    horizontal = (stride_x, -stride_x, 1, -1)
+    heading = {source: None}
+    g = {source: 0}
+    parent = {source: None}
+    closed = set()
+    h = heuristic(source)
+    open_list = [(h, h, source)]
+    expanded = 0
+
+    while open_list:
+        _, _, index = heapq.heappop(open_list)
+        if index == target:
+            return _backtrace(grid, parent, target), expanded, False
+        if index in closed:
+            continue
+        closed.add(index)
+        expanded += 1
+        if max_expansions is not None and expanded > max_expansions:
+            return [], expanded, False
+
+        base = g[index]
+        facing = heading[index] if turn_cost else None
+        for step in steps:
+            neighbour, cost = successor(index, step)
+            if cost == IMPASSABLE or neighbour in closed:
+                continue
+            ng = base + cost
+            if facing is not None and step != facing and step in horizontal:
+                ng += turn_cost if step != -facing else 2 * turn_cost
+            if ng < g.get(neighbour, ng + 1):
+                g[neighbour] = ng
+                parent[neighbour] = index
+                if turn_cost:
+                    heading[neighbour] = step if step in horizontal else facing
+                h = heuristic(neighbour)
+                heapq.heappush(open_list, (ng + h, h, neighbour))
+
+    return [], expanded, True
+
+
+def distances(costs, source, targets, reverse=False):
+    """
+    Dijkstra from one voxel to a set of target voxels on a cost grid.
+
+    The search stops as soon as every target has been settled, so it is
+    cheap when the targets are close together, as portals of one section are.
+
+    Args:
+        costs: (X, Y, Z) array-like of uint8 costs, or a CostGrid.
+        source: (x, y, z) grid coordinates to search from.
+        targets: Iterable of (x, y, z) grid coordinates.
+        reverse: Measure the cost of travelling from each target to the
+            source instead of from the source to each target.
+
+    Returns:
+        dict: (x, y, z) target -> path cost, for every reachable target.
+    """
+    grid = costs if isinstance(costs, CostGrid) else CostGrid(costs)
+    cells, steps = grid.cells, grid.steps
+    if not grid.contains(source):
+        return {}
+    source = grid.index(source)
+    if reverse and cells[source] == IMPASSABLE:
+        return {}
+    remaining = {grid.index(t): tuple(int(v) for v in t) for t in targets if grid.contains(t)}
+
+    found = {}
+    dist = {source: 0}
+    open_list = [(0, source)]
+    while open_list and remaining:
+        d, index = heapq.heappop(open_list)
+        if d > dist[index]:
+            continue
+        target = remaining.pop(index, None)
+        if target is not None:
+            found[target] = d
+
+        for step in steps:
+            neighbour = index + step
+            if cells[neighbour] == IMPASSABLE:
+                continue
+            # Every step pays for the voxel it enters; walking backwards, that
+            # is the voxel we are expanding from.
+            nd = d + (cells[index] if reverse else cells[neighbour])
+            if nd < dist.get(neighbour, nd + 1):
+                dist[neighbour] = nd
+                heapq.heappush(open_list, (nd, neighbour))
+    return found
+
+
+def _backtrace(grid, parent, target):
+    """Walks parents back from the target, filling in the voxels skipped by jumps."""
+    jumps = []
+    index = target
+    while index is not None:
+        jumps.append(grid.point(index))
+        index = parent[index]
+    jumps.reverse()
+
+    path = [jumps[0]]
+    for a, b in zip(jumps, jumps[1:]):
+        axis = next(i for i in range(3) if a[i] != b[i])
+        direction = 1 if b[axis] > a[axis] else -1
+        for v in range(a[axis] + direction, b[axis] + direction, direction):
+            p = list(a)
+            p[axis] = v
+            path.append(tuple(p))
+    return path
+
+
+def path_cost(costs, path):
+    """Total cost of a path over a cost grid: the sum of every voxel entered."""
+    costs = np.asarray(costs)
+    if len(path) < 2:
+        return 0
+    steps = np.asarray(path[1:])
+    return int(costs[steps[:, 0], steps[:, 1], steps[:, 2]].sum(dtype=np.int64))
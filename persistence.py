@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import shutil
+import struct
+import threading
+import time
+
+import numpy as np
+
+from world_store import SECTION_BYTES
+
+
+# --- Constants ---
+# The log is folded into a new snapshot once it grows past this size...
+COMPACT_LOG_BYTES = 64 * 1024 * 1024
+# ...checked this often, in seconds, by a background thread.
+COMPACT_INTERVAL = 60
+
+# Log records: a uint8 type and uint32 payload length, then the payload.
+RECORD_HEADER = struct.Struct("<BI")
+BLOCKS, PALETTE, TURTLE, OBSERVED = 1, 2, 3, 4
+# BLOCKS payload: N int32 (x, y, z) triples followed by N uint16 palette IDs.
+BLOCK_RECORD = 3 * 4 + 2
+# OBSERVED payload: N int32 section keys followed by N sections of bits.
+OBSERVED_RECORD = 3 * 4 + SECTION_BYTES
+
+SNAPSHOT_ARRAYS = ("section_keys", "sections", "section_counts", "index_coords", "index_counts",
+                   "observed_keys", "observed")
+
+log = logging.getLogger(__name__)
+
+
+class Persistence:
+    """
+    Keeps the world store and turtle registry on disk.
+
+    State lives in numbered generations inside a data directory:
+
+        snapshot-<n>/   arrays from WorldStore.dump as .npy files, plus
+                        state.json with the palette, turtles and epoch
+        wal-<n>.log     every change made after snapshot n was taken
+
+    Block changes and newly observed positions (in binary), new palette
+    names and turtle registry changes are appended to the log as they
+    happen, from store and registry listeners. On boot the newest complete snapshot is memory-mapped
+    copy-on-write and the logs from its generation on are replayed, so
+    startup reads only the log tail and the pages that get used.
+
+    Compaction writes the next snapshot and starts a new log. The switch
+    happens under the store and registry locks; the files are written
+    after, and older generations are only removed once the new snapshot is
+    complete, so a crash at any point leaves a loadable state.
+    """
+
+    def __init__(self, data_dir, world, turtles):
+        self.data_dir = data_dir
+        self.world = world
+        self.turtles = turtles
+        self.generation = 0
+        self.palette_logged = 0
+        self.log = None
+        self.log_lock = threading.Lock()
+        self.compacting = threading.Lock()
+        os.makedirs(data_dir, exist_ok=True)
+
+    # --- Paths ---
+    def _snapshot_dir(self, generation):
+        return os.path.join(self.data_dir, f"snapshot-{generation}")
+
+    def _log_path(self, generation):
+        return os.path.join(self.data_dir, f"wal-{generation}.log")
+
+    def _generations(self, prefix, suffix=""):
+        found = []
+        for name in os.listdir(self.data_dir):
+            if name.startswith(prefix) and name.endswith(suffix):
+                number = name[len(prefix):len(name) - len(suffix)]
+                if number.isdigit():
+                    found.append(int(number))
+        return sorted(found)
+
+    # --- Boot ---
+    def load(self, palette_epoch):
+        """
+        Restores the newest snapshot and replays the log, then starts
+        logging changes. Must run before anything else touches the world
+        store or registry.
+
+        Args:
+            palette_epoch: Epoch to use if there is no saved state yet.
+
+        Returns:
+            int: The palette epoch the restored palette belongs to.
+        """
+        snapshots = [g for g in self._generations("snapshot-")
+                     if os.path.exists(os.path.join(self._snapshot_dir(g), "state.json"))]
+        if snapshots:
+            self.generation = snapshots[-1]
+            palette_epoch = self._load_snapshot(self._snapshot_dir(self.generation))
+
+        replayed = 0
+        logs = [g for g in self._generations("wal-", ".log") if g >= self.generation]
+        for generation in logs:
+            replayed += self._replay(self._log_path(generation))
+        # Keep appending to the newest log; anything older is folded in at
+        # the next compaction.
+        self.generation = max([self.generation] + logs)
+        self.palette_logged = len(self.world.palette)
+        self.log = open(self._log_path(self.generation), "ab")
+        self.palette_epoch = palette_epoch
+
+        self.world.add_listener(self.on_blocks_changed)
+        self.world.observed.add_listener(self.on_observed)
+        self.turtles.add_listener(self.on_turtle_changed)
+        log.info("Loaded %d blocks and %d turtles from %s (generation %d, %d log records)",
+                 len(self.world), len(self.turtles), self.data_dir, self.generation, replayed)
+        return palette_epoch
+
+    def _load_snapshot(self, path):
+        with open(os.path.join(path, "state.json")) as f:
+            state = json.load(f)
+        # Older snapshots have no observed bits.
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="c") for name in SNAPSHOT_ARRAYS
+                  if os.path.exists(os.path.join(path, f"{name}.npy"))}
+        self.world.restore(state["palette"], **arrays)
+        self.turtles.restore(state["turtles"])
+        return state["palette_epoch"]
+
+    def _replay(self, path):
+        """Applies every complete record in a log. Returns the number applied."""
+        with open(path, "rb") as f:
+            data = f.read()
+        position = applied = 0
+        while position + RECORD_HEADER.size <= len(data):
+            kind, length = RECORD_HEADER.unpack_from(data, position)
+            start = position + RECORD_HEADER.size
+            if start + length > len(data):
+                break
+            payload = data[start:start + length]
+            if kind == BLOCKS:
+                count = length // BLOCK_RECORD
+                coords = np.frombuffer(payload, dtype="<i4", count=3 * count).reshape(-1, 3)
+                ids = np.frombuffer(payload, dtype="<u2", offset=12 * count)
+                self.world.insert_ids(coords.astype(np.int64), ids)
+            elif kind == OBSERVED:
+                count = length // OBSERVED_RECORD
+                keys = np.frombuffer(payload, dtype="<i4", count=3 * count).reshape(-1, 3)
+                bits = np.frombuffer(payload, dtype=np.uint8, offset=12 * count).reshape(-1, SECTION_BYTES)
+                self.world.observed.merge(keys.astype(np.int64), bits)
+            elif kind == PALETTE:
+                self.world.name_id(payload.decode())
+            elif kind == TURTLE:
+                change = json.loads(payload)
+                self.turtles.apply(change["op"], change["id"], change.get("value"))
+            position = start + length
+            applied += 1
+        if position < len(data):
+            # A torn record from a crash mid-write: drop it so appends line up.
+            log.warning("Dropping %d bytes of incomplete log in %s", len(data) - position, path)
+            with open(path, "r+b") as f:
+                f.truncate(position)
+        return applied
+
+    # --- Logging ---
+    def _append(self, kind, payload):
+        with self.log_lock:
+            self.log.write(RECORD_HEADER.pack(kind, len(payload)) + payload)
+            self.log.flush()
+
+    def on_blocks_changed(self, coords, old_ids, new_ids):
+        # Runs under the world lock, so the palette cannot change meanwhile.
+        palette = self.world.palette
+        for name in palette[self.palette_logged:]:
+            self._append(PALETTE, name.encode())
+        self.palette_logged = len(palette)
+        coords = np.asarray(coords, dtype="<i4").reshape(-1, 3)
+        self._append(BLOCKS, coords.tobytes() + np.asarray(new_ids, dtype="<u2").tobytes())
+
+    def on_observed(self, keys, bits):
+        # Runs under the world lock, like on_blocks_changed.
+        self._append(OBSERVED, np.asarray(keys, dtype="<i4").tobytes() + np.asarray(bits, dtype=np.uint8).tobytes())
+
+    def on_turtle_changed(self, op, turtle_id, value):
+        self._append(TURTLE, json.dumps({"op": op, "id": turtle_id, "value": value}).encode())
+
+    # --- Compaction ---
+    def log_size(self):
+        with self.log_lock:
+            return self.log.tell()
+
+    def compact(self):
+        """Writes a snapshot of the current state and starts a fresh log."""
+        with self.compacting:
+            with self.world.lock, self.turtles.lock:
+                arrays = self.world.dump()
+                state = {
+                    "palette": list(self.world.palette),
+                    "palette_epoch": self.palette_epoch,
+                    "turtles": self.turtles.dump(),
+                }
+                with self.log_lock:
+                    self.log.close()
+                    self.generation += 1
+                    self.log = open(self._log_path(self.generation), "ab")
+            generation = self.generation
+
+            path = self._snapshot_dir(generation)
+            temp = path + ".tmp"
+            shutil.rmtree(temp, ignore_errors=True)
+            os.makedirs(temp)
+            for name in SNAPSHOT_ARRAYS:
+                np.save(os.path.join(temp, f"{name}.npy"), arrays[name])
+            with open(os.path.join(temp, "state.json"), "w") as f:
+                json.dump(state, f)
+            os.replace(temp, path)
+
+            # The new snapshot covers everything older.
+            for old in self._generations("snapshot-"):
+                if old < generation:
+                    shutil.rmtree(self._snapshot_dir(old), ignore_errors=True)
+            for old in self._generations("wal-", ".log"):
+                if old < generation:
+                    os.remove(self._log_path(old))
+            log.info("Compacted %d sections into %s", len(arrays["section_keys"]), path)
+
+    def start_compactor(self, interval=COMPACT_INTERVAL, max_log_bytes=COMPACT_LOG_BYTES):
+        """Compacts in a daemon thread whenever the log outgrows max_log_bytes."""
+        def run():
+            while True:
+                time.sleep(interval)
+                if self.log_size() > max_log_bytes:
+                    self.compact()
+
+        thread = threading.Thread(target=run, name="compactor", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        with self.log_lock:
+            if self.log is not None:
+                self.log.close()
+                self.log = None
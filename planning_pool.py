@@ -0,0 +1,468 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+from functools import partial
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from metrics import record_stages, recorded_stages, stage
+from route_planner import RoutePlanner
+from section_graph import SectionGraph
+from task_allocator import order_tour
+from world_store import SECTION_SIZE, WorldStore
+
+
+# --- Constants ---
+PLANNING_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Finished jobs kept around for the status endpoint.
+JOB_HISTORY = 1000
+
+# Scanned sections within this many blocks of the straight line of a leg
+# are sent along with it. Anything further away looks like unscanned space
+# to the worker.
+SNAPSHOT_MARGIN = 32
+# Distance from a section's centre to its farthest corner.
+_SECTION_REACH = SECTION_SIZE / 2 * 3 ** 0.5
+
+
+# A job step that goes to a block and digs it out, then digs its way
+# through the blocks in vein, in order (see veins.py). It is not planned with
+# the job: it waits in the turtle's task backlog (task_queue.py) and its leg
+# is planned only when it nears the head.
+MineTask = namedtuple("MineTask", ["target", "vein"], defaults=((),))
+
+# A job step that mines veins, given as MineTasks, in the order that costs
+# least by the paths planned between them (see plan_tour). The ordered
+# tasks then wait in the task backlog like any other MineTask.
+Tour = namedtuple("Tour", ["start", "tasks"])
+
+
+def _timed(function, *args):
+    """
+    Runs in a worker process: calls a planning function and returns its
+    result with the stage timings it recorded, for the server's metrics.
+    """
+    with recorded_stages() as stages:
+        result = function(*args)
+    return result, stages
+
+
+def plan_leg(sections, observed, costs, start, dest, routes=(None,)):
+    """
+    Runs in a worker process: plans one leg over a copy of the sections
+    around it and their observed bits, along its abstract route from the
+    server's section graph if it has one (routes, from leg_snapshot).
+    Returns the same path list as RoutePlanner.plan.
+    """
+    world = WorldStore.from_sections(sections, observed)
+    return RoutePlanner(world, lambda: costs).refine(start, dest, routes[0])
+
+
+def plan_tour(sections, observed, costs, start, tasks, routes=()):
+    """
+    Runs in a worker process: orders a Tour's MineTasks with order_tour,
+    by the cost of the paths planned between their targets. Legs are
+    planned once per pair and their cost reused for the way back. The legs
+    of the given order are refined along their routes from leg_snapshot;
+    any other pair is searched here.
+
+    Returns:
+        list: The tasks in visiting order. Tasks no planned path reaches
+        come last, for the task backlog to try again from where the turtle
+        is by then.
+    """
+    world = WorldStore.from_sections(sections, observed)
+    planner = RoutePlanner(world, lambda: costs)
+    stops = [tuple(start)] + [tuple(task.target) for task in tasks]
+    known = dict(zip(zip(stops, stops[1:]), routes))
+    leg_costs = {}
+
+    def leg_cost(a, b):
+        if (b, a) in leg_costs:
+            return leg_costs[(b, a)]
+        if (a, b) not in leg_costs:
+            path = planner.refine(a, b, known[(a, b)]) if (a, b) in known else planner.plan(a, b)
+            leg_costs[(a, b)] = int(planner.point_costs(path[1:]).sum(dtype=np.int64)) if path else None
+        return leg_costs[(a, b)]
+
+    by_target = {tuple(task.target): task for task in tasks}
+    with stage("tour_order"):
+        order = order_tour(tuple(start), list(by_target), leg_cost)
+    ordered = [by_target[target] for target in order]
+    reached = set(order)
+    return ordered + [task for target, task in by_target.items() if target not in reached]
+
+
+def plan_join(sections, observed, costs, start, dest, route, routes=(None, None)):
+    """
+    Runs in a worker process: plans a trip onto a cached route, with short
+    legs from start to the route's first point and from its last point to
+    dest (see join_points), along their abstract routes from leg_snapshot
+    if they have any.
+    Returns the whole path, or None if either leg could not be planned.
+    """
+    world = WorldStore.from_sections(sections, observed)
+    planner = RoutePlanner(world, lambda: costs)
+    head = planner.refine(start, route[0], routes[0])
+    tail = planner.refine(route[-1], dest, routes[1])
+    if not head or not tail:
+        return None
+    return head + [tuple(p) for p in route[1:]] + tail[1:]
+
+
+def join_points(start, dest, route):
+    """
+    Where a trip joins a cached route for a nearby trip: the index of the
+    route's point closest to start, and after it, of the one closest to dest.
+    """
+    route = np.asarray(route)
+    enter = int(np.abs(route - start).sum(axis=1).argmin())
+    leave = enter + int(np.abs(route[enter:] - dest).sum(axis=1).argmin())
+    return enter, leave
+
+
+def corridor_keys(legs, margin=SNAPSHOT_MARGIN):
+    """
+    Keys of the sections within about margin blocks of the straight line of
+    any (start, dest) leg, as an (N, 3) array. Their number grows with the
+    length of a leg rather than the volume of its bounding box.
+    """
+    keys = []
+    for start, dest in legs:
+        a = np.asarray(start, dtype=np.float64)
+        b = np.asarray(dest, dtype=np.float64)
+        lo = (np.minimum(a, b).astype(np.int64) - margin) >> 4
+        hi = (np.maximum(a, b).astype(np.int64) + margin) >> 4
+        axes = [np.arange(l, h + 1) for l, h in zip(lo, hi)]
+        grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+        # Distance from each section's centre to the nearest point of the leg.
+        centres = grid * SECTION_SIZE + (SECTION_SIZE - 1) / 2
+        along = b - a
+        t = np.clip((centres - a) @ along / max(along @ along, 1), 0, 1)
+        distance = np.linalg.norm(centres - (a + t[:, None] * along), axis=1)
+        keys.append(grid[distance <= margin + _SECTION_REACH])
+    return np.unique(np.concatenate(keys), axis=0)
+
+
+def region_snapshot(world, costs, legs):
+    """Returns the (sections, observed bits, costs) a worker needs to plan some (start, dest) legs."""
+    return _export(world, costs, corridor_keys(legs))
+
+
+def _export(world, costs, keys):
+    keys = [tuple(key) for key in keys.tolist()]
+    with world.lock:
+        return world.export_keys(keys), world.observed.export_keys(keys), costs
+
+
+def leg_snapshot(planner, costs, legs):
+    """
+    Runs in the server: searches the planner's long-lived section graph for
+    the abstract route of each (start, dest) leg, and copies the sections a
+    worker needs to plan them: those around the straight line of each leg
+    (corridor_keys), plus the boxes refine searches along a routed one
+    (SectionGraph.route_keys). Both happen under one hold of the world
+    lock, so the routes and the sections agree.
+
+    Returns:
+        tuple: ([abstract route or None per leg], (sections, observed, costs)).
+    """
+    with planner.world.lock:
+        routes = [planner.abstract_route(start, dest) for start, dest in legs]
+        keys = [corridor_keys(legs)] + [SectionGraph.route_keys(route) for route in routes if route]
+        return routes, _export(planner.world, costs, np.unique(np.concatenate(keys), axis=0))
+
+
+class PlanningJob:
+    """
+    An ordered list of steps for one turtle. A step is either a command
+    string, queued as is, a (start, dest) leg that is planned in the
+    worker pool and queued as the goto commands of its path, a Tour,
+    ordered in the worker pool, or a MineTask, passed on unplanned.
+    """
+
+    def __init__(self, job_id, turtle_id, steps):
+        self.id = job_id
+        self.turtle_id = turtle_id
+        self.steps = steps
+        self.legs = [i for i, step in enumerate(steps) if not isinstance(step, (str, MineTask))]
+        # step index -> planned path ([] if none was found), or a Tour's ordered tasks
+        self.paths = {}
+        self.errors = []
+        self.futures = []
+        self.snapshot = None
+        self.status = "planning"
+        self.created = time.time()
+        self.finished_at = None
+
+    def done(self):
+        return len(self.paths) == len(self.legs)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "turtle_id": self.turtle_id,
+            "status": self.status,
+            "legs": len(self.legs),
+            "planned": len(self.paths),
+            "unreachable": sum(1 for i in self.legs if i in self.paths and not self.paths[i]),
+            "errors": self.errors,
+            "seconds": round((self.finished_at or time.time()) - self.created, 3),
+        }
+
+
+class _Pending:
+    """
+    A leg waiting on the routing thread and then the process pool.
+    Cancelling it drops the leg at whichever of the two it has reached.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            future = self.future
+        if future is not None:
+            future.cancel()
+
+    def attach(self, future):
+        """Hands over the worker's future. Returns False, cancelling it, if the leg was cancelled."""
+        with self.lock:
+            if not self.cancelled:
+                self.future = future
+                return True
+        future.cancel()
+        return False
+
+
+class PlanningPool:
+    """
+    Plans jobs in a process pool so HTTP handlers never wait on A*.
+
+    Each leg first goes through one routing thread in the server, which
+    runs the job's snapshot: the abstract search over the server's
+    long-lived section graph, and a copy of the sections around the route
+    it finds. Workers then only refine that route, so the graph's cached
+    portals and edges are built once rather than again for every leg.
+
+    Jobs are released by collect() in the order they were submitted for each
+    turtle, so commands queued behind a job still run after its legs.
+    """
+
+    def __init__(self, workers=PLANNING_WORKERS, on_done=None):
+        """
+        Args:
+            workers: Number of planning processes.
+            on_done: Called as on_done(job) when a job finishes planning,
+                from the executor's callback thread with no locks held.
+        """
+        self.workers = workers
+        self.on_done = on_done
+        self.executor = None
+        self.router = None
+        self.jobs = {}  # job id -> PlanningJob
+        self.pending = {}  # turtle id -> [PlanningJob] in submission order
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def _executor(self):
+        if self.executor is None:
+            # Spawned workers only import the planning modules, not the app.
+            context = multiprocessing.get_context("spawn")
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self.executor
+
+    def _router(self):
+        if self.router is None:
+            # One thread, so searches of the section graph never contend for it.
+            self.router = ThreadPoolExecutor(max_workers=1, thread_name_prefix="router")
+        return self.router
+
+    def submit(self, turtle_id, steps, joins, snapshot):
+        """
+        Starts planning a job and returns it immediately.
+
+        Args:
+            turtle_id: The turtle whose queue receives the commands.
+            steps: List of command strings, (start, dest) legs, Tours and
+                MineTasks.
+            joins: {step index: route} for legs that can ride a cached
+                route, trimmed to the points they join it at (join_points).
+                Only the short legs onto and off it are planned, and the
+                whole leg if those fail.
+            snapshot: Callable (legs) -> (routes, (sections, observed,
+                costs)), as from leg_snapshot, for the (start, dest) legs a
+                worker still needs to plan. It runs on the routing thread.
+                A Tour's legs run from its start through its tasks in the
+                order given.
+        """
+        job = PlanningJob(str(next(self.ids)), turtle_id, steps)
+        job.snapshot = snapshot
+        with self.lock:
+            self.jobs[job.id] = job
+            self.pending.setdefault(turtle_id, []).append(job)
+
+        for index in job.legs:
+            if isinstance(steps[index], Tour):
+                start, tasks = steps[index]
+                stops = [start] + [task.target for task in tasks]
+                self._submit_leg(job, index, plan_tour, list(zip(stops, stops[1:])), start, tasks)
+                continue
+            start, dest = steps[index]
+            route = joins.get(index)
+            if route is None:
+                self._submit_leg(job, index, plan_leg, [(start, dest)], start, dest)
+            else:
+                legs = [(start, route[0]), (route[-1], dest)]
+                self._submit_leg(job, index, plan_join, legs, start, dest, route)
+        with self.lock:
+            self._update_status(job)
+        return job
+
+    def _submit_leg(self, job, index, function, legs, *args):
+        pending = self._route(job.snapshot, function, legs, args, partial(self._leg_done, job, index))
+        with self.lock:
+            job.futures.append(pending)
+
+    def _route(self, snapshot, function, legs, args, done):
+        """
+        Queues legs on the routing thread, which takes snapshot(legs) and
+        submits function(sections, observed, costs, *args, routes) to the
+        process pool. done(future) runs when the worker finishes.
+
+        Returns:
+            _Pending: Cancel it to drop the legs.
+        """
+        pending = _Pending()
+        self._router().submit(self._start, pending, snapshot, function, legs, args, done)
+        return pending
+
+    def _start(self, pending, snapshot, function, legs, args, done):
+        # Runs on the routing thread.
+        if pending.cancelled:
+            return
+        try:
+            with stage("snapshot"):
+                routes, region = snapshot(legs)
+            future = self._executor().submit(_timed, function, *region, *args, routes)
+        except Exception as error:
+            future = Future()
+            future.set_exception(error)
+        if pending.attach(future):
+            future.add_done_callback(done)
+
+    def plan(self, start, dest, snapshot, callback):
+        """
+        Plans a single leg that belongs to no job, for callers that keep
+        their own order. callback(path) runs on the executor's callback
+        thread with no locks held; path is [] if none was found.
+
+        Returns:
+            _Pending: Cancel it to drop the result.
+        """
+        return self._route(snapshot, plan_leg, [(start, dest)], (start, dest), partial(self._plan_done, callback=callback))
+
+    def _plan_done(self, future, callback):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            path = []
+        else:
+            path, stages = future.result()
+            record_stages(stages)
+        callback(path)
+
+    def _leg_done(self, job, index, future):
+        # Runs on the executor's callback thread.
+        with self.lock:
+            if future.cancelled() or job.status == "cancelled":
+                return
+            error = future.exception()
+            if error is not None:
+                job.errors.append(repr(error))
+                job.paths[index] = []
+            else:
+                path, stages = future.result()
+                record_stages(stages)
+                if path is None:
+                    # A cached route could not be joined: plan the whole leg.
+                    retry = True
+                else:
+                    retry = False
+                    job.paths[index] = path
+            planning = job.status == "planning"
+            self._update_status(job)
+            finished = planning and job.status == "done"
+        if error is None and retry:
+            start, dest = job.steps[index]
+            self._submit_leg(job, index, plan_leg, [(start, dest)], start, dest)
+        if finished and self.on_done is not None:
+            self.on_done(job)
+
+    def _update_status(self, job):
+        if job.status == "planning" and job.done():
+            job.status = "done"
+            job.finished_at = time.time()
+
+    def collect(self):
+        """Returns finished jobs that are next in line for their turtle."""
+        ready = []
+        with self.lock:
+            for turtle_id, jobs in list(self.pending.items()):
+                while jobs and jobs[0].done():
+                    ready.append(jobs.pop(0))
+                if not jobs:
+                    del self.pending[turtle_id]
+            self._prune()
+        return ready
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status != "planning"]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self.jobs[job_id]
+
+    def job_dicts(self):
+        """Returns to_dict() for every job still on record."""
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def job_dict(self, job_id):
+        """Returns to_dict() for one job, or None if it is unknown."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def status_counts(self):
+        """Returns {status: jobs on record with that status}."""
+        with self.lock:
+            return dict(Counter(job.status for job in self.jobs.values()))
+
+    def has_pending(self, turtle_id):
+        return bool(self.pending.get(turtle_id))
+
+    def cancel(self, turtle_id):
+        """Cancels every job still waiting to be queued for a turtle."""
+        with self.lock:
+            for job in self.pending.pop(turtle_id, []):
+                for future in job.futures:
+                    future.cancel()
+                job.status = "cancelled"
+                job.finished_at = time.time()
+
+    def wait(self, timeout=None):
+        """Blocks until every submitted leg has been planned. Returns True if all finished."""
+        deadline = None if timeout is None else time.time() + timeout
+        while any(job.status == "planning" for job in list(self.jobs.values())):
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
@@ -0,0 +1,151 @@
+from metrics import stage
+from pathfinder import find_path
+from section_graph import SectionGraph
+from waypoints import smooth_path
+from world_store import AIR_ID
+
+
+# --- Constants ---
+# A* gives up after expanding this many nodes rather than stalling the server.
+MAX_PATH_EXPANSIONS = 500000
+
+# Routes longer than this (Manhattan distance, in blocks) are planned over
+# the section graph instead of a padded bounding box.
+SECTION_PATH_DISTANCE = 48
+
+# Padding around start and destination for the bounding-box search.
+BOX_PADDING = 5
+
+# Cost of a quarter turn, in the same units as block costs. A turn takes a
+# turtle about as long as a move through air.
+TURN_COST = 1
+
+# Reshape planned paths into goto-sized stretches where it costs no more.
+SMOOTH_PATHS = True
+
+# Cost of a position no scan has reached. The world store reads those as
+# air, but underground they are mostly rock the turtle digs through
+# unplanned, so they cost between dirt (5) and stone (8): routes keep to
+# known air where it is not much of a detour, and still cross unmapped
+# space rather than fail. None costs unknown space as air.
+UNKNOWN_COST = 6
+
+
+class RoutePlanner:
+    """
+    Plans block-by-block routes over a WorldStore.
+
+    Long routes go through the section graph, whose cost grows with the
+    number of sections crossed. Short routes, and long ones the section
+    graph could not plan, use A* over a padded bounding box. The two steps
+    of plan can run apart: abstract_route over the server's long-lived
+    graph, and refine in a planning worker (see planning_pool.py).
+
+    Planning holds the world store's lock, so the section graph is never
+    built from a half-applied scan when the planner is shared between
+    threads.
+
+    Box searches charge for turns, and finished paths are smoothed (see
+    waypoints.smooth_path) so they take fewer gotos and turns to follow.
+
+    Space the turtles have never observed (see ObservedMap) costs
+    unknown_cost rather than the cost of air.
+    """
+
+    def __init__(self, world, cost_table, turn_cost=TURN_COST, smooth=SMOOTH_PATHS, unknown_cost=UNKNOWN_COST):
+        """
+        Args:
+            world: The WorldStore to plan over.
+            cost_table: Callable returning the palette index -> cost array.
+            turn_cost: Cost of a quarter turn, 0 to ignore turns.
+            smooth: Whether to smooth planned paths.
+            unknown_cost: Cost of unobserved positions, None to cost them as air.
+        """
+        self.world = world
+        self.cost_table = cost_table
+        self.turn_cost = turn_cost
+        self.smooth = smooth
+        self.unknown_cost = unknown_cost
+        self.section_graph = SectionGraph(world, cost_table, unknown_cost)
+
+    def plan(self, start, dest):
+        """
+        Returns:
+            list: (x, y, z) world coordinates from start to destination, or
+            an empty list if no path was found.
+        """
+        with self.world.lock:
+            return self.refine(start, dest, self.abstract_route(start, dest))
+
+    def abstract_route(self, start, dest):
+        """
+        The section graph's abstract route for a long leg (see
+        SectionGraph.abstract_route), to pass to refine. None for a leg
+        short enough for a box search, or if the graph found no route.
+        """
+        distance = sum(abs(int(d) - int(s)) for s, d in zip(start, dest))
+        if distance <= SECTION_PATH_DISTANCE:
+            return None
+        with self.world.lock, stage("section_graph"):
+            return self.section_graph.abstract_route(start, dest) or None
+
+    def refine(self, start, dest, route):
+        """
+        Plans a leg along an abstract route from abstract_route, or with a
+        box search if there is none or it could not be refined, and smooths
+        the path.
+
+        Returns:
+            list: (x, y, z) world coordinates from start to destination, or
+            an empty list if no path was found.
+        """
+        with self.world.lock:
+            path = []
+            if route:
+                with stage("section_graph"):
+                    path = self.section_graph.refine(route)
+            if not path:
+                path = self._box_path(start, dest)
+            if self.smooth and path:
+                with stage("smooth"):
+                    path = smooth_path(path, self.point_costs, self.turn_cost)
+            return path
+
+    def point_costs(self, points):
+        """Returns the cost of moving into each of the (N, 3) positions."""
+        ids = self.world.ids_at(points)
+        costs = self.cost_table()[ids]
+        if self.unknown_cost is not None:
+            costs[(ids == AIR_ID) & ~self.world.observed.observed_at(points)] = self.unknown_cost
+        return costs
+
+    def _box_path(self, start, dest):
+        """A* over the bounding box of start and dest, padded by BOX_PADDING."""
+        start_x, start_y, start_z = (int(v) for v in start)
+        dest_x, dest_y, dest_z = (int(v) for v in dest)
+
+        # Determine grid boundaries
+        min_x = min(start_x, dest_x) - BOX_PADDING
+        max_x = max(start_x, dest_x) + BOX_PADDING
+        min_y = min(start_y, dest_y) - BOX_PADDING
+        max_y = max(start_y, dest_y) + BOX_PADDING
+        min_z = min(start_z, dest_z) - BOX_PADDING
+        max_z = max(start_z, dest_z) + BOX_PADDING
+
+        # Create cost matrix: palette IDs for the box mapped through the cost
+        # table, with unobserved positions at the unknown cost, put together
+        # from the section graph's cached section costs.
+        with stage("grid_build"):
+            grid_matrix = self.section_graph.box_costs((min_x, min_y, min_z), (max_x, max_y, max_z))
+
+        with stage("astar"):
+            path, _ = find_path(
+                grid_matrix,
+                (start_x - min_x, start_y - min_y, start_z - min_z),
+                (dest_x - min_x, dest_y - min_y, dest_z - min_z),
+                max_expansions=MAX_PATH_EXPANSIONS,
+                turn_cost=self.turn_cost,
+            )
+
+        # Translate grid path back to world coordinates
+        return [(x + min_x, y + min_y, z + min_z) for x, y, z in path]
@@ -0,0 +1,136 @@
+"""
+Compact binary scan reports.
+
+A report is the scan origin followed by one fixed-size record per block,
+with the block's offset from the origin as three int8s and its name as a
+palette ID. IDs below `known` are the server's own palette indices, which
+the turtle learned from earlier scan responses; IDs from `known` up refer to
+names listed in the report itself, for blocks the turtle has no ID for yet.
+
+Layout, little-endian:
+
+    int32 x, y, z        scan origin
+    uint32 epoch         palette epoch the IDs belong to
+    uint16 known         server palette entries the turtle already has
+    uint8 id_size        bytes per ID in each record, 1 or 2
+    uint16 name_count    new names, each a uint8 length and UTF-8 bytes
+    records              int8 dx, dy, dz and a uint8 or uint16 ID
+
+Offsets reach 127 blocks, well past the geo scanner's range.
+"""
+import struct
+
+import numpy as np
+
+
+# --- Constants ---
+SCAN_HEADER = struct.Struct("<iiiIHBH")
+RECORD_TYPES = {
+    1: np.dtype([("offset", "i1", 3), ("id", "u1")]),
+    2: np.dtype([("offset", "i1", 3), ("id", "<u2")]),
+}
+MAX_OFFSET = 127
+
+
+class PaletteMismatch(ValueError):
+    """The report's IDs belong to a palette epoch the server no longer uses."""
+
+
+def encode_scan(origin, offsets, names, palette_ids, epoch):
+    """
+    Encodes a scan report, the way turtle.lua does.
+
+    Args:
+        origin: (x, y, z) the offsets are relative to.
+        offsets: (N, 3) array-like of block offsets.
+        names: N block names.
+        palette_ids: {name: server palette ID} the turtle knows so far.
+        epoch: Palette epoch those IDs came from.
+
+    Returns:
+        bytes: The encoded report.
+    """
+    known = len(palette_ids)
+    extra = {}
+    ids = []
+    for name in names:
+        block_id = palette_ids.get(name)
+        if block_id is None:
+            block_id = extra.setdefault(name, known + len(extra))
+        ids.append(block_id)
+
+    id_size = 1 if max(ids, default=0) < 256 else 2
+    offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 3)
+    if len(offsets) and np.abs(offsets).max() > MAX_OFFSET:
+        raise ValueError("scan offset out of int8 range")
+    records = np.zeros(len(ids), dtype=RECORD_TYPES[id_size])
+    records["offset"] = offsets
+    records["id"] = ids
+
+    parts = [SCAN_HEADER.pack(*(int(v) for v in origin), epoch, known, id_size, len(extra))]
+    for name in extra:
+        encoded = name.encode()
+        parts.append(bytes([len(encoded)]) + encoded)
+    parts.append(records.tobytes())
+    return b"".join(parts)
+
+
+def record_size(data):
+    """Bytes per block record in an encoded report."""
+    return RECORD_TYPES[SCAN_HEADER.unpack_from(data)[5]].itemsize
+
+
+def scan_origin(data):
+    """(x, y, z) origin of an encoded report."""
+    return SCAN_HEADER.unpack_from(data)[:3]
+
+
+def decode_scan(data, world, epoch):
+    """
+    Decodes a scan report into world coordinates and palette IDs of the
+    given WorldStore, adding any new names to its palette.
+
+    Returns:
+        tuple: ((N, 3) int64 coordinates, (N,) uint16 palette IDs, known)
+        where known is the palette length the turtle reported having.
+
+    Raises:
+        PaletteMismatch: The report uses IDs from another palette epoch.
+        ValueError: The report is malformed.
+    """
+    if len(data) < SCAN_HEADER.size:
+        raise ValueError("scan report too short")
+    x, y, z, report_epoch, known, id_size, name_count = SCAN_HEADER.unpack_from(data)
+    if known and report_epoch != epoch:
+        raise PaletteMismatch(report_epoch)
+    if known > len(world.palette):
+        raise PaletteMismatch(report_epoch)
+    record_type = RECORD_TYPES.get(id_size)
+    if record_type is None:
+        raise ValueError(f"bad id size {id_size}")
+
+    position = SCAN_HEADER.size
+    names = []
+    for _ in range(name_count):
+        if position >= len(data):
+            raise ValueError("scan report names truncated")
+        length = data[position]
+        names.append(bytes(data[position + 1:position + 1 + length]).decode())
+        position += 1 + length
+
+    if (len(data) - position) % record_type.itemsize:
+        raise ValueError("scan report records truncated")
+    records = np.frombuffer(data, dtype=record_type, offset=position)
+
+    # Report IDs -> store IDs: known IDs map to themselves, new names get
+    # their store ID (added to the palette if needed).
+    remap = np.concatenate([
+        np.arange(known, dtype=np.uint16),
+        world.names_to_ids(names),
+    ])
+    report_ids = records["id"].astype(np.int64)
+    if len(report_ids) and report_ids.max() >= len(remap):
+        raise ValueError("scan report ID out of range")
+
+    coords = records["offset"].astype(np.int64) + np.array([x, y, z], dtype=np.int64)
+    return coords, remap[report_ids], known
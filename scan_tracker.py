@@ -0,0 +1,81 @@
+import threading
+
+
+class ScanTracker:
+    """
+    Remembers the last scan each turtle reported, so turtles can send deltas.
+
+    Consecutive scans from a moving turtle overlap almost entirely. Instead
+    of the whole scan, a turtle may send only the blocks that differ from
+    its previous report (air for blocks that disappeared), naming that
+    report as the delta's base. The server stores every report it accepts,
+    so a delta is only valid against the report it accepted last from that
+    turtle; anything else (a lost report, a server restart) means the
+    turtle must send its next scan in full.
+
+    Scans are numbered by the turtle. The tracker keeps the last accepted
+    number per turtle and counts what the deltas saved.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bases = {}  # turtle id -> sequence number of the last accepted scan
+        self.stats = {
+            "reports": 0,
+            "delta_reports": 0,
+            "resyncs": 0,
+            "blocks_received": 0,
+            "blocks_skipped": 0,
+            "bytes_received": 0,
+            "bytes_skipped": 0,
+        }
+
+    def accept(self, turtle_id, seq, base):
+        """
+        Checks a report against the turtle's last accepted scan and, if it
+        applies, makes it the new base.
+
+        Args:
+            seq: The report's sequence number, or None if the turtle does
+                not number its scans.
+            base: Sequence number the report is a delta against, or None for
+                a full report.
+
+        Returns:
+            bool: False if the report is a delta against a scan other than
+            the last one accepted, in which case nothing was recorded.
+        """
+        with self.lock:
+            if base is not None and self.bases.get(turtle_id) != base:
+                self.stats["resyncs"] += 1
+                return False
+            if seq is None:
+                self.bases.pop(turtle_id, None)
+            else:
+                self.bases[turtle_id] = seq
+            return True
+
+    def record(self, delta, blocks, full_blocks, size, record_size):
+        """
+        Counts an ingested report.
+
+        Args:
+            delta: Whether the report was a delta.
+            blocks: Block records in the report.
+            full_blocks: Blocks in the complete scan, as the turtle reported.
+            size: Report size in bytes.
+            record_size: Bytes per block record, to estimate what a full
+                report would have cost.
+        """
+        skipped = max(full_blocks - blocks, 0) if delta else 0
+        with self.lock:
+            self.stats["reports"] += 1
+            self.stats["delta_reports"] += int(delta)
+            self.stats["blocks_received"] += blocks
+            self.stats["blocks_skipped"] += skipped
+            self.stats["bytes_received"] += size
+            self.stats["bytes_skipped"] += skipped * record_size
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
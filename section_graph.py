@@ -0,0 +1,395 @@
+import heapq
+import itertools
+
+import numpy as np
+
+from pathfinder import IMPASSABLE, CostGrid, distances, find_path
+from world_store import AIR_ID, SECTION_SHAPE, SECTION_SIZE, section_key, section_keys
+
+
+# --- Constants ---
+# Sections a turtle can travel through: y -64 up to 319.
+MIN_SECTION_Y = -4
+MAX_SECTION_Y = 19
+
+# Sections kept built, with their portals and edges, and section cost
+# grids kept, before the oldest are dropped to be built again when needed.
+MAX_CACHED_SECTIONS = 8192
+
+# The abstract search gives up after expanding this many portal nodes.
+MAX_ABSTRACT_EXPANSIONS = 50000
+# Weighted A* at the abstract level: scanned rock costs several times the
+# Manhattan heuristic per block, so an unweighted search floods every nearby
+# section. A weight of 2 keeps expansions near the sections actually crossed
+# for routes a few percent more expensive.
+ABSTRACT_HEURISTIC_WEIGHT = 2
+
+# Abstract routes are refined through the sections they cross, at most
+# this many cells of section bounding box at a time.
+MAX_CORRIDOR_CELLS = 64 * SECTION_SIZE ** 3
+
+AXES = ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+
+
+def box_costs(world, costs, min_corner, max_corner, unknown_cost=None):
+    """
+    Cost grid for an inclusive box of the world: each block's cost from the
+    palette cost table, and unknown_cost for positions no scan has reached
+    (see ObservedMap) unless it is None.
+    """
+    ids = world.box_ids(min_corner, max_corner)
+    grid = costs[ids]
+    if unknown_cost is not None:
+        grid[(ids == AIR_ID) & ~world.observed.box(min_corner, max_corner)] = unknown_cost
+    return grid
+
+
+def _components(mask):
+    """Labels 4-connected components of a 2D boolean mask. Returns a list of (N, 2) arrays."""
+    seen = np.zeros(mask.shape, dtype=bool)
+    rows, cols = mask.shape
+    components = []
+    for start in zip(*np.nonzero(mask)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        stack, cells = [start], []
+        while stack:
+            r, c = stack.pop()
+            cells.append((r, c))
+            for nr, nc in ((r + 1, c), (r - 1, c), (r, c + 1), (r, c - 1)):
+                if 0 <= nr < rows and 0 <= nc < cols and mask[nr, nc] and not seen[nr, nc]:
+                    seen[nr, nc] = True
+                    stack.append((nr, nc))
+        components.append(np.array(cells))
+    return components
+
+
+class Section:
+    """
+    One 16x16x16 section of the abstract graph: its cost grid, the portal
+    nodes on its faces, and lazily computed costs between those portals.
+    """
+
+    def __init__(self, key, costs):
+        self.key = key
+        self.origin = tuple(v * SECTION_SIZE for v in key)
+        self.costs = costs
+        self.grid = CostGrid(costs)
+        # A section with a single cost everywhere (unscanned space, mostly)
+        # needs no searching: travel cost is Manhattan distance times that cost.
+        low, high = int(costs.min()), int(costs.max())
+        self.uniform_cost = low if low == high and low != IMPASSABLE else None
+        # World-coordinate portal node -> [(node in a neighbouring section, cost)]
+        self.crossings = {}
+        # World-coordinate portal node -> [(other portal node here, cost)]
+        self.edges = {}
+
+    def local(self, point):
+        return tuple(p - o for p, o in zip(point, self.origin))
+
+    def costs_from(self, point, targets, reverse=False):
+        """
+        Travel costs inside this section from a world point to each target,
+        or from each target to the point with reverse=True.
+        """
+        if self.uniform_cost is not None:
+            return {
+                t: self.uniform_cost * sum(abs(a - b) for a, b in zip(point, t))
+                for t in targets
+            }
+        found = distances(self.grid, self.local(point), [self.local(t) for t in targets], reverse)
+        return {tuple(p + o for p, o in zip(t, self.origin)): cost for t, cost in found.items()}
+
+    def edges_from(self, node):
+        edges = self.edges.get(node)
+        if edges is None:
+            others = [n for n in self.crossings if n != node]
+            edges = self.edges[node] = list(self.costs_from(node, others).items())
+        return edges
+
+
+class SectionGraph:
+    """
+    Two-level (HPA*-style) planner over 16x16x16 world sections.
+
+    The abstract level has a portal node on each connected passable patch of
+    every face shared by two sections; edges link portals across a face and
+    portals of the same section. A long route is searched over that graph,
+    so its cost grows with the number of sections crossed rather than the
+    volume of a padded bounding box. The route is then refined with a box
+    A* confined to the sections it crosses, rather than leg by leg between
+    portals: portals sit at the centre of each face patch, and following
+    them would bend the path through every face centre.
+
+    Sections are built lazily and dropped whenever the world store reports
+    a block change in them or on their faces, or newly observed positions
+    when unknown space has its own cost, so the graph follows scans
+    incrementally. The server keeps one graph for its whole life and only
+    searches it (abstract_route); planning workers refine the routes it
+    finds over a snapshot of the sections they cross (refine). Past
+    MAX_CACHED_SECTIONS, the sections built longest ago are dropped.
+    """
+
+    def __init__(self, world, cost_table, unknown_cost=None):
+        """
+        Args:
+            world: The WorldStore to plan over.
+            cost_table: Callable returning the palette index -> cost array.
+            unknown_cost: Cost of unobserved positions, or None to cost
+                them as air.
+        """
+        self.world = world
+        self.cost_table = cost_table
+        self.unknown_cost = unknown_cost
+        # Unknown space is most of what a route crosses until turtles have
+        # scanned around it, so the heuristic must not price it below
+        # unknown_cost or the search floods every section nearby.
+        self.heuristic_weight = max(ABSTRACT_HEURISTIC_WEIGHT, unknown_cost or 0)
+        self.sections = {}  # section key -> Section
+        self.section_costs = {}  # section key -> (16, 16, 16) uint8 costs
+        world.add_listener(self.on_blocks_changed)
+        if unknown_cost is not None:
+            world.observed.add_listener(self.on_observed)
+
+    def on_blocks_changed(self, coords, old_ids, new_ids):
+        """Drops every cached section whose cells or faces were touched."""
+        self._drop(section_keys(coords))
+
+    def on_observed(self, keys, bits):
+        """ObservedMap listener: newly observed positions change the cost of unknown space."""
+        self._drop([tuple(key) for key in np.asarray(keys).tolist()])
+
+    def _drop(self, keys):
+        for key in keys:
+            self.section_costs.pop(key, None)
+            self.sections.pop(key, None)
+            for axis in AXES:
+                for sign in (1, -1):
+                    self.sections.pop(tuple(k + sign * a for k, a in zip(key, axis)), None)
+
+    # --- Sections ---
+    @staticmethod
+    def in_bounds(key):
+        return MIN_SECTION_Y <= key[1] <= MAX_SECTION_Y
+
+    def costs(self, key):
+        costs = self.section_costs.get(key)
+        if costs is None:
+            lo = tuple(v * SECTION_SIZE for v in key)
+            hi = tuple(v + SECTION_SIZE - 1 for v in lo)
+            costs = self.section_costs[key] = box_costs(self.world, self.cost_table(), lo, hi, self.unknown_cost)
+            if len(self.section_costs) > MAX_CACHED_SECTIONS:
+                del self.section_costs[next(iter(self.section_costs))]
+        return costs
+
+    def box_costs(self, min_corner, max_corner):
+        """
+        Cost grid for an inclusive box, as box_costs builds it. Where every
+        section the box overlaps has its costs cached already, which is the
+        usual case for boxes around turtles the graph has planned through,
+        the grid is laid out from those with one copy per section and a
+        transpose, instead of reading the world store again.
+        """
+        lo = np.asarray(min_corner, dtype=np.int64).reshape(3)
+        hi = np.asarray(max_corner, dtype=np.int64).reshape(3)
+        lo_key, hi_key = (lo >> 4).tolist(), (hi >> 4).tolist()
+        keys = list(itertools.product(*(range(l, h + 1) for l, h in zip(lo_key, hi_key))))
+        cached = [self.section_costs.get(key) for key in keys]
+        if any(costs is None for costs in cached):
+            return box_costs(self.world, self.cost_table(), lo, hi, self.unknown_cost)
+        counts = [h - l + 1 for l, h in zip(lo_key, hi_key)]
+        grid = np.stack(cached).reshape(counts + list(SECTION_SHAPE))
+        grid = grid.transpose(0, 3, 1, 4, 2, 5).reshape([n * SECTION_SIZE for n in counts])
+        start = lo - np.array(lo_key) * SECTION_SIZE
+        stop = start + hi - lo + 1
+        return grid[start[0]:stop[0], start[1]:stop[1], start[2]:stop[2]]
+
+    def section(self, key):
+        section = self.sections.get(key)
+        if section is None:
+            section = self.sections[key] = Section(key, self.costs(key))
+            self._add_portals(section)
+            if len(self.sections) > MAX_CACHED_SECTIONS:
+                del self.sections[next(iter(self.sections))]
+        return section
+
+    def _add_portals(self, section):
+        """Finds the portals on each of the six faces of a section."""
+        key, costs = section.key, section.costs
+        for axis_index, axis in enumerate(AXES):
+            for sign in (1, -1):
+                other_key = tuple(k + sign * a for k, a in zip(key, axis))
+                if not self.in_bounds(other_key):
+                    continue
+                other = self.costs(other_key)
+                # The face layer on this side and the touching layer across it.
+                here = np.take(costs, SECTION_SIZE - 1 if sign > 0 else 0, axis=axis_index)
+                there = np.take(other, 0 if sign > 0 else SECTION_SIZE - 1, axis=axis_index)
+                passable = (here != IMPASSABLE) & (there != IMPASSABLE)
+                plane_axes = [i for i in range(3) if i != axis_index]
+
+                for cells in _components(passable):
+                    # One portal per patch, at the cell nearest the face centre.
+                    offsets = np.abs(cells - (SECTION_SIZE - 1) / 2).sum(axis=1)
+                    r, c = cells[int(np.argmin(offsets))].tolist()
+                    local = [0, 0, 0]
+                    local[plane_axes[0]], local[plane_axes[1]] = r, c
+                    local[axis_index] = SECTION_SIZE - 1 if sign > 0 else 0
+                    node = tuple(o + v for o, v in zip(section.origin, local))
+                    across = tuple(n + sign * a for n, a in zip(node, axis))
+                    section.crossings.setdefault(node, []).append((across, int(there[r, c])))
+
+    # --- Search ---
+    def find_path(self, start, goal, max_expansions=MAX_ABSTRACT_EXPANSIONS):
+        """
+        Plans a route between two world positions: abstract_route, then
+        refine.
+
+        Returns:
+            list: (x, y, z) world coordinates of every block from start to
+            goal inclusive, or an empty list if no route was found.
+        """
+        route = self.abstract_route(start, goal, max_expansions)
+        return self.refine(route) if route else []
+
+    def abstract_route(self, start, goal, max_expansions=MAX_ABSTRACT_EXPANSIONS):
+        """
+        Searches the abstract graph between two world positions.
+
+        Returns:
+            list: The start, the portal nodes the route passes and the
+            goal, as (x, y, z) tuples; just the start and goal if they
+            share a section. Empty if no route was found.
+        """
+        start = tuple(int(v) for v in start)
+        goal = tuple(int(v) for v in goal)
+        start_key, goal_key = section_key(*start), section_key(*goal)
+        if not self.in_bounds(start_key) or not self.in_bounds(goal_key):
+            return []
+        if start_key == goal_key:
+            return [start, goal]
+
+        start_section = self.section(start_key)
+        goal_section = self.section(goal_key)
+        start_edges = list(start_section.costs_from(start, list(start_section.crossings)).items())
+        to_goal = goal_section.costs_from(goal, list(goal_section.crossings), reverse=True)
+
+        def heuristic(node):
+            distance = abs(node[0] - goal[0]) + abs(node[1] - goal[1]) + abs(node[2] - goal[2])
+            return self.heuristic_weight * distance
+
+        def neighbours(node):
+            if node == start:
+                return start_edges
+            node_key = section_key(*node)
+            if not self.in_bounds(node_key):
+                return []
+            section = self.section(node_key)
+            edges = section.edges_from(node) + section.crossings.get(node, [])
+            if node_key == goal_key and node in to_goal:
+                edges = edges + [(goal, to_goal[node])]
+            return edges
+
+        g = {start: 0}
+        parent = {start: None}
+        closed = set()
+        open_list = [(heuristic(start), 0, start)]
+        expanded = 0
+        while open_list:
+            _, _, node = heapq.heappop(open_list)
+            if node == goal:
+                route = []
+                while node is not None:
+                    route.append(node)
+                    node = parent[node]
+                return route[::-1]
+            if node in closed:
+                continue
+            closed.add(node)
+            expanded += 1
+            if expanded > max_expansions:
+                return []
+            base = g[node]
+            for neighbour, cost in neighbours(node):
+                ng = base + cost
+                if neighbour not in closed and ng < g.get(neighbour, ng + 1):
+                    g[neighbour] = ng
+                    parent[neighbour] = node
+                    heapq.heappush(open_list, (ng + heuristic(neighbour), -ng, neighbour))
+        return []
+
+    def refine(self, route):
+        """
+        Turns an abstract route into a block-by-block path: a box A* through
+        the sections the route crosses, every other section of their
+        bounding box closed off, so the path need not bend through the
+        portals at face centres. Long routes are searched in stretches of
+        at most MAX_CORRIDOR_CELLS of bounding box (see windows), joined at
+        abstract nodes.
+
+        Only the cost grids of those boxes are read, so a graph over a
+        snapshot of just the sections in route_keys refines the route the
+        same as the graph that found it.
+
+        Returns:
+            list: (x, y, z) world coordinates of every block of the path,
+            or an empty list if a stretch could not be refined.
+        """
+        route = [tuple(int(v) for v in node) for node in route]
+        keys = np.asarray(route, dtype=np.int64) >> 4
+        path = [route[0]]
+        for first, last, lo, hi in self.windows(route):
+            leg = self._corridor_path(route[first], route[last], keys[first:last + 1], lo, hi)
+            if not leg:
+                return []
+            path.extend(leg[1:])
+        return path
+
+    @staticmethod
+    def windows(route):
+        """
+        Splits an abstract route into the stretches refine searches.
+
+        Returns:
+            list: (first node, last node, lo key, hi key) per stretch, the
+            keys bounding the sections of its nodes.
+        """
+        keys = np.asarray(route, dtype=np.int64).reshape(-1, 3) >> 4
+        windows = []
+        first = 0
+        while first < len(keys) - 1:
+            lo = hi = keys[first]
+            last = first
+            for i in range(first + 1, len(keys)):
+                new_lo, new_hi = np.minimum(lo, keys[i]), np.maximum(hi, keys[i])
+                if last > first and np.prod(new_hi - new_lo + 1) * SECTION_SIZE ** 3 > MAX_CORRIDOR_CELLS:
+                    break
+                lo, hi, last = new_lo, new_hi, i
+            windows.append((first, last, lo, hi))
+            first = last
+        return windows
+
+    @classmethod
+    def route_keys(cls, route):
+        """(N, 3) keys of every section in the boxes refine searches for an abstract route."""
+        boxes = []
+        for _, _, lo, hi in cls.windows(route):
+            axes = [np.arange(l, h + 1) for l, h in zip(lo.tolist(), hi.tolist())]
+            boxes.append(np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3))
+        if not boxes:
+            return np.empty((0, 3), dtype=np.int64)
+        return np.unique(np.concatenate(boxes), axis=0)
+
+    def _corridor_path(self, start, end, keys, lo_key, hi_key):
+        """Box A* from start to end through the sections with these keys, within lo_key to hi_key."""
+        origin = lo_key * SECTION_SIZE
+        grid = self.box_costs(origin, hi_key * SECTION_SIZE + SECTION_SIZE - 1)  # a new array
+        crossed = np.zeros(hi_key - lo_key + 1, dtype=bool)
+        local_keys = keys - lo_key
+        crossed[local_keys[:, 0], local_keys[:, 1], local_keys[:, 2]] = True
+        for axis in range(3):
+            crossed = crossed.repeat(SECTION_SIZE, axis=axis)
+        grid[~crossed] = IMPASSABLE
+        path, _ = find_path(grid, np.subtract(start, origin), np.subtract(end, origin))
+        return [tuple(p) for p in (np.asarray(path, dtype=np.int64).reshape(-1, 3) + origin).tolist()]
@@ -0,0 +1,223 @@
+"""
+Coverage of what the fleet has scanned, and a background survey that keeps
+idle turtles scanning the chunks where a scan would tell us the most.
+
+Every scan report the server accepts gives the scan's origin and radius,
+and is recorded here as it is stored. Coverage is kept per CELL³
+block cell of each chunk column, as the time the cell was last inside a
+scan; a cell's information goes stale over RESCAN_AFTER seconds.
+
+scanChunk in turtle.lua sweeps a chunk's centre column from SCAN_TOP down
+to SCAN_BOTTOM, which brings the whole column within scanner reach. The
+survey hands each idle turtle the chunk with the most expected gain (stale
+or unscanned cells) per move it takes to get there and sweep it, and
+reserves that chunk so no other turtle is sent to it meanwhile. Chunks
+scanned recently, whether by a survey or a turtle passing through, are
+worth little and are left alone.
+
+Coverage lives in memory only; after a restart everything reads as
+unscanned until turtles scan it again.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+# --- Constants ---
+# Heights scanChunk sweeps, as SCAN_TOP and SCAN_BOTTOM in turtle.lua.
+SCAN_TOP = 70
+SCAN_BOTTOM = -63
+# Radius scanEnvironment scans with.
+SCANNER_RADIUS = 8
+# Edge of a coverage cell in blocks; a chunk column is CHUNK_CELLS cells across.
+CELL = 4
+CHUNK_CELLS = 16 // CELL
+# Seconds until a scanned cell is worth scanning again as much as one never
+# scanned; its worth grows linearly until then.
+RESCAN_AFTER = 1800
+# Chunks worth less than this share of an unscanned chunk are not surveyed.
+MIN_GAIN = 0.25
+# Seconds a chunk stays reserved for the turtle sent to it, in case the
+# turtle never comes back for more.
+ASSIGNMENT_TIMEOUT = 900
+# Chunks around the survey's centre chunk covered by default.
+SURVEY_RADIUS = 4
+
+
+class SurveyScheduler:
+    """
+    The coverage map and which chunk each surveying turtle is scanning.
+
+    Call mark_scanned for every scan report stored and assign when a
+    turtle runs out of work. Safe to share between threads.
+    """
+
+    def __init__(self, top=SCAN_TOP, bottom=SCAN_BOTTOM, rescan_after=RESCAN_AFTER):
+        self.lock = threading.Lock()
+        self.top = top
+        self.bottom = bottom
+        self.rescan_after = rescan_after
+        self.cell_low = bottom // CELL
+        self.cell_high = top // CELL + 1
+        self.columns = {}  # (chunk x, chunk z) -> (CHUNK_CELLS, cells high, CHUNK_CELLS) last scan times
+        self.enabled = False
+        self.center = (0, 0)  # chunk
+        self.radius = SURVEY_RADIUS
+        self.turtle_ids = None  # None for every turtle
+        self.assignments = {}  # turtle id -> (chunk, time assigned)
+        self.stats = {"dispatched": 0, "idle": 0}
+
+    # --- Coverage ---
+    def mark_scanned(self, position, radius=SCANNER_RADIUS, now=None):
+        """
+        Records a scan around position: every cell whose centre was within
+        the scanner's reach, a cube of the given radius. A turtle without a
+        scanner only inspects its neighbours, reaching less than a cell,
+        which is too little to count as coverage.
+        """
+        if radius < CELL:
+            return
+        now = time.time() if now is None else now
+        position = np.asarray(position, dtype=np.int64)
+        low = (position - radius) // CELL
+        high = (position + radius) // CELL + 1
+        low[1], high[1] = max(low[1], self.cell_low), min(high[1], self.cell_high)
+        if high[1] <= low[1]:
+            return
+        axes = [np.arange(a, b) for a, b in zip(low.tolist(), high.tolist())]
+        cells = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+        centres = cells * CELL + (CELL - 1) / 2
+        cells = cells[np.abs(centres - position).max(axis=1) <= radius]
+        chunks = cells[:, [0, 2]] // CHUNK_CELLS
+        with self.lock:
+            for chunk in np.unique(chunks, axis=0).tolist():
+                column = self._column(tuple(chunk))
+                inside = cells[np.all(chunks == chunk, axis=1)]
+                column[inside[:, 0] - chunk[0] * CHUNK_CELLS, inside[:, 1] - self.cell_low,
+                       inside[:, 2] - chunk[1] * CHUNK_CELLS] = now
+
+    def _column(self, chunk):
+        column = self.columns.get(chunk)
+        if column is None:
+            shape = (CHUNK_CELLS, self.cell_high - self.cell_low, CHUNK_CELLS)
+            column = self.columns[chunk] = np.full(shape, -np.inf)
+        return column
+
+    def gains(self, chunks, now=None):
+        """
+        Expected gain of scanning each chunk, from 0 (every cell just
+        scanned) to 1 (every cell unscanned or stale).
+        """
+        now = time.time() if now is None else now
+        gains = np.ones(len(chunks))
+        with self.lock:
+            for i, chunk in enumerate(chunks):
+                column = self.columns.get(tuple(chunk))
+                if column is not None:
+                    gains[i] = np.minimum((now - column) / self.rescan_after, 1).mean()
+        return gains
+
+    # --- Scheduling ---
+    def configure(self, enabled, center=None, radius=None, turtle_ids=None):
+        """
+        Starts or stops the survey. center is a block (x, z) whose chunk the
+        survey is centred on; radius is in chunks; turtle_ids limits which
+        turtles take part (None for all).
+        """
+        with self.lock:
+            self.enabled = bool(enabled)
+            if center is not None:
+                self.center = (int(center[0]) // 16, int(center[1]) // 16)
+            if radius is not None:
+                self.radius = int(radius)
+            self.turtle_ids = set(turtle_ids) if turtle_ids is not None else None
+            if not self.enabled:
+                self.assignments.clear()
+
+    def wants(self, turtle_id):
+        """Whether the survey may give this turtle work."""
+        with self.lock:
+            return self.enabled and (self.turtle_ids is None or turtle_id in self.turtle_ids)
+
+    def area(self):
+        """(N, 2) chunk coordinates the survey covers."""
+        span = np.arange(-self.radius, self.radius + 1)
+        offsets = np.stack(np.meshgrid(span, span, indexing="ij"), axis=-1).reshape(-1, 2)
+        return offsets + self.center
+
+    def moves_to_scan(self, position, chunks):
+        """Moves from position to each chunk's centre column, up to the top and down the sweep."""
+        x, y, z = position
+        centres = np.asarray(chunks) * 16 + 7
+        return (np.abs(centres[:, 0] - x) + np.abs(centres[:, 1] - z)
+                + abs(self.top - y) + (self.top - self.bottom))
+
+    def assign(self, turtle_id, position, fuel=None, now=None):
+        """
+        Picks the chunk for a turtle to scan next: the best gain per move
+        among chunks no other turtle has been sent to and that its fuel
+        reaches. Whatever it was sent to before counts as done.
+
+        Args:
+            position: The turtle's (x, y, z).
+            fuel: The turtle's fuel, or None if unlimited.
+
+        Returns:
+            tuple: (chunk x, chunk z), reserved for the turtle, or None if
+            nothing is worth scanning.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            self.assignments.pop(turtle_id, None)
+            for other, (_, assigned) in list(self.assignments.items()):
+                if now - assigned > ASSIGNMENT_TIMEOUT:
+                    del self.assignments[other]
+            if not self.enabled:
+                return None
+            taken = {chunk for chunk, _ in self.assignments.values()}
+            chunks = np.array([c for c in self.area().tolist() if tuple(c) not in taken]).reshape(-1, 2)
+        if not len(chunks):
+            return None
+
+        gains = self.gains(chunks, now)
+        moves = self.moves_to_scan(position, chunks)
+        worth = gains >= MIN_GAIN
+        if fuel is not None:
+            worth &= moves <= fuel
+        if not worth.any():
+            with self.lock:
+                self.stats["idle"] += 1
+            return None
+        best = int(np.argmax(np.where(worth, gains / np.maximum(moves, 1), -1)))
+        chunk = tuple(chunks[best].tolist())
+
+        with self.lock:
+            if chunk in {c for c, _ in self.assignments.values()}:
+                return None  # another turtle got there first; try on its next poll
+            self.assignments[turtle_id] = (chunk, now)
+            self.stats["dispatched"] += 1
+        return chunk
+
+    def release(self, turtle_id):
+        with self.lock:
+            self.assignments.pop(turtle_id, None)
+
+    def snapshot(self, now=None):
+        """The survey's settings, assignments, counters and coverage of its area."""
+        now = time.time() if now is None else now
+        with self.lock:
+            area = self.area()
+            state = {
+                "enabled": self.enabled,
+                "center": list(self.center),
+                "radius": self.radius,
+                "turtles": sorted(self.turtle_ids) if self.turtle_ids is not None else None,
+                "assignments": {turtle_id: list(chunk) for turtle_id, (chunk, _) in self.assignments.items()},
+                **self.stats,
+            }
+        gains = self.gains(area, now)
+        state["chunks"] = len(area)
+        state["coverage"] = round(float(1 - gains.mean()), 4)
+        state["chunks_pending"] = int((gains >= MIN_GAIN).sum())
+        return state
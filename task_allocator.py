@@ -0,0 +1,202 @@
+import numpy as np
+
+
+# --- Constants ---
+# A turtle is only worth sending out for at least this many targets.
+MIN_TARGETS_PER_TURTLE = 4
+KMEANS_ITERATIONS = 10
+
+# Tour ordering looks at this many nearest (by Manhattan distance) targets
+# when choosing the next stop or a 2-opt move.
+TOUR_NEIGHBOURS = 8
+TWO_OPT_PASSES = 3
+
+
+def parse_fuel(status):
+    """
+    Returns a turtle's fuel level as an int, or None if it has no limit
+    (ComputerCraft reports "unlimited" when fuel is disabled).
+    """
+    fuel = status.get('fuel') if status else None
+    if isinstance(fuel, bool):
+        return None
+    if isinstance(fuel, (int, float)):
+        return int(fuel)
+    return None
+
+
+def manhattan(a, b):
+    return np.abs(np.asarray(a) - np.asarray(b)).sum(axis=-1)
+
+
+def cluster_targets(targets, k, iterations=KMEANS_ITERATIONS):
+    """
+    Splits targets into k spatial clusters with k-means over Manhattan
+    distance, seeded by farthest-point sampling so the result is
+    deterministic.
+
+    Returns:
+        tuple: (labels, centres) with labels an (N,) int array.
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    seeds = [0]
+    nearest = manhattan(targets, targets[0])
+    for _ in range(1, k):
+        seeds.append(int(nearest.argmax()))
+        nearest = np.minimum(nearest, manhattan(targets, targets[seeds[-1]]))
+    centres = targets[seeds].copy()
+
+    for _ in range(iterations):
+        labels = manhattan(targets[:, None, :], centres[None, :, :]).argmin(axis=1)
+        moved = centres.copy()
+        for cluster in range(k):
+            members = targets[labels == cluster]
+            if len(members):
+                moved[cluster] = np.median(members, axis=0)
+        if np.array_equal(moved, centres):
+            break
+        centres = moved
+    labels = manhattan(targets[:, None, :], centres[None, :, :]).argmin(axis=1)
+    return labels, centres
+
+
+def estimate_moves(start, targets):
+    """
+    Greedy nearest-neighbour tour over Manhattan distance.
+
+    Returns:
+        tuple: (order, cumulative) where order indexes targets in visiting
+        order and cumulative[i] is the number of moves to reach stop i.
+    """
+    targets = np.asarray(targets, dtype=np.int64)
+    remaining = np.ones(len(targets), dtype=bool)
+    order, cumulative = [], []
+    position, total = np.asarray(start, dtype=np.int64), 0
+    for _ in range(len(targets)):
+        distance = np.where(remaining, manhattan(targets, position), np.iinfo(np.int64).max)
+        nearest = int(distance.argmin())
+        total += int(distance[nearest])
+        remaining[nearest] = False
+        order.append(nearest)
+        cumulative.append(total)
+        position = targets[nearest]
+    return order, cumulative
+
+
+def allocate_targets(turtles, targets):
+    """
+    Splits a mining target set across turtles.
+
+    Targets are clustered into one group per turtle (fewer if there are not
+    enough targets to keep each busy), each cluster goes to the closest
+    free turtle, and targets a turtle could not reach on its fuel, going by
+    Manhattan distance, are left out.
+
+    Args:
+        turtles: List of (turtle_id, (x, y, z), fuel or None).
+        targets: (N, 3) array-like of block coordinates.
+
+    Returns:
+        tuple: ({turtle_id: (M, 3) target array}, (K, 3) unassigned array)
+    """
+    targets = np.asarray(targets, dtype=np.int64).reshape(-1, 3)
+    if not len(targets) or not turtles:
+        return {}, targets
+
+    k = max(1, min(len(turtles), len(targets) // MIN_TARGETS_PER_TURTLE))
+    labels, centres = cluster_targets(targets, k)
+
+    # Hand out clusters biggest first, each to the closest turtle left.
+    free = list(turtles)
+    assignment, unassigned = {}, []
+    for cluster in np.argsort(-np.bincount(labels, minlength=k), kind="stable").tolist():
+        members = targets[labels == cluster]
+        if not len(members):
+            continue
+        turtle_id, start, fuel = min(free, key=lambda t: int(manhattan(t[1], centres[cluster])))
+        free.remove((turtle_id, start, fuel))
+
+        if fuel is not None:
+            order, cumulative = estimate_moves(start, members)
+            reachable = int(np.searchsorted(cumulative, fuel, side="right"))
+            unassigned.append(members[order[reachable:]])
+            members = members[sorted(order[:reachable])]
+        if len(members):
+            assignment[turtle_id] = members
+
+    unassigned = np.concatenate(unassigned) if unassigned else np.empty((0, 3), dtype=np.int64)
+    return assignment, unassigned
+
+
+def order_tour(start, targets, leg_cost, neighbours=TOUR_NEIGHBOURS, passes=TWO_OPT_PASSES):
+    """
+    Orders targets into an open tour from start: nearest neighbour, then
+    2-opt improvement, both using leg_cost for real path costs.
+
+    Only the few Manhattan-nearest targets are considered at each step, so
+    the number of leg_cost calls grows linearly with the number of targets.
+    leg_cost should memoize; it is treated as symmetric.
+
+    Args:
+        start: (x, y, z) starting position.
+        targets: List of (x, y, z) tuples.
+        leg_cost: Callable (a, b) -> path cost, or None if unreachable.
+
+    Returns:
+        list: The targets in visiting order. Unreachable targets are dropped.
+    """
+    if not targets:
+        return []
+    coords = np.asarray(targets, dtype=np.int64)
+    inf = float("inf")
+
+    def cost(a, b):
+        c = leg_cost(a, b)
+        return inf if c is None else c
+
+    # Nearest neighbour, over the closest few unvisited targets by Manhattan distance.
+    remaining = np.ones(len(targets), dtype=bool)
+    tour, position = [], tuple(start)
+    while remaining.any():
+        candidates = np.flatnonzero(remaining)
+        closest = candidates[np.argsort(manhattan(coords[candidates], position), kind="stable")[:neighbours]]
+        costs = [cost(position, targets[i]) for i in closest]
+        best = int(np.argmin(costs))
+        if costs[best] == inf:
+            # Nothing reachable nearby from here; drop the closest and move on.
+            remaining[closest[0]] = False
+            continue
+        remaining[closest[best]] = False
+        position = targets[closest[best]]
+        tour.append(position)
+
+    # 2-opt with neighbour lists: try making each stop adjacent to one of its
+    # nearest targets by reversing the stretch of tour between them.
+    if len(tour) < 3:
+        return tour
+    path = [tuple(start)] + tour
+    tour_coords = np.asarray(tour, dtype=np.int64)
+    near = {
+        stop: [tour[j] for j in np.argsort(manhattan(tour_coords, stop), kind="stable")[:neighbours + 1]]
+        for stop in path
+    }
+    for _ in range(passes):
+        improved = False
+        position_of = {stop: i for i, stop in enumerate(path)}
+        for i in range(1, len(path) - 1):
+            before = path[i - 1]
+            for candidate in near[before]:
+                j = position_of[candidate]
+                if j <= i:
+                    continue
+                after = path[j + 1] if j + 1 < len(path) else None
+                delta = cost(before, path[j]) - cost(before, path[i])
+                if after is not None:
+                    delta += cost(path[i], after) - cost(path[j], after)
+                if delta < 0:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    position_of.update((stop, n) for n, stop in enumerate(path[i:j + 1], i))
+                    improved = True
+        if not improved:
+            break
+    return path[1:]
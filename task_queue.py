@@ -0,0 +1,309 @@
+"""
+Per-turtle backlogs of high-level tasks, planned only as they reach the
+head of the queue.
+
+A mine-everything job hands a turtle dozens of targets. Planning every leg
+up front costs A* for routes the turtle will not walk for minutes, over
+terrain that its own scans keep changing, and leaves it following routes
+planned against a stale world. Instead the targets wait here as MineTasks
+behind the turtle's registry queue (turtle_registry.py), with any commands
+queued after them, and the turtle gets one task at a time:
+
+- release() runs when the turtle polls. It moves the commands at the head
+  of the backlog onto the turtle's queue, or, if a task is at the head,
+  the goto commands of that task's leg, planned from where the turtle
+  stands. The next task is then planned ahead, from the target the turtle
+  is about to dig out, so a turtle rarely waits on A*.
+- Planned legs are watched. A block placed on one (a scan finding stone
+  where the world store had nothing) has it planned again, at most
+  MAX_REPLANS times per task, and a task whose target has gone from the
+  world store (mined by another turtle, or scanned as air) is dropped.
+- A task for a whole vein plans only the approach to its first block; the
+  rest of the vein follows as gotos from block to block, skipping blocks
+  already gone. If the first block is gone, the next one takes its place.
+
+Each task therefore costs at most 1 + MAX_REPLANS single-leg plans, and
+only LOOKAHEAD + 1 tasks per turtle are ever planned at once.
+
+Backlogs live in memory only, like planning jobs still in the pool; a
+restart forgets them.
+"""
+import itertools
+import threading
+from collections import deque
+
+import numpy as np
+
+from planning_pool import MineTask
+from waypoints import visit_commands, waypoint_commands
+from world_store import AIR_ID, pack_coords
+
+
+# --- Constants ---
+# Tasks planned ahead of the one a turtle is working on.
+LOOKAHEAD = 1
+# Most times one task's leg is planned again; after that it is used as it is.
+MAX_REPLANS = 3
+
+
+class _Plan:
+    """A leg being planned or planned for a task: path is None until it is."""
+
+    __slots__ = ("start", "path", "future", "replans", "keys")
+
+    def __init__(self, start, replans=0):
+        self.start = start
+        self.path = None
+        self.future = None
+        self.replans = replans
+        self.keys = ()  # packed coordinates watched for changes
+
+
+class TaskQueue:
+    """
+    Each turtle's backlog of command strings and MineTasks, released onto
+    its registry queue one task at a time.
+
+    Call polled() when a turtle polls and hold() when the poll hands it
+    commands, so release() gives a turtle new work only once it is done
+    with what it has. Register on_blocks_changed as a WorldStore listener.
+    Safe to share between threads.
+    """
+
+    def __init__(self, plan_leg, block_present, on_ready=None, lookahead=LOOKAHEAD, max_replans=MAX_REPLANS):
+        """
+        Args:
+            plan_leg: Callable (start, dest, callback) that plans a leg
+                off the calling thread, calls callback(path) and returns a
+                handle with cancel(), like PlanningPool.plan.
+            block_present: Callable (x, y, z) -> whether the world store
+                still has a block there.
+            on_ready: Called as on_ready(turtle_id), with no locks held, when
+                the task at the head of an idle turtle's backlog has been
+                planned.
+        """
+        self.plan_leg = plan_leg
+        self.block_present = block_present
+        self.on_ready = on_ready
+        self.lookahead = lookahead
+        self.max_replans = max_replans
+        self.lock = threading.Lock()
+        self.backlogs = {}  # turtle id -> deque of command strings and MineTasks
+        self.plans = {}  # (turtle id, target) -> _Plan
+        self.watched = {}  # packed coordinate -> {(turtle id, target)} whose path crosses it
+        self.busy = set()  # turtles given commands since their last poll
+        self.stats = {
+            "released": 0, "blocks": 0, "dropped": 0, "unreachable": 0,
+            "plans": 0, "replans_moved": 0, "replans_terrain": 0,
+        }
+
+    # --- Backlog ---
+    def extend(self, turtle_id, items):
+        """Appends command strings and MineTasks to a turtle's backlog."""
+        with self.lock:
+            self.backlogs.setdefault(turtle_id, deque()).extend(items)
+
+    def has_tasks(self, turtle_id):
+        """Whether anything is waiting in a turtle's backlog."""
+        with self.lock:
+            return bool(self.backlogs.get(turtle_id))
+
+    def clear(self, turtle_id):
+        """Forgets a turtle's backlog and cancels its plans."""
+        with self.lock:
+            self.backlogs.pop(turtle_id, None)
+            self.busy.discard(turtle_id)
+            for key in [key for key in self.plans if key[0] == turtle_id]:
+                self._forget(key)
+
+    def polled(self, turtle_id):
+        """The turtle has finished what it was given and asks for more."""
+        with self.lock:
+            self.busy.discard(turtle_id)
+
+    def hold(self, turtle_id):
+        """The turtle has just been handed commands; release nothing until it polls again."""
+        with self.lock:
+            self.busy.add(turtle_id)
+
+    # --- Releasing ---
+    def release(self, turtle_id, position):
+        """
+        Takes the next piece of a turtle's backlog: the command strings at
+        its head or, if a task is at the head, that task's leg from
+        position. Nothing is released to a busy turtle.
+
+        Returns:
+            tuple: (commands for the turtle's queue, plans to pass to
+            start_plans once the caller has let go of its locks). The
+            commands are empty while the head task is being planned;
+            on_ready is called once it is.
+        """
+        commands, starts = [], []
+        with self.lock:
+            items = self.backlogs.get(turtle_id)
+            if not items or turtle_id in self.busy:
+                return commands, starts
+            position = tuple(position)
+            while items and not commands:
+                if isinstance(items[0], str):
+                    # Commands ahead of a task may move the turtle, so the task waits
+                    # for the turtle's next poll to be planned from where they leave it.
+                    while items and isinstance(items[0], str):
+                        commands.append(items.popleft())
+                    break
+                commands = self._take_task(turtle_id, items, position, starts)
+                if commands is None:
+                    commands = []
+                    break
+            if commands:
+                self.busy.add(turtle_id)
+            if not items:
+                del self.backlogs[turtle_id]
+        return commands, starts
+
+    def _take_task(self, turtle_id, items, position, starts):
+        """
+        Takes the task at the head of items. Returns its commands, [] if it
+        was dropped, or None while it is being planned.
+        """
+        task = items[0]
+        key = (turtle_id, task.target)
+        if not self.block_present(*task.target):
+            items.popleft()
+            self._forget(key)
+            vein = [block for block in task.vein if self.block_present(*block)]
+            if vein:
+                items.appendleft(MineTask(vein[0], tuple(vein[1:])))
+            else:
+                self.stats["dropped"] += 1
+            return []
+        plan = self.plans.get(key)
+        if plan is None:
+            plan = self._plan(key, position, starts)
+        elif plan.start != position and plan.replans < self.max_replans:
+            # The turtle is not where the leg was planned from.
+            plan = self._plan(key, position, starts, "replans_moved")
+        if plan.path is None:
+            return None
+        items.popleft()
+        self._forget(key)
+        if not plan.path:
+            self.stats["unreachable"] += 1
+            return []
+        vein = [block for block in task.vein if self.block_present(*block)]
+        self.stats["released"] += 1
+        self.stats["blocks"] += 1 + len(vein)
+        self._prefetch(turtle_id, items, vein[-1] if vein else task.target, starts)
+        # The leg ends on the target, so its last goto digs it out.
+        return waypoint_commands(plan.path) + visit_commands(task.target, vein)
+
+    def _prefetch(self, turtle_id, items, start, starts):
+        """Plans the next tasks from where the ones before them end."""
+        for item in itertools.islice(items, self.lookahead):
+            if not isinstance(item, MineTask):
+                return
+            key = (turtle_id, item.target)
+            plan = self.plans.get(key)
+            if plan is None:
+                self._plan(key, start, starts)
+            elif plan.start != start and plan.replans < self.max_replans:
+                self._plan(key, start, starts, "replans_moved")
+            start = item.vein[-1] if item.vein else item.target
+
+    def _plan(self, key, start, starts, reason=None):
+        """Replaces a task's plan with a new one from start, to be submitted by start_plans."""
+        old = self.plans.get(key)
+        self._forget(key)
+        plan = self.plans[key] = _Plan(start, old.replans + 1 if old else 0)
+        self.stats["plans"] += 1
+        if reason:
+            self.stats[reason] += 1
+        starts.append((key, plan))
+        return plan
+
+    def _forget(self, key):
+        plan = self.plans.pop(key, None)
+        if plan is None:
+            return
+        if plan.future is not None:
+            plan.future.cancel()
+        for packed in plan.keys:
+            watchers = self.watched.get(packed)
+            if watchers is not None:
+                watchers.discard(key)
+                if not watchers:
+                    del self.watched[packed]
+
+    # --- Planning ---
+    def start_plans(self, starts):
+        """Submits the plans release() or on_blocks_changed asked for."""
+        for key, plan in starts:
+            future = self.plan_leg(plan.start, key[1], lambda path, key=key, plan=plan: self._planned(key, plan, path))
+            with self.lock:
+                if self.plans.get(key) is plan:
+                    plan.future = future
+                else:
+                    future.cancel()
+
+    def _planned(self, key, plan, path):
+        # Runs on the planning pool's callback thread.
+        turtle_id, target = key
+        with self.lock:
+            if self.plans.get(key) is not plan:
+                return
+            plan.path = path
+            plan.future = None
+            # The start is where the turtle will be, dug out by then.
+            plan.keys = pack_coords(path[1:]).tolist() if len(path) > 1 else ()
+            for packed in plan.keys:
+                self.watched.setdefault(packed, set()).add(key)
+            items = self.backlogs.get(turtle_id)
+            ready = (bool(items) and isinstance(items[0], MineTask) and items[0].target == target
+                     and turtle_id not in self.busy)
+        if ready and self.on_ready is not None:
+            self.on_ready(turtle_id)
+
+    def on_blocks_changed(self, coords, old_ids, new_ids):
+        """
+        WorldStore listener: plans a leg again when a block appears on it,
+        and forgets the plan of a target that has been dug out.
+        """
+        starts = []
+        with self.lock:
+            if not self.watched:
+                return
+            changed = dict(zip(pack_coords(coords).tolist(), np.asarray(new_ids).tolist()))
+            hits = set()
+            for packed in self.watched.keys() & changed.keys():
+                hits.update(self.watched[packed])
+            for key in hits:
+                plan = self.plans[key]
+                if changed.get(pack_coords(key[1]).item()) == AIR_ID:
+                    self._forget(key)  # dropped when it reaches the head
+                elif plan.replans < self.max_replans and any(
+                        changed.get(packed, AIR_ID) != AIR_ID for packed in plan.keys):
+                    self._plan(key, plan.start, starts, "replans_terrain")
+        self.start_plans(starts)
+
+    # --- Reporting ---
+    def snapshot(self):
+        """Counters, and each turtle's waiting tasks and commands."""
+        with self.lock:
+            backlogs = {}
+            for turtle_id, items in self.backlogs.items():
+                tasks = sum(1 for item in items if isinstance(item, MineTask))
+                backlogs[turtle_id] = {
+                    "tasks": tasks,
+                    "commands": len(items) - tasks,
+                    "planned": sum(1 for key, plan in self.plans.items()
+                                   if key[0] == turtle_id and plan.path is not None),
+                    "busy": turtle_id in self.busy,
+                }
+            return {**self.stats, "backlogs": backlogs}
+
+    def task_counts(self):
+        """Returns {turtle id: tasks waiting in its backlog}."""
+        with self.lock:
+            return {turtle_id: sum(1 for item in items if isinstance(item, MineTask))
+                    for turtle_id, items in self.backlogs.items()}
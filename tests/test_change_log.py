@@ -0,0 +1,95 @@
+import numpy as np
+
+from change_log import ChangeLog
+from world_store import AIR_ID, WorldStore
+
+
+def names(world, ids):
+    return [world.palette[i] for i in ids]
+
+
+def test_version_counts_batches_of_changes():
+    world = WorldStore()
+    log = ChangeLog(world)
+    assert log.version == 0
+    world.insert_many([(0, 0, 0), (1, 0, 0)], ["minecraft:stone"] * 2)
+    world.set_block(2, 0, 0, "minecraft:dirt")
+    assert log.version == 2
+    world.set_block(2, 0, 0, "minecraft:dirt")
+    assert log.version == 2
+
+
+def test_changes_since_keeps_the_latest_value_of_each_block():
+    world = WorldStore()
+    log = ChangeLog(world)
+    world.set_block(0, 0, 0, "minecraft:stone")
+    start = log.version
+    world.set_block(1, 0, 0, "minecraft:stone")
+    world.set_block(0, 0, 0, "minecraft:dirt")
+    world.remove_block(1, 0, 0)
+    world.set_block(5, 5, 5, "minecraft:iron_ore")
+
+    coords, ids, current = log.changes_since(start)
+    assert current == log.version == start + 4
+    changes = dict(zip(map(tuple, coords.tolist()), ids.tolist()))
+    assert changes == {
+        (1, 0, 0): AIR_ID,
+        (0, 0, 0): world.palette_ids["minecraft:dirt"],
+        (5, 5, 5): world.palette_ids["minecraft:iron_ore"],
+    }
+
+
+def test_changes_since_the_current_version_is_empty():
+    world = WorldStore()
+    log = ChangeLog(world)
+    world.set_block(0, 0, 0, "minecraft:stone")
+    coords, ids, current = log.changes_since(log.version)
+    assert coords.shape == (0, 3) and ids.shape == (0,) and current == log.version
+
+
+def test_future_versions_are_rejected():
+    world = WorldStore()
+    log = ChangeLog(world)
+    assert log.changes_since(log.version + 1) is None
+
+
+def test_trimmed_versions_need_a_full_reload():
+    world = WorldStore()
+    log = ChangeLog(world, max_changes=10)
+    for x in range(8):
+        world.insert_many([(x, 0, z) for z in range(3)], ["minecraft:stone"] * 3)
+    assert log.size <= 10 and log.floor > 0
+    assert log.changes_since(0) is None
+    assert log.changes_since(log.floor - 1) is None
+
+    coords, _, _ = log.changes_since(log.floor)
+    assert len(coords) == log.size
+    # Batch version v stored row x = v - 1.
+    assert np.all(coords[:, 0] >= log.floor)
+
+
+def test_a_single_batch_larger_than_the_log_is_kept():
+    world = WorldStore()
+    log = ChangeLog(world, max_changes=4)
+    world.insert_many([(x, 0, 0) for x in range(10)], ["minecraft:stone"] * 10)
+    coords, _, _ = log.changes_since(0)
+    assert len(coords) == 10
+
+
+def test_a_log_started_on_a_filled_world_cannot_replay_it():
+    world = WorldStore()
+    world.set_block(0, 0, 0, "minecraft:stone")
+    log = ChangeLog(world)
+    assert log.version == 1 and log.changes_since(0) is None
+    assert len(log.changes_since(1)[0]) == 0
+
+
+def test_reset_sends_every_viewer_back_to_a_full_reload():
+    world = WorldStore()
+    log = ChangeLog(world)
+    world.set_block(0, 0, 0, "minecraft:stone")
+    before = log.version
+    log.reset()
+    assert log.version == before + 1 and log.size == 0
+    assert log.changes_since(before) is None
+    assert len(log.changes_since(log.version)[0]) == 0
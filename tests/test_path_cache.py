@@ -0,0 +1,35 @@
+from path_cache import PathCache
+from world_store import WorldStore
+
+ROUTE = [(x, 64, 0) for x in range(0, 61)]
+
+
+def make_cache():
+    world = WorldStore()
+    cache = PathCache(world)
+    cache.put(ROUTE[0], ROUTE[-1], ROUTE)
+    return world, cache
+
+
+def test_nearby_trips_share_a_route():
+    _, cache = make_cache()
+    assert cache.get((1, 65, 2), (58, 64, 3)) == ROUTE
+    assert cache.get((0, 64, 0), (0, 64, 60)) is None
+
+
+def test_block_changes_evict_routes_through_their_section():
+    world, cache = make_cache()
+    world.set_block(20, 200, 0, "minecraft:stone")
+    assert len(cache) == 1
+    world.set_block(20, 70, 5, "minecraft:stone")
+    assert len(cache) == 0 and cache.stats()["invalidations"] == 1
+
+
+def test_observed_blocks_evict_routes_through_their_section():
+    world, cache = make_cache()
+    world.observed.observe([(20, 200, 0)])
+    assert len(cache) == 1
+    world.observed.observe([(40, 66, 9)])
+    assert len(cache) == 0 and cache.stats()["invalidations"] == 1
+    world.observed.observe([(40, 66, 9)])
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,107 @@
+import heapq
+import itertools
+
+import numpy as np
+import pytest
+
+from pathfinder import IMPASSABLE, distances, find_path, path_cost
+
+
+def dijkstra(costs, source):
+    """Reference cheapest cost from source to every voxel, entering each voxel at its cost."""
+    best = {source: 0}
+    heap = [(0, source)]
+    while heap:
+        d, point = heapq.heappop(heap)
+        if d > best[point]:
+            continue
+        for axis, sign in itertools.product(range(3), (1, -1)):
+            neighbour = list(point)
+            neighbour[axis] += sign
+            neighbour = tuple(neighbour)
+            if not all(0 <= v < n for v, n in zip(neighbour, costs.shape)):
+                continue
+            cost = int(costs[neighbour])
+            if cost == IMPASSABLE:
+                continue
+            if d + cost < best.get(neighbour, d + cost + 1):
+                best[neighbour] = d + cost
+                heapq.heappush(heap, (d + cost, neighbour))
+    return best
+
+
+def random_grid(rng, shape=(12, 9, 12)):
+    costs = rng.choice(np.array([1, 1, 1, 5, 8, 0], dtype=np.uint8), size=shape)
+    costs[0, 0, 0] = costs[-1, -1, -1] = 1
+    return costs
+
+
+def assert_valid(costs, path, start, end):
+    assert tuple(path[0]) == start and tuple(path[-1]) == end
+    assert np.all(np.abs(np.diff(np.array(path), axis=0)).sum(axis=1) == 1)
+    assert all(costs[tuple(p)] != IMPASSABLE for p in path[1:])
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_find_path_is_cheapest(seed):
+    rng = np.random.default_rng(seed)
+    costs = random_grid(rng)
+    start, end = (0, 0, 0), tuple(n - 1 for n in costs.shape)
+    best = dijkstra(costs, start)
+    path, _ = find_path(costs, start, end)
+    if end not in best:
+        assert path == []
+        return
+    assert_valid(costs, path, start, end)
+    assert path_cost(costs, path) == best[end]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_uniform_costs_are_cheapest(seed):
+    # The heuristic scales with the cheapest cost, which must keep it admissible.
+    rng = np.random.default_rng(seed)
+    costs = np.where(rng.random((10, 10, 10)) < 0.2, 0, 6).astype(np.uint8)
+    costs[0, 0, 0] = costs[-1, -1, -1] = 6
+    best = dijkstra(costs, (0, 0, 0))
+    path, _ = find_path(costs, (0, 0, 0), (9, 9, 9))
+    assert path_cost(costs, path) == best.get((9, 9, 9), 0)
+
+
+def test_jump_search_finds_a_valid_path():
+    costs = random_grid(np.random.default_rng(1))
+    start, end = (0, 0, 0), tuple(n - 1 for n in costs.shape)
+    path, _ = find_path(costs, start, end, jump=True)
+    assert_valid(costs, path, start, end)
+
+
+def test_turn_cost_keeps_paths_straight():
+    costs = np.ones((6, 1, 6), dtype=np.uint8)
+    path, _ = find_path(costs, (0, 0, 0), (5, 0, 5), turn_cost=3)
+    steps = np.diff(np.array(path), axis=0)
+    turns = int(np.any(steps[1:] != steps[:-1], axis=1).sum())
+    assert turns == 1
+    assert path_cost(costs, path) == 10
+
+
+def test_unreachable_and_outside():
+    costs = np.ones((5, 5, 5), dtype=np.uint8)
+    costs[2] = IMPASSABLE
+    assert find_path(costs, (0, 0, 0), (4, 4, 4))[0] == []
+    assert find_path(costs, (0, 0, 0), (5, 0, 0))[0] == []
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_distances_match_dijkstra(reverse):
+    rng = np.random.default_rng(3)
+    costs = random_grid(rng)
+    source = (0, 0, 0)
+    targets = [tuple(p) for p in rng.integers(0, costs.shape, size=(10, 3)).tolist()]
+    found = distances(costs, source, targets, reverse=reverse)
+    for target in targets:
+        if reverse:
+            expected = dijkstra(costs, target).get(source)
+        else:
+            expected = dijkstra(costs, source).get(target)
+        if costs[target] == IMPASSABLE and target != source:
+            expected = None
+        assert found.get(target) == expected
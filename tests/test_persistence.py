@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+
+from persistence import Persistence
+from turtle_registry import TurtleRegistry
+from world_store import WorldStore
+
+STONE = [(x, 5, z) for x in range(-20, 20, 3) for z in range(0, 40, 7)]
+
+
+def boot(data_dir, epoch=1):
+    world, turtles = WorldStore(), TurtleRegistry()
+    persistence = Persistence(str(data_dir), world, turtles)
+    epoch = persistence.load(epoch)
+    return persistence, world, turtles, epoch
+
+
+def fill(world, turtles):
+    world.insert_many(STONE, ["minecraft:stone"] * len(STONE))
+    world.set_block(100, -30, 100, "minecraft:iron_ore")
+    world.remove_block(*STONE[0])
+    world.observed.observe([(0, 6, 0), (100, -29, 100)])
+    turtle_id = turtles.register({"x": 1, "y": 2, "z": 3})
+    turtles.extend_queue(turtle_id, ["forward", "up"])
+    return turtle_id
+
+
+def assert_restored(world, turtles, turtle_id):
+    assert world.get_name(*STONE[0]) is None
+    assert all(world.get_name(*p) == "minecraft:stone" for p in STONE[1:])
+    assert world.get_name(100, -30, 100) == "minecraft:iron_ore"
+    assert world.nearest_blocks("minecraft:iron_ore", (0, 0, 0), 1)[0].tolist() == [100, -30, 100]
+    assert world.observed.observed_at([(0, 6, 0), (100, -29, 100), (0, 7, 0)]).tolist() == [True, True, False]
+    assert turtles.status(turtle_id) == {"x": 1, "y": 2, "z": 3}
+    assert turtles.queue_length(turtle_id) == 2
+
+
+def test_log_replay_round_trip(tmp_path):
+    persistence, world, turtles, _ = boot(tmp_path)
+    turtle_id = fill(world, turtles)
+    persistence.close()
+
+    _, world, turtles, epoch = boot(tmp_path, epoch=2)
+    assert epoch == 2
+    assert_restored(world, turtles, turtle_id)
+
+
+def test_snapshot_round_trip_with_copy_on_write_edits(tmp_path):
+    persistence, world, turtles, _ = boot(tmp_path)
+    turtle_id = fill(world, turtles)
+    persistence.compact()
+    persistence.close()
+
+    persistence, world, turtles, epoch = boot(tmp_path, epoch=2)
+    assert epoch == 1
+    assert_restored(world, turtles, turtle_id)
+    # Edits to the mapped sections stay in memory until they are logged.
+    snapshot = os.path.join(tmp_path, "snapshot-1", "sections.npy")
+    on_disk = np.load(snapshot).copy()
+    world.set_block(*STONE[1], "minecraft:dirt")
+    np.testing.assert_array_equal(np.load(snapshot), on_disk)
+    persistence.close()
+
+    _, world, _, _ = boot(tmp_path)
+    assert world.get_name(*STONE[1]) == "minecraft:dirt"
+
+
+def test_torn_last_record_is_dropped(tmp_path):
+    persistence, world, turtles, _ = boot(tmp_path)
+    turtle_id = fill(world, turtles)
+    persistence.close()
+    path = os.path.join(tmp_path, "wal-0.log")
+    complete = os.path.getsize(path)
+
+    persistence, world, turtles, _ = boot(tmp_path)
+    world.insert_many([(7, 7, 7), (8, 8, 8)], ["minecraft:dirt"] * 2)
+    persistence.close()
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 5)
+
+    persistence, world, turtles, _ = boot(tmp_path)
+    # Only the palette record for dirt survives from the second run.
+    assert os.path.getsize(path) == complete + 5 + len("minecraft:dirt")
+    assert world.get_name(7, 7, 7) is None
+    assert_restored(world, turtles, turtle_id)
+    # New records append after the last complete one.
+    world.set_block(9, 9, 9, "minecraft:dirt")
+    persistence.close()
+    _, world, turtles, _ = boot(tmp_path)
+    assert world.get_name(9, 9, 9) == "minecraft:dirt"
+    assert_restored(world, turtles, turtle_id)
+
+
+def test_recompaction_keeps_one_generation(tmp_path):
+    persistence, world, turtles, _ = boot(tmp_path)
+    turtle_id = fill(world, turtles)
+    persistence.compact()
+    world.set_block(50, 50, 50, "minecraft:gold_ore")
+    persistence.compact()
+    world.remove_block(50, 50, 50)
+    world.set_block(51, 50, 50, "minecraft:gold_ore")
+    persistence.close()
+    assert sorted(os.listdir(tmp_path)) == ["snapshot-2", "wal-2.log"]
+
+    persistence, world, turtles, _ = boot(tmp_path)
+    assert_restored(world, turtles, turtle_id)
+    assert world.get_name(50, 50, 50) is None and world.get_name(51, 50, 50) == "minecraft:gold_ore"
+    # Compacting a restored, memory-mapped world writes the same state again.
+    persistence.compact()
+    persistence.close()
+    assert sorted(os.listdir(tmp_path)) == ["snapshot-3", "wal-3.log"]
+    _, world, turtles, _ = boot(tmp_path)
+    assert_restored(world, turtles, turtle_id)
+    assert world.get_name(51, 50, 50) == "minecraft:gold_ore"
@@ -0,0 +1,106 @@
+import numpy as np
+
+from planning_pool import (
+    SNAPSHOT_MARGIN, MineTask, corridor_keys, join_points, leg_snapshot, plan_join, plan_leg, plan_tour, region_snapshot,
+)
+from route_planner import RoutePlanner
+from section_graph import SectionGraph
+from world_store import WorldStore, section_keys
+
+
+def test_corridor_covers_the_leg_and_its_margin():
+    start, dest = (0, 64, 0), (300, 64, 300)
+    keys = {tuple(k) for k in corridor_keys([(start, dest)]).tolist()}
+    line = [(t, 64, t) for t in range(0, 301)]
+    beside = [(t + SNAPSHOT_MARGIN, 64, t) for t in range(0, 301)]
+    assert {tuple(k) for k in section_keys(np.array(line + beside))} <= keys
+    assert (18, 4, 0) not in keys and (0, 4, 18) not in keys
+
+
+def test_corridor_grows_with_length_not_box_volume():
+    short = len(corridor_keys([((0, 64, 0), (100, 64, 100))]))
+    long = len(corridor_keys([((0, 64, 0), (400, 64, 400))]))
+    assert long < 5 * short
+
+
+def test_corridor_of_several_legs_has_no_duplicates():
+    keys = corridor_keys([((0, 0, 0), (50, 0, 0)), ((40, 0, 0), (90, 0, 0))])
+    assert len(np.unique(keys, axis=0)) == len(keys)
+
+
+def test_region_snapshot_exports_only_corridor_sections():
+    world = WorldStore()
+    world.insert_many([(5, 5, 5), (5, 5, 300)], ["minecraft:stone"] * 2)
+    world.observed.observe([(5, 5, 5), (5, 5, 300)])
+    sections, observed, costs = region_snapshot(world, "costs", [((0, 5, 0), (20, 5, 20))])
+    assert set(sections) == {(0, 0, 0)} and set(observed) == {(0, 0, 0)}
+    assert costs == "costs"
+
+
+def test_join_points():
+    route = [(x, 0, 0) for x in range(100)]
+    assert join_points((10, 3, 0), (80, 0, 5), route) == (10, 80)
+    assert join_points((50, 0, 0), (20, 0, 0), route) == (50, 50)
+
+
+def test_plan_join_splices_the_cached_route():
+    world = WorldStore()
+    route = [(x, 0, 0) for x in range(10, 81)]
+    sections, observed, _ = region_snapshot(world, None, [((10, 3, 0), (80, 0, 5))])
+    costs = np.array([1], dtype=np.uint8)
+    path = plan_join(sections, observed, costs, (10, 3, 0), (80, 0, 5), route)
+    assert path[0] == (10, 3, 0) and path[-1] == (80, 0, 5)
+    assert path[3:3 + len(route)] == route
+    assert np.all(np.abs(np.diff(np.array(path), axis=0)).sum(axis=1) == 1)
+
+
+def test_plan_tour_orders_by_planned_cost_not_distance():
+    world = WorldStore()
+    # Bedrock at every height between the start and the nearest target.
+    wall = [(x, y, 3) for x in range(-20, 21) for y in range(-64, 320)]
+    world.insert_many(wall, ["minecraft:bedrock"] * len(wall))
+    costs = np.array([1 if name != "minecraft:bedrock" else 0 for name in world.palette], dtype=np.uint8)
+    start = (0, 64, 0)
+    behind, beside, further = MineTask((0, 64, 5)), MineTask((15, 64, 0)), MineTask((15, 64, 20))
+    tasks = [behind, beside, further]
+    stops = [start] + [task.target for task in tasks]
+    sections, observed, _ = region_snapshot(world, costs, list(zip(stops, stops[1:])))
+    assert plan_tour(sections, observed, costs, start, tasks) == [beside, behind, further]
+
+
+def test_plan_tour_keeps_unreachable_tasks_last():
+    world = WorldStore()
+    shell = [(5 + dx, 64 + dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if dx or dy or dz]
+    world.insert_many(shell, ["minecraft:bedrock"] * len(shell))
+    costs = np.array([1 if name != "minecraft:bedrock" else 0 for name in world.palette], dtype=np.uint8)
+    start = (0, 64, 0)
+    tasks = [MineTask((5, 64, 0)), MineTask((0, 64, 9)), MineTask((0, 64, 12))]
+    sections, observed, _ = region_snapshot(world, costs, [(start, (0, 64, 12)), (start, (5, 64, 0))])
+    assert plan_tour(sections, observed, costs, start, tasks) == tasks[1:] + tasks[:1]
+
+
+def test_worker_refines_the_server_route_within_its_snapshot():
+    world = WorldStore()
+    # A bedrock wall across the straight line, to go round.
+    wall = [(x, y, 40) for x in range(-40, 41) for y in range(-20, 30)]
+    world.insert_many(wall, ["minecraft:bedrock"] * len(wall))
+    costs = np.array([1 if name != "minecraft:bedrock" else 0 for name in world.palette], dtype=np.uint8)
+    planner = RoutePlanner(world, lambda: costs)
+    start, dest = (0, 5, 0), (0, 5, 80)
+    (route,), (sections, observed, snapshot_costs) = leg_snapshot(planner, costs, [(start, dest)])
+    assert route and route[0] == start and route[-1] == dest
+    path = plan_leg(sections, observed, snapshot_costs, start, dest, [route])
+    assert path[0] == start and path[-1] == dest
+    assert np.all(np.abs(np.diff(np.array(path), axis=0)).sum(axis=1) == 1)
+    assert not set(path) & set(wall)
+    # Every section the path crosses was copied, none taken for empty space.
+    keys = {tuple(k) for k in SectionGraph.route_keys(route).tolist()}
+    assert set(section_keys(np.array(path))) <= keys
+    assert {key for key, _ in world.sections() if key in keys} <= set(sections)
+
+
+def test_leg_snapshot_leaves_short_legs_unrouted():
+    world = WorldStore()
+    planner = RoutePlanner(world, lambda: np.array([1], dtype=np.uint8))
+    routes, _ = leg_snapshot(planner, None, [((0, 0, 0), (5, 0, 0))])
+    assert routes == [None]
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from scan_format import PaletteMismatch, decode_scan, encode_scan, record_size, scan_origin
+from world_store import WorldStore
+
+ORIGIN = (-120, 12, 4000)
+OFFSETS = [(0, -1, 0), (-8, 3, 7), (127, -127, 0), (1, 1, 1)]
+NAMES = ["minecraft:stone", "minecraft:iron_ore", "minecraft:stone", "minecraft:air"]
+
+
+def decode_names(world, data, epoch=0):
+    coords, ids, known = decode_scan(data, world, epoch)
+    return coords, [world.palette[i] for i in ids], known
+
+
+def test_round_trip_with_new_names():
+    world = WorldStore()
+    data = encode_scan(ORIGIN, OFFSETS, NAMES, {}, epoch=0)
+    assert scan_origin(data) == ORIGIN
+    assert record_size(data) == 4
+
+    coords, names, known = decode_names(world, data)
+    np.testing.assert_array_equal(coords, np.array(OFFSETS) + ORIGIN)
+    assert names == NAMES
+    assert known == 0
+
+
+def test_round_trip_with_known_ids():
+    world = WorldStore()
+    world.names_to_ids(["minecraft:stone", "minecraft:dirt"])
+    known = dict(zip(world.palette, range(len(world.palette))))
+    data = encode_scan(ORIGIN, OFFSETS, NAMES, known, epoch=7)
+
+    _, names, reported = decode_names(world, data, epoch=7)
+    assert names == NAMES
+    assert reported == len(known)
+    # Only the name the turtle had no ID for travels in the report.
+    assert data.count(b"minecraft:stone") == 0 and data.count(b"minecraft:iron_ore") == 1
+
+
+def test_two_byte_ids():
+    world = WorldStore()
+    names = [f"minecraft:block_{i}" for i in range(300)]
+    offsets = [(i % 100 - 50, i // 100, 0) for i in range(300)]
+    data = encode_scan(ORIGIN, offsets, names, {}, epoch=0)
+    assert record_size(data) == 5
+    _, decoded, _ = decode_names(world, data)
+    assert decoded == names
+
+
+def test_palette_epoch_mismatch():
+    world = WorldStore()
+    world.names_to_ids(["minecraft:stone"])
+    known = {"minecraft:air": 0, "minecraft:stone": 1}
+    data = encode_scan(ORIGIN, OFFSETS, NAMES, known, epoch=1)
+    with pytest.raises(PaletteMismatch):
+        decode_scan(data, world, epoch=2)
+    with pytest.raises(PaletteMismatch):
+        decode_scan(encode_scan(ORIGIN, OFFSETS, NAMES, {**known, "minecraft:dirt": 2}, epoch=2), world, epoch=2)
+
+
+def test_malformed_reports():
+    world = WorldStore()
+    data = encode_scan(ORIGIN, OFFSETS, NAMES, {}, epoch=0)
+    with pytest.raises(ValueError):
+        decode_scan(data[:10], world, 0)
+    with pytest.raises(ValueError):
+        decode_scan(data[:-1], world, 0)
+    with pytest.raises(ValueError):
+        encode_scan(ORIGIN, [(128, 0, 0)], ["minecraft:stone"], {}, epoch=0)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from scan_format import encode_scan
+from scan_tracker import ScanTracker
+
+
+def test_delta_applies_only_against_the_last_accepted_scan():
+    tracker = ScanTracker()
+    assert not tracker.accept("1", 1, base=0)
+    assert tracker.accept("1", 1, None)
+    assert tracker.accept("1", 2, base=1)
+    assert not tracker.accept("1", 3, base=1)
+    assert not tracker.accept("2", 3, base=2)
+    assert tracker.snapshot()["resyncs"] == 3
+
+
+def test_unnumbered_scans_leave_no_base():
+    tracker = ScanTracker()
+    tracker.accept("1", 1, None)
+    tracker.accept("1", None, None)
+    assert not tracker.accept("1", 2, base=1)
+
+
+def test_record_counts_what_deltas_saved():
+    tracker = ScanTracker()
+    tracker.record(False, 100, 100, 1000, 4)
+    tracker.record(True, 10, 100, 100, 4)
+    stats = tracker.snapshot()
+    assert stats["reports"] == 2 and stats["delta_reports"] == 1
+    assert stats["blocks_skipped"] == 90 and stats["bytes_skipped"] == 360
+
+
+# --- Through /scan_report ---
+ORIGIN = (1000, 64, -2000)
+FIRST = {(0, -1, 0): "minecraft:stone", (1, -1, 0): "minecraft:stone", (2, 0, 3): "minecraft:iron_ore"}
+SECOND = {(0, -1, 0): "minecraft:stone", (1, -1, 0): "minecraft:dirt", (3, 3, 3): "minecraft:gold_ore"}
+
+
+@pytest.fixture
+def server():
+    app = pytest.importorskip("app")
+    client = app.app.test_client()
+    turtle_id = client.post("/register", json={"x": 0, "y": 0, "z": 0, "dir": 0}).get_json()["id"]
+    return app, client, turtle_id
+
+
+def post_scan(client, turtle_id, blocks, query):
+    offsets = list(blocks)
+    body = encode_scan(ORIGIN, offsets, [blocks[o] for o in offsets], {}, epoch=0)
+    response = client.post(f"/scan_report/{turtle_id}{query}", data=body,
+                           content_type="application/octet-stream")
+    return response.get_json()
+
+
+def stored(app, offsets):
+    return {o: app.world.get_name(*np.add(ORIGIN, o).tolist()) for o in offsets}
+
+
+def delta(first, second):
+    changed = {o: name for o, name in second.items() if first.get(o) != name}
+    changed.update({o: "minecraft:air" for o in first if o not in second})
+    return changed
+
+
+def test_delta_rebuilds_the_full_scan(server):
+    app, client, turtle_id = server
+    assert post_scan(client, turtle_id, FIRST, "?seq=1")["status"] == "ok"
+    changes = delta(FIRST, SECOND)
+    assert post_scan(client, turtle_id, changes, "?seq=2&base=1")["status"] == "ok"
+
+    offsets = set(FIRST) | set(SECOND)
+    expected = {o: SECOND.get(o) for o in offsets}
+    assert stored(app, offsets) == expected
+
+
+@pytest.mark.parametrize("base", [7, 1])
+def test_delta_against_an_unknown_or_stale_base_is_rejected(server, base):
+    app, client, turtle_id = server
+    post_scan(client, turtle_id, FIRST, "?seq=1")
+    post_scan(client, turtle_id, delta(FIRST, SECOND), "?seq=2&base=1")
+    before = stored(app, FIRST)
+
+    response = post_scan(client, turtle_id, {(2, 0, 3): "minecraft:air"}, f"?seq=3&base={base}")
+    assert response == {"status": "error", "error": "scan-base"}
+    assert stored(app, FIRST) == before
+    # The turtle resends in full, and deltas work again from there.
+    assert post_scan(client, turtle_id, SECOND, "?seq=3")["status"] == "ok"
+    assert post_scan(client, turtle_id, {(3, 3, 3): "minecraft:air"}, "?seq=4&base=3")["status"] == "ok"
+    assert stored(app, [(3, 3, 3)]) == {(3, 3, 3): None}
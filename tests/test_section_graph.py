@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from section_graph import SectionGraph
+from world_store import WorldStore
+
+COSTS = {"minecraft:stone": 8, "minecraft:bedrock": 0}
+
+
+def make_graph(world, unknown_cost=None):
+    def cost_table():
+        return np.array([COSTS.get(name, 1) for name in world.palette], dtype=np.uint8)
+    return SectionGraph(world, cost_table, unknown_cost)
+
+
+def assert_walkable(world, path, start, goal):
+    assert path[0] == start and path[-1] == goal
+    steps = np.abs(np.diff(np.array(path), axis=0)).sum(axis=1)
+    assert np.all(steps == 1)
+    assert all(world.get_name(*p) != "minecraft:bedrock" for p in path)
+
+
+@pytest.mark.parametrize("start, goal", [
+    ((40, 60, 0), (100, 60, 0)),
+    ((0, 64, 0), (0, 64, 60)),
+    ((0, 60, 0), (200, 60, 0)),
+    ((3, 70, -5), (90, 40, 77)),
+])
+def test_open_space_routes_are_shortest(start, goal):
+    world = WorldStore()
+    path = make_graph(world).find_path(start, goal)
+    assert_walkable(world, path, start, goal)
+    assert len(path) - 1 == sum(abs(a - b) for a, b in zip(start, goal))
+
+
+def bedrock_wall(world, x, hole):
+    """Bedrock across x at every height, for z -48 to 63, but for one hole."""
+    wall = [(x, y, z) for y in range(-64, 320) for z in range(-48, 64) if (y, z) != hole]
+    world.insert_many(wall, ["minecraft:bedrock"] * len(wall))
+
+
+def test_route_through_a_hole_in_a_wall():
+    world = WorldStore()
+    bedrock_wall(world, 40, hole=(30, 20))
+    start, goal = (20, 10, 0), (70, 10, 0)
+    path = make_graph(world).find_path(start, goal)
+    assert_walkable(world, path, start, goal)
+    assert (40, 30, 20) in path
+    assert len(path) - 1 == 50 + 2 * 20 + 2 * 20
+
+
+def test_block_changes_drop_cached_sections():
+    world = WorldStore()
+    graph = make_graph(world)
+    start, goal = (0, 8, 8), (70, 8, 8)
+    graph.find_path(start, goal)
+    assert (1, 0, 0) in graph.sections and (2, 0, 0) in graph.sections
+
+    world.set_block(20, 8, 8, "minecraft:stone")
+    assert (1, 0, 0) not in graph.section_costs and (1, 0, 0) not in graph.sections
+    # Neighbours lose their portals onto the changed section.
+    assert (0, 0, 0) not in graph.sections and (2, 0, 0) not in graph.sections
+    assert (3, 0, 0) in graph.sections
+
+    bedrock_wall(world, 40, hole=(20, 30))
+    path = graph.find_path(start, goal)
+    assert_walkable(world, path, start, goal)
+    assert (40, 20, 30) in path
+
+
+def test_observed_changes_drop_cached_sections():
+    world = WorldStore()
+    graph = make_graph(world, unknown_cost=6)
+    before = graph.costs((0, 0, 0))
+    assert np.all(before == 6)
+
+    world.observed.observe((5, 5, 5), radius=2)
+    assert (0, 0, 0) not in graph.section_costs
+    after = graph.costs((0, 0, 0))
+    assert after[5, 5, 5] == 1 and after[0, 0, 0] == 6
+
+    # Without an unknown cost, observations change nothing.
+    plain = make_graph(world)
+    plain.costs((2, 0, 0))
+    world.observed.observe((40, 5, 5))
+    assert (2, 0, 0) in plain.section_costs
@@ -0,0 +1,34 @@
+import pytest
+
+from scan_format import encode_scan
+from survey import CELL, SurveyScheduler
+
+
+def test_scan_covers_the_cells_within_its_radius():
+    survey = SurveyScheduler()
+    survey.mark_scanned((8, 40, 8), radius=8, now=0)
+    assert survey.gains([(0, 0)], now=0)[0] < 1
+    assert survey.gains([(3, 3)], now=0)[0] == 1
+    # Coverage goes stale over rescan_after.
+    assert survey.gains([(0, 0)], now=0)[0] < survey.gains([(0, 0)], now=900)[0]
+
+
+def test_neighbour_inspection_is_not_coverage():
+    survey = SurveyScheduler()
+    survey.mark_scanned((8, 40, 8), radius=CELL - 1, now=0)
+    assert survey.columns == {}
+
+
+def test_scan_reports_mark_coverage_and_status_updates_do_not():
+    app = pytest.importorskip("app")
+    client = app.app.test_client()
+    status = {"x": 5000, "y": 40, "z": 5000, "dir": 0,
+              "equipment": ["minecraft:diamond_pickaxe", "advancedperipherals:geo_scanner"]}
+    turtle_id = client.post("/register", json=status).get_json()["id"]
+    client.post(f"/poll/{turtle_id}", json=status)
+    chunk = (5000 // 16, 5000 // 16)
+    assert app.survey.gains([chunk])[0] == 1
+
+    body = encode_scan((5000, 40, 5000), [(0, -1, 0)], ["minecraft:stone"], {}, epoch=0)
+    client.post(f"/scan_report/{turtle_id}?seq=1&radius=8", data=body, content_type="application/octet-stream")
+    assert app.survey.gains([chunk])[0] < 1
@@ -0,0 +1,197 @@
+from planning_pool import MineTask
+from task_queue import TaskQueue
+from waypoints import goto_route
+from world_store import AIR_ID, pack_coords
+
+
+class FakeFuture:
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakePlanner:
+    """Records legs to plan; finish() answers them like PlanningPool.plan's callback."""
+
+    def __init__(self):
+        self.requests = []  # (start, dest, callback, future)
+
+    def __call__(self, start, dest, callback):
+        future = FakeFuture()
+        self.requests.append((start, dest, callback, future))
+        return future
+
+    def pending(self):
+        return [(start, dest) for start, dest, _, future in self.requests if not future.cancelled]
+
+    def finish(self, path=None):
+        """Answers every pending request with a goto-shaped path, or the given one."""
+        requests, self.requests = self.requests, []
+        for start, dest, callback, future in requests:
+            if not future.cancelled:
+                callback(goto_route(start, dest).tolist() if path is None else path)
+
+
+class World:
+    def __init__(self, blocks):
+        self.blocks = set(blocks)
+
+    def present(self, x, y, z):
+        return (x, y, z) in self.blocks
+
+
+def make_queue(blocks, **kwargs):
+    planner, world, ready = FakePlanner(), World(blocks), []
+    queue = TaskQueue(planner, world.present, on_ready=ready.append, **kwargs)
+    return queue, planner, world, ready
+
+
+def release(queue, turtle_id, position):
+    commands, starts = queue.release(turtle_id, position)
+    queue.start_plans(starts)
+    return commands
+
+
+def test_commands_ahead_of_tasks_are_released_first():
+    queue, planner, _, _ = make_queue([(5, 0, 0)])
+    queue.extend("1", ["up", MineTask((5, 0, 0)), "down"])
+    assert release(queue, "1", (0, 0, 0)) == ["up"]
+    assert planner.pending() == []
+    # Busy until the turtle polls again.
+    assert release(queue, "1", (0, 1, 0)) == []
+    queue.polled("1")
+    assert release(queue, "1", (0, 1, 0)) == []
+    assert planner.pending() == [((0, 1, 0), (5, 0, 0))]
+
+
+def test_task_is_released_once_planned_and_the_next_is_prefetched():
+    queue, planner, _, ready = make_queue([(5, 0, 0), (9, 0, 0), (20, 0, 0)])
+    queue.extend("1", [MineTask((5, 0, 0)), MineTask((9, 0, 0)), MineTask((20, 0, 0))])
+    assert release(queue, "1", (0, 0, 0)) == []
+    planner.finish()
+    assert ready == ["1"]
+
+    assert release(queue, "1", (0, 0, 0)) == ["goto 5 0 0"]
+    # Only the next task is planned ahead, from the end of this one.
+    assert planner.pending() == [((5, 0, 0), (9, 0, 0))]
+    planner.finish()
+    assert ready == ["1"]
+    queue.polled("1")
+    assert release(queue, "1", (5, 0, 0)) == ["goto 9 0 0"]
+    assert planner.pending() == [((9, 0, 0), (20, 0, 0))]
+    assert queue.snapshot()["released"] == 2 and queue.snapshot()["plans"] == 3
+
+
+def test_vein_is_visited_after_its_planned_approach():
+    vein = ((6, 0, 0), (6, 1, 0), (7, 1, 0))
+    queue, planner, world, _ = make_queue([(5, 0, 0), *vein])
+    world.blocks.discard((6, 1, 0))
+    queue.extend("1", [MineTask((5, 0, 0), vein), MineTask((30, 0, 0))])
+    release(queue, "1", (0, 0, 0))
+    planner.finish()
+    assert release(queue, "1", (0, 0, 0)) == ["goto 5 0 0", "goto 6 0 0", "goto 7 1 0"]
+    assert queue.snapshot()["blocks"] == 3
+    # The next task is planned from the last block of the vein.
+    assert planner.pending() == [((7, 1, 0), (30, 0, 0))]
+
+
+def test_turtle_elsewhere_has_its_task_planned_again():
+    queue, planner, _, _ = make_queue([(5, 0, 0)])
+    queue.extend("1", [MineTask((5, 0, 0))])
+    release(queue, "1", (0, 0, 0))
+    planner.finish()
+    assert release(queue, "1", (0, 3, 0)) == []
+    assert planner.pending() == [((0, 3, 0), (5, 0, 0))]
+    planner.finish()
+    assert release(queue, "1", (0, 3, 0)) == ["goto 5 0 0"]
+    assert queue.snapshot()["replans_moved"] == 1
+
+
+def test_exhausted_replans_reuse_the_stale_plan():
+    queue, planner, _, _ = make_queue([(5, 0, 0)], max_replans=1)
+    queue.extend("1", [MineTask((5, 0, 0))])
+    release(queue, "1", (0, 0, 0))
+    planner.finish()
+    release(queue, "1", (0, 1, 0))
+    planner.finish()
+    # Moved again, but out of replans: the plan from (0, 1, 0) is used.
+    assert release(queue, "1", (0, 2, 0)) == ["goto 5 0 0"]
+    assert planner.pending() == []
+    assert queue.snapshot()["replans_moved"] == 1
+
+
+def test_block_on_a_planned_leg_replans_it():
+    queue, planner, _, _ = make_queue([(5, 0, 0)])
+    queue.extend("1", [MineTask((5, 0, 0))])
+    release(queue, "1", (0, 0, 0))
+    planner.finish()
+    # Somewhere else, or air on the path: nothing to do.
+    queue.on_blocks_changed([(2, 5, 0), (2, 0, 0)], [0, 0], [1, AIR_ID])
+    assert planner.pending() == []
+    queue.on_blocks_changed([(3, 0, 0)], [AIR_ID], [1])
+    assert planner.pending() == [((0, 0, 0), (5, 0, 0))]
+    # Still being planned again, so nothing to release yet.
+    assert release(queue, "1", (0, 0, 0)) == []
+    planner.finish()
+    assert release(queue, "1", (0, 0, 0)) == ["goto 5 0 0"]
+    assert queue.snapshot()["replans_terrain"] == 1
+    assert queue.watched == {}
+
+
+def test_terrain_replans_are_capped():
+    queue, planner, _, _ = make_queue([(5, 0, 0)], max_replans=2)
+    queue.extend("1", [MineTask((5, 0, 0))])
+    release(queue, "1", (0, 0, 0))
+    for _ in range(4):
+        planner.finish()
+        queue.on_blocks_changed([(3, 0, 0)], [AIR_ID], [1])
+    assert queue.snapshot()["replans_terrain"] == 2
+
+
+def test_target_gone_drops_the_task():
+    queue, planner, world, _ = make_queue([(5, 0, 0), (9, 0, 0)])
+    queue.extend("1", [MineTask((5, 0, 0)), MineTask((9, 0, 0)), "done"])
+    release(queue, "1", (0, 0, 0))
+    planner.finish()
+    # Dug out by someone else: its plan is forgotten at once.
+    world.blocks.discard((5, 0, 0))
+    queue.on_blocks_changed([(5, 0, 0)], [1], [AIR_ID])
+    assert pack_coords((5, 0, 0)).item() not in queue.watched
+    assert release(queue, "1", (0, 0, 0)) == []
+    assert planner.pending() == [((0, 0, 0), (9, 0, 0))]
+    assert queue.snapshot()["dropped"] == 1
+
+    world.blocks.discard((9, 0, 0))
+    assert release(queue, "1", (0, 0, 0)) == ["done"]
+    assert planner.pending() == []
+    assert not queue.has_tasks("1")
+
+
+def test_vein_with_its_first_block_gone_starts_at_the_next():
+    queue, planner, world, _ = make_queue([(6, 0, 0), (7, 0, 0)])
+    queue.extend("1", [MineTask((5, 0, 0), ((6, 0, 0), (7, 0, 0)))])
+    assert release(queue, "1", (0, 0, 0)) == []
+    assert planner.pending() == [((0, 0, 0), (6, 0, 0))]
+    planner.finish()
+    assert release(queue, "1", (0, 0, 0)) == ["goto 6 0 0", "goto 7 0 0"]
+    assert queue.snapshot()["dropped"] == 0
+
+
+def test_unreachable_target_is_skipped():
+    queue, planner, _, _ = make_queue([(5, 0, 0), (9, 0, 0)])
+    queue.extend("1", [MineTask((5, 0, 0)), "after"])
+    release(queue, "1", (0, 0, 0))
+    planner.finish(path=[])
+    assert release(queue, "1", (0, 0, 0)) == ["after"]
+    assert queue.snapshot()["unreachable"] == 1
+
+
+def test_clear_cancels_plans():
+    queue, planner, _, _ = make_queue([(5, 0, 0)])
+    queue.extend("1", [MineTask((5, 0, 0))])
+    release(queue, "1", (0, 0, 0))
+    queue.clear("1")
+    assert planner.pending() == [] and queue.plans == {}
+    assert queue.task_counts() == {}
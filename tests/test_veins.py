@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from veins import VeinIndex, is_vein_block, label_components, order_veins
+from world_store import WorldStore
+
+ORE = "minecraft:iron_ore"
+
+
+def make_index():
+    world = WorldStore()
+    index = VeinIndex(world)
+    world.add_listener(index.on_blocks_changed)
+    return world, index
+
+
+def partition(coords, labels):
+    groups = {}
+    for point, label in zip(map(tuple, np.asarray(coords).tolist()), np.asarray(labels).tolist()):
+        groups.setdefault(label, set()).add(point)
+    return {frozenset(group) for group in groups.values()}
+
+
+def full_relabel(world, name):
+    coords = world.index.get(world.palette_ids[name])
+    return partition(coords, label_components(coords))
+
+
+def test_label_components_joins_faces_edges_and_corners():
+    coords = [(0, 0, 0), (1, 1, 1), (2, 1, 1), (5, 5, 5), (5, 6, 4), (9, 0, 0)]
+    assert partition(coords, label_components(coords)) == {
+        frozenset(coords[:3]), frozenset(coords[3:5]), frozenset(coords[5:])}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_labels_match_a_full_relabel(seed):
+    rng = np.random.default_rng(seed)
+    world, index = make_index()
+    # Label the name before any blocks exist, so every change is incremental.
+    world.set_block(100, 100, 100, ORE)
+    index.blocks(ORE)
+    world.remove_block(100, 100, 100)
+
+    for step in range(60):
+        coords = rng.integers(0, 8, size=(int(rng.integers(1, 12)), 3))
+        if rng.random() < 0.6:
+            world.insert_many(coords.tolist(), [ORE] * len(coords))
+        else:
+            for x, y, z in coords.tolist():
+                world.remove_block(x, y, z)
+        coords, labels = index.blocks(ORE)
+        assert partition(coords, labels) == full_relabel(world, ORE), step
+        assert sum(len(members) for members in index.names[world.palette_ids[ORE]].members.values()) == len(coords)
+
+
+def test_joining_block_merges_veins_into_the_oldest_id():
+    world, index = make_index()
+    world.insert_many([(0, 0, 0), (4, 0, 0)], [ORE] * 2)
+    (_, first), (_, second) = [(tuple(c), l) for c, l in zip(*index.blocks(ORE))]
+    world.insert_many([(1, 0, 0), (2, 1, 0), (3, 0, 0)], [ORE] * 3)
+    _, labels = index.blocks(ORE)
+    assert set(labels.tolist()) == {min(first, second)}
+    assert index.vein(max(first, second)) is None
+
+
+def test_removed_block_splits_its_vein():
+    world, index = make_index()
+    line = [(x, 0, 0) for x in range(5)]
+    world.insert_many(line, [ORE] * 5)
+    vein_id = int(index.blocks(ORE)[1][0])
+    world.remove_block(2, 0, 0)
+    assert len(index.vein_at(ORE, (0, 0, 0))) == 2 and len(index.vein_at(ORE, (4, 0, 0))) == 2
+    assert index.vein(vein_id)[0] == ORE
+    assert [vein["size"] for vein in index.summary()] == [2, 2]
+
+
+def test_replaced_block_leaves_its_vein():
+    world, index = make_index()
+    world.insert_many([(0, 0, 0), (1, 0, 0)], [ORE] * 2)
+    index.blocks(ORE)
+    world.set_block(1, 0, 0, "minecraft:stone")
+    assert index.vein_at(ORE, (0, 0, 0)).tolist() == [[0, 0, 0]]
+    assert len(index.vein_at(ORE, (1, 0, 0))) == 0
+
+
+def test_other_blocks_are_single_block_veins():
+    world, index = make_index()
+    world.insert_many([(0, 0, 0), (1, 0, 0)], ["minecraft:stone"] * 2)
+    assert not is_vein_block("minecraft:stone")
+    coords, labels = index.blocks("minecraft:stone")
+    assert len(coords) == 2 and sorted(labels.tolist()) == [0, 1]
+    assert len(index.vein_at("minecraft:stone", (0, 0, 0))) == 0
+    assert index.summary(["minecraft:stone"]) == []
+
+
+def test_order_veins_caps_each_task():
+    coords = [(x, 0, 0) for x in range(10)] + [(50, 0, 0)]
+    labels = [0] * 10 + [1]
+    veins = order_veins((-5, 0, 0), coords, labels, max_size=4)
+    assert [(entry, len(rest)) for entry, rest in veins] == [
+        ((0, 0, 0), 3), ((4, 0, 0), 3), ((8, 0, 0), 1), ((50, 0, 0), 0)]
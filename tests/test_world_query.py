@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from world_query import exposed_blocks, uncovered_blocks
+from world_store import WorldStore
+
+
+def cube(size):
+    return [(x, y, z) for x in range(size) for y in range(size) for z in range(size)]
+
+
+def test_uncovered_blocks_are_the_known_neighbours_of_a_removal():
+    world = WorldStore()
+    world.insert_many(cube(3), ["minecraft:stone"] * 27)
+    world.remove_block(1, 2, 1)
+    coords, ids = uncovered_blocks(world, [(1, 2, 1)])
+    # The neighbour above was never there; the centre one was hidden until now.
+    assert {tuple(c) for c in coords.tolist()} == {(0, 2, 1), (2, 2, 1), (1, 1, 1), (1, 2, 0), (1, 2, 2)}
+    assert np.all(ids == world.palette.index("minecraft:stone"))
+    assert (1, 1, 1) in {tuple(c) for c in exposed_blocks(world, (0, 0, 0), (2, 2, 2))[0].tolist()}
+
+
+def test_world_changes_sends_blocks_a_removal_uncovered():
+    app = pytest.importorskip("app")
+    client = app.app.test_client()
+    blocks = [(1000 + x, 10 + y, z) for x, y, z in cube(3)]
+    app.world.insert_many(blocks, ["minecraft:stone"] * len(blocks))
+    version = client.get("/world_changes?since=0").get_json()["version"]
+    app.world.remove_block(1001, 12, 1)
+    data = client.get(f"/world_changes?since={version}").get_json()
+    assert not data["full"]
+    sent = dict(zip(map(tuple, np.reshape(data["coords"], (-1, 3)).tolist()), data["ids"]))
+    assert sent.pop((1001, 12, 1)) == 0
+    assert set(sent) == {(1000, 12, 1), (1002, 12, 1), (1001, 11, 1), (1001, 12, 0), (1001, 12, 2)}
@@ -0,0 +1,100 @@
+import itertools
+
+import numpy as np
+
+from world_store import AIR_ID, WorldStore, pack_coords, section_keys, unpack_coords
+
+
+def test_pack_unpack_round_trip():
+    values = {
+        "x": [-30_000_000, -65, -16, -1, 0, 1, 15, 16, 4096, 30_000_000],
+        "y": [-64, -17, -16, -1, 0, 1, 16, 255, 319],
+    }
+    coords = np.array(list(itertools.product(values["x"], values["y"], values["x"])), dtype=np.int64)
+    packed = pack_coords(coords)
+    assert len(np.unique(packed)) == len(coords)
+    np.testing.assert_array_equal(unpack_coords(packed), coords)
+
+
+def test_section_keys():
+    coords = [(0, 0, 0), (15, 15, 15), (16, 0, 0), (-1, -1, -1), (-16, -17, 40)]
+    assert sorted(section_keys(coords)) == sorted([(0, 0, 0), (1, 0, 0), (-1, -1, -1), (-1, -2, 2)])
+
+
+def test_insert_and_read_back():
+    world = WorldStore()
+    coords = [(5, 64, -3), (-20, -60, 7), (16, 0, 16)]
+    world.insert_many(coords, ["minecraft:stone", "minecraft:iron_ore", "minecraft:dirt"])
+
+    assert len(world) == 3
+    assert world.get_name(5, 64, -3) == "minecraft:stone"
+    assert world.get_name(-20, -60, 7) == "minecraft:iron_ore"
+    assert world.get_name(0, 0, 0) is None
+    ids = world.ids_at(coords + [(100, 0, 100)])
+    assert [world.palette[i] for i in ids[:3]] == ["minecraft:stone", "minecraft:iron_ore", "minecraft:dirt"]
+    assert ids[3] == AIR_ID
+    np.testing.assert_array_equal(world.find_blocks("minecraft:iron_ore"), [(-20, -60, 7)])
+
+
+def test_insert_last_write_wins_and_air_removes():
+    world = WorldStore()
+    world.insert_many([(1, 2, 3), (1, 2, 3)], ["minecraft:stone", "minecraft:dirt"])
+    assert world.get_name(1, 2, 3) == "minecraft:dirt"
+
+    world.insert_many([(1, 2, 3)], ["minecraft:air"])
+    assert world.get_name(1, 2, 3) is None
+    assert len(world) == 0
+    assert not world.chunks
+    assert len(world.find_blocks("minecraft:dirt")) == 0
+
+
+def test_listeners_see_only_changes():
+    world = WorldStore()
+    changes = []
+    world.add_listener(lambda coords, old, new: changes.append((coords.tolist(), old.tolist(), new.tolist())))
+    world.insert_many([(0, 0, 0), (1, 0, 0)], ["minecraft:stone", "minecraft:stone"])
+    world.insert_many([(0, 0, 0), (1, 0, 0)], ["minecraft:stone", "minecraft:dirt"])
+    world.remove_block(0, 0, 0)
+    stone, dirt = world.palette_ids["minecraft:stone"], world.palette_ids["minecraft:dirt"]
+
+    assert changes[1] == ([[1, 0, 0]], [stone], [dirt])
+    assert changes[2] == ([[0, 0, 0]], [stone], [AIR_ID])
+    assert len(changes) == 3
+
+
+def test_box_ids_across_sections():
+    world = WorldStore()
+    rng = np.random.default_rng(0)
+    coords = np.unique(rng.integers(-40, 40, size=(500, 3)), axis=0)
+    ids = rng.integers(1, 4, size=len(coords))
+    world.insert_many(coords, [f"minecraft:block_{i}" for i in ids])
+
+    lo, hi = np.array([-33, -20, -5]), np.array([17, 30, 38])
+    expected = np.zeros(hi - lo + 1, dtype=np.uint16)
+    inside = np.all((coords >= lo) & (coords <= hi), axis=1)
+    local = coords[inside] - lo
+    expected[local[:, 0], local[:, 1], local[:, 2]] = world.ids_at(coords[inside])
+    np.testing.assert_array_equal(world.box_ids(lo, hi), expected)
+
+
+def test_nearest_blocks():
+    world = WorldStore()
+    world.insert_many([(10, 0, 0), (-3, 0, 0), (0, 5, 5)], ["minecraft:coal_ore"] * 3)
+    np.testing.assert_array_equal(world.nearest_blocks("minecraft:coal_ore", (0, 0, 0), k=2), [(-3, 0, 0), (0, 5, 5)])
+
+
+def test_dump_restore_and_from_sections():
+    world = WorldStore()
+    world.insert_many([(0, 0, 0), (-17, 33, 100)], ["minecraft:stone", "minecraft:gold_ore"])
+    world.observed.observe((0, 0, 0), radius=2)
+
+    restored = WorldStore()
+    restored.restore(list(world.palette), **world.dump())
+    assert restored.get_name(-17, 33, 100) == "minecraft:gold_ore"
+    np.testing.assert_array_equal(restored.find_blocks("minecraft:stone"), [(0, 0, 0)])
+    assert restored.observed.count() == world.observed.count()
+
+    copy = WorldStore.from_sections(world.export_sections((-20, 0, 0), (0, 40, 110)))
+    copy.palette = world.palette
+    assert copy.get_name(-17, 33, 100) == "minecraft:gold_ore"
+    assert len(copy) == 2
@@ -12,6 +12,9 @@ C&C Client v2.6
 -- CONFIGURATION ------------------------------------------------
 local serverHost = "http://192.168.1.71:5000"
 local pollInterval = 5
+-- Seconds the server may hold a poll open until commands arrive. Must stay
+-- under the HTTP timeout; 0 falls back to polling every pollInterval.
+local longPollWait = 25
 local idFilePath = ".turtle_id"
 local posFilePath = ".turtle_pos"
 
@@ -19,6 +22,10 @@ local posFilePath = ".turtle_pos"
 local SCAN_TOP = 70 -- The highest buildable block is Y=319.
 local SCAN_BOTTOM = -63 -- The lowest buildable block/bedrock layer starts at Y=-64.
 
+-- Send scan reports in the compact binary format (scan_format.py on the
+-- server) instead of JSON.
+local compactScans = true
+
 local enderChestName ='enderstorage:ender_chest'
 local CHEST_NAMES = {'minecraft:chest', 'minecraft:ender_chest', enderChestName}
 
@@ -49,6 +56,18 @@ local directionVectors = {
 local currentJob = "idle"
 local cancelCurrentJob = false
 
+-- Block palette issued by the server for compact scan reports.
+local paletteEpoch = 0
+local paletteNames = {} -- paletteNames[id + 1] = block name
+local paletteIds = {}   -- block name -> palette ID
+
+-- The last scan the server accepted, which the next compact report is sent
+-- as a delta against. nil means the next report goes in full.
+local lastScan = nil -- "x,y,z" (world coordinates) -> block name
+local lastScanSeq = 0
+local lastScanOrigin = nil -- "x,y,z" the last accepted scan was taken from
+local scanSeq = 0
+
 -- API FUNCTIONS ----------------------------------------------------
 function httpPost(url, payload)
     local body = textutils.serializeJSON(payload)
@@ -58,6 +77,13 @@ function httpPost(url, payload)
     return textutils.unserializeJSON(responseBody)
 end
 
+function httpPostBinary(url, body)
+    local response = http.post(url, body, {["Content-Type"] = "application/octet-stream"})
+    if not response then return nil end
+    local responseBody = response.readAll(); response.close()
+    return textutils.unserializeJSON(responseBody)
+end
+
 function httpGet(url)
     local response = http.get(url)
     if not response then return nil end
@@ -98,6 +124,148 @@ end
 -- END API FUNCTIONS ----------------------------------------------------
 
 
+-- SCAN ENCODING FUNCTIONS ----------------------------------------------------
+local function int8(v) return string.char(v % 256) end
+local function uint16(v) return string.char(v % 256, math.floor(v / 256) % 256) end
+local function int32(v)
+    v = v % 4294967296
+    return string.char(v % 256, math.floor(v / 256) % 256, math.floor(v / 65536) % 256, math.floor(v / 16777216) % 256)
+end
+
+---
+-- Encodes scanned blocks as a compact scan report: the origin, then three
+-- int8 offsets and a palette ID per block. Names without an ID yet are sent
+-- once in the header. See scan_format.py on the server for the layout.
+-- @param blocks List of {x, y, z, name} with offsets relative to the turtle.
+---
+function encodeScan(blocks)
+    local known = #paletteNames
+    local extra, extraIds, ids, maxId = {}, {}, {}, 0
+    for i, block in ipairs(blocks) do
+        local id = paletteIds[block.name] or extraIds[block.name]
+        if not id then
+            id = known + #extra
+            table.insert(extra, block.name)
+            extraIds[block.name] = id
+        end
+        ids[i] = id
+        if id > maxId then maxId = id end
+    end
+    local idSize = (maxId < 256) and 1 or 2
+
+    local parts = { int32(position.x), int32(position.y), int32(position.z), int32(paletteEpoch),
+        uint16(known), string.char(idSize), uint16(#extra) }
+    for _, name in ipairs(extra) do
+        table.insert(parts, string.char(#name) .. name)
+    end
+    for i, block in ipairs(blocks) do
+        local id = (idSize == 1) and string.char(ids[i]) or uint16(ids[i])
+        table.insert(parts, int8(block.x) .. int8(block.y) .. int8(block.z) .. id)
+    end
+    return table.concat(parts)
+end
+
+---
+-- Takes in the palette entries a scan response sent back.
+---
+function updatePalette(response)
+    if not response or not response.palette then return end
+    if response.palette_epoch ~= paletteEpoch or response.palette_start == 0 then
+        paletteEpoch = response.palette_epoch
+        paletteNames, paletteIds = {}, {}
+    end
+    for i, name in ipairs(response.palette) do
+        local id = response.palette_start + i - 1
+        paletteNames[id + 1] = name
+        paletteIds[name] = id
+    end
+end
+
+---
+-- Compares a scan with the last accepted one.
+-- @param blocks List of {x, y, z, name} offsets from the turtle.
+-- @param radius How far the scan reached. Blocks of the last scan within it
+--   that are missing now are reported as air.
+-- @return The blocks that changed, and the scan keyed by world coordinates.
+---
+function scanDelta(blocks, radius)
+    local current, changed = {}, {}
+    for _, block in ipairs(blocks) do
+        local key = (position.x + block.x) .. "," .. (position.y + block.y) .. "," .. (position.z + block.z)
+        current[key] = block.name
+        if not lastScan or lastScan[key] ~= block.name then
+            table.insert(changed, block)
+        end
+    end
+    for key in pairs(lastScan or {}) do
+        if not current[key] then
+            local x, y, z = key:match("^(-?%d+),(-?%d+),(-?%d+)$")
+            local dx, dy, dz = x - position.x, y - position.y, z - position.z
+            if dx * dx + dy * dy + dz * dz <= radius * radius then
+                table.insert(changed, { x = dx, y = dy, z = dz, name = "minecraft:air" })
+            end
+        end
+    end
+    return changed, current
+end
+
+---
+-- Posts a compact scan report, resending with the new palette if the
+-- server's changed.
+---
+function postScan(blocks, query)
+    local url = serverHost .. "/scan_report/" .. turtleId .. query
+    local response = httpPostBinary(url, encodeScan(blocks))
+    if response and response.error == "palette" then
+        -- The server restarted since our palette was issued: take the new one and resend.
+        updatePalette(response)
+        response = httpPostBinary(url, encodeScan(blocks))
+    end
+    updatePalette(response)
+    return response
+end
+
+function sendScan(blocks, radius)
+    if not compactScans then
+        local blocksData = {}
+        for _, block in ipairs(blocks) do
+            local key = string.format("%d,%d,%d", position.x + block.x, position.y + block.y, position.z + block.z)
+            blocksData[key] = block.name
+        end
+        httpPost(serverHost .. "/scan_report/" .. turtleId, {blocks = blocksData})
+        return
+    end
+
+    local changed, current = scanDelta(blocks, radius)
+    local origin = position.x .. "," .. position.y .. "," .. position.z
+    -- From anywhere else, even an unchanged scan is sent: the server marks
+    -- everything within the radius as seen.
+    if lastScan and #changed == 0 and origin == lastScanOrigin then
+        print("Scan unchanged, not sent.")
+        lastScan = current
+        return
+    end
+
+    scanSeq = scanSeq + 1
+    local query = "?seq=" .. scanSeq .. "&blocks=" .. #blocks .. "&radius=" .. radius
+    local response
+    if lastScan then
+        response = postScan(changed, query .. "&base=" .. lastScanSeq)
+    end
+    if not lastScan or (response and response.error == "scan-base") then
+        -- No base, or the server lost track of it: send everything.
+        response = postScan(blocks, query)
+    end
+
+    if response and response.status == "ok" then
+        lastScan, lastScanSeq, lastScanOrigin = current, scanSeq, origin
+    else
+        lastScan = nil
+    end
+end
+-- END SCAN ENCODING FUNCTIONS ----------------------------------------------------
+
+
 -- ITEM MANAGEMENT FUNCTIONS ----------------------------------------------
 
 
@@ -397,33 +565,30 @@ end
 -- MULTI STEP ACTION FUNCTIONS ----------------------------------------------------
 function scanEnvironment()
     if checkCancel() then return false end
-    local blocksData = {}
-    
+    local scanned = {}
+    local radius = 1 -- the manual inspection reaches only the neighbouring blocks
+
     equipItem("advancedperipherals:geo_scanner")
 
     local scanner = peripheral.find("geo_scanner")
 
     if scanner then
         print("GeoScanner found. Scanning...")
-        local blocks, reason = scanner.scan(8)
+        radius = 8
+        local blocks, reason = scanner.scan(radius)
         if not blocks then
             print("Scan failed: " .. (reason or "Unknown error"))
             return false
         end
 
         for _, block in ipairs(blocks) do
-            local absX = position.x + block.x
-            local absY = position.y + block.y
-            local absZ = position.z + block.z
-            local locationKey = string.format("%d,%d,%d", absX, absY, absZ)
-            blocksData[locationKey] = block.name
+            table.insert(scanned, { x = block.x, y = block.y, z = block.z, name = block.name })
         end
     else
         print("GeoScanner not found. Performing manual inspection...")
         local function addBlock(offset, blockInfo)
             if type(blockInfo) == "table" and blockInfo.name then
-                local key = string.format("%d,%d,%d", position.x + offset.x, position.y + offset.y, position.z + offset.z)
-                blocksData[key] = blockInfo.name
+                table.insert(scanned, { x = offset.x, y = offset.y, z = offset.z, name = blockInfo.name })
             end
         end
 
@@ -448,18 +613,19 @@ function scanEnvironment()
     end
 
     print("Scan complete. Sending data to server...")
-    httpPost(serverHost .. "/scan_report/" .. turtleId, {blocks = blocksData})
+    sendScan(scanned, radius)
     os.sleep(0.5)
     return true
 end
 
-function scanChunk()
+function scanChunk(chunkX, chunkZ)
     currentJob = "scanning chunk"
     reportStatus()
     print("Starting chunk scan.")
 
-    local chunkX = math.floor(position.x / 16)
-    local chunkZ = math.floor(position.z / 16)
+    -- The survey names the chunk; by hand it is the one the turtle is in.
+    chunkX = tonumber(chunkX) or math.floor(position.x / 16)
+    chunkZ = tonumber(chunkZ) or math.floor(position.z / 16)
     local centerX = chunkX * 16 + 7
     local centerZ = chunkZ * 16 + 7
 
@@ -641,7 +807,7 @@ function executeCommand(cmd)
     elseif commandName == "turnLeft" then currentJob = "turning left"; success = turn(turtle.turnLeft)
     elseif commandName == "turnRight" then currentJob = "turning right"; success = turn(turtle.turnRight)
     elseif commandName == "faceDirection" then currentJob = "facing direction"; success = faceDirection(table.unpack(args))
-    elseif commandName == "scanChunk" then success = scanChunk()
+    elseif commandName == "scanChunk" then success = scanChunk(table.unpack(args))
 
     elseif commandName == "isInventoryFull" then
         local maxSlots = tonumber(args[1]) or 15
@@ -703,14 +869,22 @@ end
 -- START THE TURTLE
 startSequence()
 
+-- Status last sent with a poll; unchanged status is not sent again.
+local lastPollStatus = nil
+
 while true do
     print("Polling...")
-    local response = httpPost(serverHost .. "/poll/" .. turtleId, getStatus())
+    local status = getStatus()
+    local serialized = textutils.serializeJSON(status)
+    local response = httpPost(serverHost .. "/poll/" .. turtleId .. "?wait=" .. longPollWait,
+        serialized ~= lastPollStatus and status or {})
+    if response then lastPollStatus = serialized end
 
     if response and response.error == "re-register" then
         print("Server error: re-register. Deleting local ID file.")
         fs.delete(idFilePath)
         startSequence()
+        lastPollStatus = nil
     end
 
     if response and response.commands and #response.commands > 0 then
@@ -725,5 +899,8 @@ while true do
             os.sleep(0.2)
         end
     end
-    os.sleep(pollInterval)
+    -- A long poll already waited on the server; otherwise wait here.
+    if not (response and response.long_poll) then
+        os.sleep(pollInterval)
+    end
 end
\ No newline at end of file
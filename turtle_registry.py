@@ -0,0 +1,144 @@
+import copy
+import threading
+
+
+class TurtleRegistry:
+    """
+    The registered turtles, their last reported status and their command
+    queues, safe to share between request threads.
+
+    Every read or change goes through one lock, so a poll that drains a
+    queue can never race a handler appending to it: each command is handed
+    out exactly once. Callers that need several steps to happen together
+    (collecting planned jobs and queueing them in order, say) can hold
+    `lock` themselves; it is reentrant.
+
+    Long polls wait on `queued`, which is notified whenever commands are
+    added to any queue.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.queued = threading.Condition(self.lock)
+        self.turtles = {}  # turtle id -> {"status": dict, "queue": [command]}
+        self.next_id = 1
+        # Called as listener(op, turtle_id, value) after every change, under the lock.
+        self.listeners = []
+
+    def add_listener(self, listener):
+        """
+        Registers a callback for changes. op is "register" or "status" (value:
+        the status), "queue" (value: the commands added), "take" or "clear".
+        """
+        self.listeners.append(listener)
+
+    def _notify(self, op, turtle_id, value=None):
+        for listener in self.listeners:
+            listener(op, turtle_id, value)
+
+    def __contains__(self, turtle_id):
+        with self.lock:
+            return turtle_id in self.turtles
+
+    def __len__(self):
+        with self.lock:
+            return len(self.turtles)
+
+    def ids(self):
+        with self.lock:
+            return list(self.turtles)
+
+    def register(self, status):
+        """Adds a turtle with an empty queue. Returns its new ID."""
+        with self.lock:
+            turtle_id = str(self.next_id)
+            self.next_id += 1
+            self.turtles[turtle_id] = {"status": status, "queue": []}
+            self._notify("register", turtle_id, status)
+            return turtle_id
+
+    def status(self, turtle_id):
+        """Returns a copy of the turtle's last reported status, or None."""
+        with self.lock:
+            turtle = self.turtles.get(turtle_id)
+            return copy.deepcopy(turtle["status"]) if turtle else None
+
+    def update_status(self, turtle_id, status):
+        with self.lock:
+            if turtle_id not in self.turtles:
+                return False
+            self.turtles[turtle_id]["status"] = status
+            self._notify("status", turtle_id, status)
+            return True
+
+    def queue_length(self, turtle_id):
+        with self.lock:
+            return len(self.turtles[turtle_id]["queue"])
+
+    def extend_queue(self, turtle_id, commands):
+        with self.lock:
+            if turtle_id not in self.turtles:
+                return False
+            self.turtles[turtle_id]["queue"].extend(commands)
+            self._notify("queue", turtle_id, commands)
+            self.queued.notify_all()
+            return True
+
+    def take_queue(self, turtle_id):
+        """Removes and returns every queued command for a turtle."""
+        with self.lock:
+            turtle = self.turtles.get(turtle_id)
+            if turtle is None:
+                return []
+            commands, turtle["queue"] = turtle["queue"], []
+            if commands:
+                self._notify("take", turtle_id)
+            return commands
+
+    def wait_for_queue(self, turtle_id, timeout):
+        """
+        Waits up to timeout seconds for commands to be queued for a turtle,
+        then removes and returns them (an empty list if none arrived).
+        """
+        with self.lock:
+            self.queued.wait_for(
+                lambda: turtle_id not in self.turtles or self.turtles[turtle_id]["queue"],
+                timeout,
+            )
+            return self.take_queue(turtle_id)
+
+    def clear_queue(self, turtle_id):
+        with self.lock:
+            if turtle_id in self.turtles:
+                self.turtles[turtle_id]["queue"] = []
+                self._notify("clear", turtle_id)
+
+    def snapshot(self):
+        """Returns a deep copy of every turtle, for rendering and JSON."""
+        with self.lock:
+            return copy.deepcopy(self.turtles)
+
+    def apply(self, op, turtle_id, value=None):
+        """Replays a change reported to a listener."""
+        with self.lock:
+            if op == "register":
+                self.turtles[turtle_id] = {"status": value, "queue": []}
+                self.next_id = max(self.next_id, int(turtle_id) + 1)
+            elif turtle_id not in self.turtles:
+                return
+            elif op == "status":
+                self.turtles[turtle_id]["status"] = value
+            elif op == "queue":
+                self.turtles[turtle_id]["queue"].extend(value)
+            elif op in ("take", "clear"):
+                self.turtles[turtle_id]["queue"] = []
+
+    def dump(self):
+        with self.lock:
+            return {"turtles": copy.deepcopy(self.turtles), "next_id": self.next_id}
+
+    def restore(self, data):
+        """Loads the output of dump()."""
+        with self.lock:
+            self.turtles = copy.deepcopy(data["turtles"])
+            self.next_id = data["next_id"]
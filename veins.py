@@ -0,0 +1,297 @@
+"""
+Ore veins: connected groups of same-name blocks in the world store.
+
+Ores generate in veins, so mining one block almost always means mining the
+blocks touching it too. VeinIndex labels the blocks of each ore name into
+26-connected components (blocks sharing a face, edge or corner) and keeps
+the labels current from WorldStore change notifications:
+
+- new blocks join the veins they touch, merging them if they touch several
+- a vein that loses blocks is relabelled on its own, as it may have split
+
+Only the changed blocks and the veins around them are relabelled; a name
+is labelled in full once, the first time it is asked for. Only names that
+form veins (see is_vein_block) are labelled: other blocks, stone above
+all, join into components far too large to label or mine as one. Labelling is
+vectorized: neighbours are found by binary search over packed coordinates
+and labels settle by min-propagation along those edges with pointer
+jumping.
+
+A vein is mined as one MineTask (see task_queue.py): a planned approach to
+the vein's entry block, then gotos from block to block in a short tour,
+which need no planning since the turtle digs through them anyway. Veins
+larger than MAX_VEIN_SIZE are mined as several tasks.
+"""
+import itertools
+
+import numpy as np
+
+from task_allocator import manhattan, order_tour
+from world_store import pack_coords, unpack_coords
+
+
+# --- Constants ---
+# Names labelled into veins without being asked for: anything ending in one
+# of these suffixes, and the listed names.
+VEIN_SUFFIXES = ("_ore",)
+VEIN_NAMES = {"minecraft:ancient_debris"}
+# Most blocks mined as one task: the tour through a vein is ordered in
+# quadratic time, on the request thread.
+MAX_VEIN_SIZE = 64
+
+# The 26 neighbours of a block, and one of each opposite pair.
+_NEIGHBOURS = np.array([d for d in itertools.product((-1, 0, 1), repeat=3) if any(d)], dtype=np.int64)
+_HALF_NEIGHBOURS = _NEIGHBOURS[13:]
+
+
+def is_vein_block(name):
+    """Whether a block name forms veins, such as the ores."""
+    return bool(name) and (name.endswith(VEIN_SUFFIXES) or name in VEIN_NAMES)
+
+
+def label_components(coords):
+    """
+    Labels the 26-connected components of a set of block positions.
+
+    Args:
+        coords: (N, 3) distinct positions.
+
+    Returns:
+        np.ndarray: (N,) labels from 0 to components - 1.
+    """
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    n = len(coords)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    keys = pack_coords(coords)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    a, b = [], []
+    for offset in _HALF_NEIGHBOURS:
+        wanted = pack_coords(coords + offset)
+        found = np.minimum(np.searchsorted(sorted_keys, wanted), n - 1)
+        hit = sorted_keys[found] == wanted
+        a.append(np.flatnonzero(hit))
+        b.append(order[found[hit]])
+    a, b = np.concatenate(a), np.concatenate(b)
+
+    # Each block points at the lowest index it has heard of; pointer jumping
+    # (labels[labels]) passes that along chains in logarithmic rounds.
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        settled = labels.copy()
+        np.minimum.at(settled, a, low)
+        np.minimum.at(settled, b, low)
+        settled = settled[settled]
+        if np.array_equal(settled, labels):
+            break
+        labels = settled
+    return np.unique(labels, return_inverse=True)[1]
+
+
+def order_veins(start, coords, labels=None, max_size=MAX_VEIN_SIZE):
+    """
+    Orders veins into a mining tour from start, greedily: the nearest vein
+    next, entered at its block nearest the turtle and crossed in a short
+    tour from there. A vein of more than max_size blocks is taken max_size
+    blocks at a time, those nearest its entry first.
+
+    Args:
+        coords: (N, 3) blocks to mine.
+        labels: (N,) vein of each block, or None if they are all one vein.
+        max_size: Most blocks per vein in the tour.
+
+    Returns:
+        list: (entry, rest) per vein in visiting order, rest being a tuple
+        of the vein's other blocks in digging order.
+    """
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    labels = np.zeros(len(coords), dtype=np.int64) if labels is None else np.asarray(labels)
+    remaining = np.ones(len(coords), dtype=bool)
+    position = np.asarray(start, dtype=np.int64)
+    veins = []
+    while remaining.any():
+        candidates = np.flatnonzero(remaining)
+        nearest = candidates[manhattan(coords[candidates], position).argmin()]
+        members = candidates[labels[candidates] == labels[nearest]]
+        if len(members) > max_size:
+            near = np.argsort(manhattan(coords[members], coords[nearest]), kind="stable")
+            members = members[near[:max_size]]
+        remaining[members] = False
+        entry = tuple(coords[nearest].tolist())
+        rest = order_tour(entry, [tuple(p) for p in coords[members].tolist() if tuple(p) != entry], manhattan)
+        veins.append((entry, tuple(rest)))
+        position = np.asarray(rest[-1] if rest else entry)
+    return veins
+
+
+class _Veins:
+    """Vein labels for the blocks of one name."""
+
+    def __init__(self):
+        self.vein_of = {}  # packed coordinate -> vein id
+        self.members = {}  # vein id -> {packed coordinate}
+
+
+class VeinIndex:
+    """
+    Veins of the world store's ore blocks, kept up to date as blocks change.
+
+    Register on_blocks_changed as a WorldStore listener. Everything runs
+    under the world store's lock, so the labels always match the store.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self.names = {}  # palette index -> _Veins, for names labelled so far
+        self.ids = itertools.count(1)
+
+    def _labelled(self, name):
+        """
+        The _Veins of a name, labelling it in full if it is new. None if the
+        name is unknown or does not form veins.
+        """
+        block_id = self.world.palette_ids.get(name)
+        if block_id is None or not is_vein_block(name):
+            return None
+        veins = self.names.get(block_id)
+        if veins is None:
+            veins = self.names[block_id] = _Veins()
+            coords = self.world.index.get(block_id)
+            self._assign(veins, pack_coords(coords), label_components(coords), set())
+        return veins
+
+    def _assign(self, veins, keys, labels, old_ids):
+        """
+        Records labelled components as veins. A component reuses the lowest
+        id among old_ids its blocks had; every other old id is retired.
+        """
+        order = np.argsort(labels, kind="stable")
+        bounds = np.flatnonzero(np.diff(labels[order])) + 1
+        retired = set(old_ids)
+        for group in np.split(keys[order], bounds):
+            members = set(group.tolist())
+            previous = {veins.vein_of[key] for key in members if key in veins.vein_of} & retired
+            vein_id = min(previous) if previous else next(self.ids)
+            retired.discard(vein_id)
+            veins.members[vein_id] = members
+            veins.vein_of.update(dict.fromkeys(members, vein_id))
+        for vein_id in retired:
+            veins.members.pop(vein_id, None)
+
+    # --- Updates ---
+    def on_blocks_changed(self, coords, old_ids, new_ids):
+        """WorldStore listener: moves changed blocks of labelled names in and out of veins."""
+        if not self.names:
+            return
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+        old_ids, new_ids = np.asarray(old_ids), np.asarray(new_ids)
+        for block_id, veins in self.names.items():
+            removed = old_ids == block_id
+            if removed.any():
+                self._remove(veins, pack_coords(coords[removed]).tolist())
+            added = new_ids == block_id
+            if added.any():
+                self._add(veins, coords[added])
+
+    def _remove(self, veins, keys):
+        touched = {veins.vein_of.pop(key) for key in keys if key in veins.vein_of}
+        for vein_id in touched:
+            members = veins.members[vein_id]
+            members.difference_update(keys)
+            if not members:
+                del veins.members[vein_id]
+                continue
+            # What is left may have fallen apart into several veins.
+            remaining = np.fromiter(members, dtype=np.int64, count=len(members))
+            self._assign(veins, remaining, label_components(unpack_coords(remaining)), {vein_id})
+
+    def _add(self, veins, coords):
+        keys = pack_coords(coords)
+        around = pack_coords((coords[:, None, :] + _NEIGHBOURS).reshape(-1, 3)).tolist()
+        touched = {veins.vein_of[key] for key in around if key in veins.vein_of}
+        group = set(keys.tolist())
+        for vein_id in touched:
+            group |= veins.members[vein_id]
+        group = np.fromiter(group, dtype=np.int64, count=len(group))
+        self._assign(veins, group, label_components(unpack_coords(group)), touched)
+
+    # --- Queries ---
+    def blocks(self, name):
+        """
+        Every block of a name with its vein. Blocks of a name that does not
+        form veins are each a vein of their own, with ids 0 to N - 1.
+
+        Returns:
+            tuple: ((N, 3) coordinates, (N,) vein ids).
+        """
+        with self.world.lock:
+            if not is_vein_block(name):
+                coords = self.world.index.get(self.world.palette_ids.get(name)).copy()
+                return coords, np.arange(len(coords))
+            veins = self._labelled(name)
+            if veins is None or not veins.vein_of:
+                return np.empty((0, 3), dtype=np.int64), np.empty(0, dtype=np.int64)
+            keys = np.fromiter(veins.vein_of.keys(), dtype=np.int64, count=len(veins.vein_of))
+            labels = np.fromiter(veins.vein_of.values(), dtype=np.int64, count=len(veins.vein_of))
+        return unpack_coords(keys), labels
+
+    def vein_at(self, name, point):
+        """
+        (N, 3) blocks of the vein of this name that includes point, empty if
+        none does or the name does not form veins.
+        """
+        with self.world.lock:
+            veins = self._labelled(name)
+            vein_id = veins.vein_of.get(int(pack_coords(point)[0])) if veins else None
+            if vein_id is None:
+                return np.empty((0, 3), dtype=np.int64)
+            members = veins.members[vein_id]
+            keys = np.fromiter(members, dtype=np.int64, count=len(members))
+        return unpack_coords(keys)
+
+    def vein(self, vein_id):
+        """(name, (N, 3) blocks) of a vein by id, or None if there is no such vein."""
+        with self.world.lock:
+            for block_id, veins in self.names.items():
+                members = veins.members.get(vein_id)
+                if members is not None:
+                    keys = np.fromiter(members, dtype=np.int64, count=len(members))
+                    return self.world.palette[block_id], unpack_coords(keys)
+        return None
+
+    def summary(self, names=None, min_size=1):
+        """
+        Every known vein, largest first.
+
+        Args:
+            names: Block names to list, or None for every name that forms
+                veins (see is_vein_block) and every name labelled so far.
+
+        Returns:
+            list: {"id", "name", "size", "min", "max", "center"} per vein.
+        """
+        with self.world.lock:
+            if names is None:
+                names = [name for name in self.world.palette if is_vein_block(name)]
+                names += [self.world.palette[block_id] for block_id in self.names]
+            found = []
+            for name in dict.fromkeys(names):
+                veins = self._labelled(name)
+                for vein_id, members in (veins.members.items() if veins else ()):
+                    if len(members) >= min_size:
+                        found.append((name, vein_id, np.fromiter(members, dtype=np.int64, count=len(members))))
+        summary = []
+        for name, vein_id, keys in found:
+            coords = unpack_coords(keys)
+            summary.append({
+                "id": vein_id,
+                "name": name,
+                "size": len(coords),
+                "min": coords.min(axis=0).tolist(),
+                "max": coords.max(axis=0).tolist(),
+                "center": np.round(coords.mean(axis=0), 1).tolist(),
+            })
+        summary.sort(key=lambda vein: (-vein["size"], vein["id"]))
+        return summary
@@ -0,0 +1,174 @@
+"""
+Turning planned paths into goto commands.
+
+turtle.lua's goto moves vertically first, then along z, then along x,
+digging through whatever is in the way. One goto therefore covers any
+stretch of a path made of at most one straight run along each axis, in that
+order. compress_path finds the fewest such stretches; smooth_path reshapes
+a path so more of it takes that form, without making it more expensive.
+"""
+import numpy as np
+
+
+# Rank of each axis (x, y, z) in the order goto moves along them: y, z, x.
+GOTO_RANK = np.array([2, 0, 1])
+
+
+def _points(path):
+    points = np.asarray(path, dtype=np.int64).reshape(-1, 3)
+    if len(points) > 1:
+        # Drop repeated points, which would read as zero-length runs.
+        keep = np.concatenate([[True], np.any(np.diff(points, axis=0) != 0, axis=1)])
+        points = points[keep]
+    return points
+
+
+def compress_path(path, goto_aware=True):
+    """
+    Returns the waypoints a turtle should goto, in order, to follow a path.
+
+    Without goto_aware, a waypoint is emitted at every change of direction,
+    so each goto is one straight run. With it, consecutive runs are merged
+    while goto would walk them in the same order (y, then z, then x), so a
+    staircase down and along x, say, takes one goto per pair of runs
+    instead of one per run.
+
+    Args:
+        path: Sequence of (x, y, z) points, each one step from the last.
+
+    Returns:
+        np.ndarray: (N, 3) waypoints, excluding the start.
+    """
+    points = _points(path)
+    if len(points) < 2:
+        return points[:0]
+    steps = np.diff(points, axis=0)
+    # First step of every straight run.
+    starts = np.concatenate([[0], np.flatnonzero(np.any(steps[1:] != steps[:-1], axis=1)) + 1])
+    if goto_aware:
+        ranks = GOTO_RANK[np.abs(steps[starts]).argmax(axis=1)]
+        # A run starts a new goto unless its axis comes after the last run's.
+        starts = starts[np.concatenate([[True], ranks[1:] <= ranks[:-1]])]
+    return np.concatenate([points[starts[1:]], points[-1:]])
+
+
+def goto_route(start, end):
+    """Every point turtle.lua's goto passes from start to end, both included."""
+    route = [np.asarray(start, dtype=np.int64).reshape(1, 3)]
+    current = route[0][0].copy()
+    for axis in (1, 2, 0):
+        distance = int(end[axis]) - int(current[axis])
+        if not distance:
+            continue
+        leg = np.repeat(current[None, :], abs(distance), axis=0)
+        leg[:, axis] += np.arange(1, abs(distance) + 1) * np.sign(distance)
+        route.append(leg)
+        current = leg[-1].copy()
+    return np.concatenate(route)
+
+
+def count_turns(path):
+    """
+    Turns a turtle makes following a path: 1 for each quarter turn between
+    horizontal moves, 2 for reversing. Vertical moves keep the facing.
+    """
+    steps = np.diff(_points(path), axis=0)
+    horizontal = steps[(steps[:, 1] == 0)][:, [0, 2]]
+    if len(horizontal) < 2:
+        return 0
+    dots = np.einsum("ij,ij->i", horizontal[1:], horizontal[:-1])
+    return int(np.count_nonzero(dots == 0) + 2 * np.count_nonzero(dots < 0))
+
+
+def turtle_moves(start, waypoints):
+    """
+    Returns (moves, turns) for a turtle at start running a goto to each
+    waypoint in turn.
+    """
+    route = _goto_chain(start, waypoints)
+    return len(route) - 1, count_turns(route)
+
+
+def _goto_chain(start, waypoints):
+    """Every point a turtle at start passes running a goto to each waypoint in turn."""
+    points = [np.asarray(start, dtype=np.int64).reshape(1, 3)]
+    current = points[0][0]
+    for waypoint in np.asarray(waypoints, dtype=np.int64).reshape(-1, 3):
+        points.append(goto_route(current, waypoint)[1:])
+        current = waypoint
+    return np.concatenate(points)
+
+
+def smooth_path(path, cost_at, turn_cost=0):
+    """
+    Replaces stretches of a path with goto-shaped routes (see goto_route)
+    where that costs no more, so it compresses into fewer gotos and turns.
+
+    Only stretches that never double back are considered, so the turtle
+    makes the same number of moves; a replacement must avoid impassable
+    blocks and cost no more in block costs plus turn_cost per turn.
+
+    Args:
+        path: Sequence of (x, y, z) points, each one step from the last.
+        cost_at: Callable (N, 3) points -> (N,) costs, 0 for impassable.
+        turn_cost: Cost of one quarter turn.
+
+    Returns:
+        list: The smoothed path as (x, y, z) tuples.
+    """
+    points = _points(path)
+    n = len(points)
+    if n < 3:
+        return [tuple(p) for p in points.tolist()]
+
+    # cumulative[i] = cost of walking the path from points[0] to points[i].
+    cumulative = np.concatenate([[0], np.cumsum(cost_at(points[1:]).astype(np.int64))])
+    steps = np.diff(points, axis=0)
+    corners = np.flatnonzero(np.any(steps[1:] != steps[:-1], axis=1)) + 1
+
+    smoothed = [points[:1]]
+    i = 0
+    while i < n - 1:
+        # Points reachable from points[i] without ever stepping back towards it.
+        distance = np.abs(points[i + 1:] - points[i]).sum(axis=1)
+        monotone = distance == np.arange(1, n - i)
+        reach = i + (n - 1 - i if monotone.all() else int(np.argmin(monotone)))
+        candidates = corners[(corners > i + 1) & (corners < reach)]
+        accepted = None
+        for j in [reach] + candidates[::-1].tolist():
+            if j <= i + 1:
+                continue
+            route = goto_route(points[i], points[j])
+            if np.array_equal(route, points[i:j + 1]):
+                accepted = route
+                break
+            route_costs = cost_at(route[1:])
+            if np.any(route_costs == 0):
+                continue
+            route_total = int(route_costs.sum(dtype=np.int64)) + turn_cost * count_turns(route)
+            path_total = int(cumulative[j] - cumulative[i]) + turn_cost * count_turns(points[i:j + 1])
+            if route_total <= path_total:
+                accepted = route
+                break
+        if accepted is None:
+            smoothed.append(points[i + 1:i + 2])
+            i += 1
+        else:
+            smoothed.append(accepted[1:])
+            i += len(accepted) - 1
+    return [tuple(p) for p in np.concatenate(smoothed).tolist()]
+
+
+def waypoint_commands(path, goto_aware=True):
+    """Formats compress_path's waypoints as goto commands."""
+    return [f"goto {x} {y} {z}" for x, y, z in compress_path(path, goto_aware).tolist()]
+
+
+def visit_commands(start, points):
+    """
+    goto commands taking a turtle from start through every point in turn
+    along goto's own route, with no planning: for short hops between
+    blocks it is going to dig out anyway. Hops that run on in goto's
+    axis order share one goto.
+    """
+    return waypoint_commands(_goto_chain(start, points))
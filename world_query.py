@@ -0,0 +1,235 @@
+"""
+Level-of-detail world queries for the 3D viewer (/world_query).
+
+The viewer asks for a box around its camera. Blocks within `near` of the
+camera come back one by one, except those hidden on all six sides by other
+known blocks. Farther out, up to `radius`, the world is summarised in cubic
+cells CELL_SIZES[detail] blocks across, in one of these forms:
+
+    cells      every occupied cell, coloured by its topmost block, except
+               cells hidden behind full cells on all six sides
+    surface    only the highest occupied cell of each column of cells
+    occupancy  one cell per stored chunk section, whatever the detail
+
+Every instance carries the share of its cell that is solid, so a summary
+can be drawn smaller when its cell is mostly empty.
+
+Response layout, little-endian, with each array ready to copy into the
+viewer's instance buffers:
+
+    uint32 version                  change log version of the world
+    uint32 count                    instances
+    uint32 turtle_count
+    float32 instances[count][4]     centre x, y, z and edge length
+    float32 turtles[turtle_count][3]
+    uint8 colors[count][3]          RGB
+    uint8 fill[count]               solid share of the cell, 0-255
+
+A viewer refreshing a box it already has passes the version it got with
+it. If no block in the box (see query_box) has changed since, count is
+UNCHANGED, the version is the current one and only the turtles follow
+(see encode_unchanged).
+"""
+import struct
+
+import numpy as np
+
+from world_store import AIR_ID, SECTION_SIZE, pack_coords
+
+
+# --- Constants ---
+QUERY_HEADER = struct.Struct("<III")
+# count of a response telling the viewer to keep the instances it has.
+UNCHANGED = 0xFFFFFFFF
+# Edge of a summary cell in blocks, by detail level.
+CELL_SIZES = (16, 8, 4, 2)
+FAR_MODES = ("cells", "surface", "occupancy")
+# Colour of occupancy summaries, which do not look at block types.
+OCCUPANCY_COLOR = (128, 128, 128)
+_NEIGHBOURS = np.array([(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)])
+
+
+def uncovered_blocks(world, removed):
+    """
+    Returns (coords, ids) of the known blocks next to the (N, 3) removed
+    positions. A viewer drawing only exposed blocks never had them, and
+    a removal may have just exposed them.
+    """
+    around = (np.asarray(removed, dtype=np.int64).reshape(-1, 1, 3) + _NEIGHBOURS).reshape(-1, 3)
+    around = np.unique(around, axis=0)
+    with world.lock:
+        ids = world.ids_at(around)
+    known = ids != AIR_ID
+    return around[known], ids[known]
+
+
+def exposed_blocks(world, min_corner, max_corner):
+    """
+    Returns (coords, ids) of the known blocks inside an inclusive box with
+    at least one face on air or unknown space.
+    """
+    lo = np.asarray(min_corner, dtype=np.int64)
+    hi = np.asarray(max_corner, dtype=np.int64)
+    padded = world.box_ids(lo - 1, hi + 1)
+    solid = padded != AIR_ID
+    inner = solid[1:-1, 1:-1, 1:-1]
+    covered = (solid[2:, 1:-1, 1:-1] & solid[:-2, 1:-1, 1:-1]
+               & solid[1:-1, 2:, 1:-1] & solid[1:-1, :-2, 1:-1]
+               & solid[1:-1, 1:-1, 2:] & solid[1:-1, 1:-1, :-2])
+    local = np.argwhere(inner & ~covered)
+    ids = padded[local[:, 0] + 1, local[:, 1] + 1, local[:, 2] + 1]
+    return local + lo, ids
+
+
+def summarize_sections(sections, cell):
+    """
+    Downsamples sections into cubic cells.
+
+    Args:
+        sections: {(chunk_x, section_y, chunk_z): uint16 array}.
+        cell: Cell edge in blocks, dividing SECTION_SIZE.
+
+    Returns:
+        tuple: ((N, 3) cell indices, (N,) ID of each cell's topmost block,
+        (N,) solid blocks per cell) for the occupied cells.
+    """
+    if not sections:
+        return np.empty((0, 3), dtype=np.int64), np.empty(0, dtype=np.uint16), np.empty(0, dtype=np.int64)
+    keys = np.array(list(sections), dtype=np.int64)
+    n = SECTION_SIZE // cell
+    blocks = np.stack(list(sections.values())).reshape(len(keys), n, cell, n, cell, n, cell)
+    # (section, cell x, cell y, cell z, y from the top, x, z) -> one row per cell.
+    blocks = blocks.transpose(0, 1, 3, 5, 4, 2, 6)[:, :, :, :, ::-1].reshape(len(keys), n, n, n, -1)
+    solid = blocks != AIR_ID
+    fill = solid.sum(axis=-1)
+    top = np.take_along_axis(blocks, solid.argmax(axis=-1)[..., None], axis=-1)[..., 0]
+    occupied = np.argwhere(fill > 0)
+    index = tuple(occupied.T)
+    cells = keys[occupied[:, 0]] * n + occupied[:, 1:]
+    return cells, top[index], fill[index]
+
+
+def visible_cells(cells, full):
+    """Mask of cells with at least one neighbour that is not a full cell."""
+    full_keys = np.sort(pack_coords(cells[full]))
+    if not len(full_keys):
+        return np.ones(len(cells), dtype=bool)
+    hidden = np.ones(len(cells), dtype=bool)
+    for step in _NEIGHBOURS:
+        keys = pack_coords(cells + step)
+        found = np.minimum(np.searchsorted(full_keys, keys), len(full_keys) - 1)
+        hidden &= full_keys[found] == keys
+    return ~hidden
+
+
+def surface_cells(cells):
+    """Mask of the highest cell in each (x, z) column of cells."""
+    columns = pack_coords(cells * [1, 0, 1])
+    order = np.lexsort((cells[:, 1], columns))
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = columns[order][1:] != columns[order][:-1]
+    mask = np.zeros(len(cells), dtype=bool)
+    mask[order[last]] = True
+    return mask
+
+
+def _aligned_box(center, radius, cell):
+    lo = (np.asarray(center, dtype=np.int64) - radius) // cell * cell
+    hi = (np.asarray(center, dtype=np.int64) + radius) // cell * cell + cell - 1
+    return lo, hi
+
+
+def _cell_size(detail, far):
+    return SECTION_SIZE if far == "occupancy" else CELL_SIZES[detail]
+
+
+def query_box(center, radius, near, detail=2, far="cells"):
+    """
+    Inclusive (min corner, max corner) of the blocks query_world's answer
+    depends on: its box, and one cell around it for the neighbours that
+    decide what is hidden.
+    """
+    cell = _cell_size(detail, far)
+    lo, hi = _aligned_box(center, max(radius, near), cell)
+    return lo - cell, hi + cell
+
+
+def query_world(world, center, radius, near, detail=2, far="cells"):
+    """
+    Collects what the viewer should draw around center.
+
+    Args:
+        world: The WorldStore.
+        center: (x, y, z) the camera looks at.
+        radius: Half-size in blocks of the whole box returned.
+        near: Half-size of the box around center returned block by block.
+        detail: Index into CELL_SIZES for the summaries beyond near.
+        far: One of FAR_MODES.
+
+    Returns:
+        tuple: ((N, 3) float32 centres, (N,) float32 edge lengths, (N,)
+        palette IDs with AIR_ID for occupancy summaries, (N,) uint8 fill).
+    """
+    cell = _cell_size(detail, far)
+    # Both boxes are aligned to the cell grid so no cell straddles them.
+    near_lo, near_hi = _aligned_box(center, near, cell)
+    far_lo, far_hi = _aligned_box(center, max(radius, near), cell)
+
+    coords, ids = exposed_blocks(world, near_lo, near_hi)
+    centres = [coords.astype(np.float32)]
+    sizes = [np.ones(len(coords), dtype=np.float32)]
+    block_ids = [ids.astype(np.uint16)]
+    fills = [np.full(len(coords), 255, dtype=np.uint8)]
+
+    if far == "occupancy":
+        with world.lock:
+            keys = np.array(list(world.section_counts), dtype=np.int64).reshape(-1, 3)
+            counts = np.array([world.section_counts[tuple(key)] for key in keys.tolist()], dtype=np.int64)
+        cells, top, fill = keys, np.zeros(len(keys), dtype=np.uint16), counts
+    else:
+        cells, top, fill = summarize_sections(world.export_sections(far_lo, far_hi), cell)
+
+    origin = cells * cell
+    inside = np.all((origin >= far_lo) & (origin <= far_hi), axis=1)
+    inside &= ~np.all((origin >= near_lo) & (origin <= near_hi), axis=1)
+    inside &= fill > 0
+    cells, top, fill, origin = cells[inside], top[inside], fill[inside], origin[inside]
+    if far == "cells":
+        keep = visible_cells(cells, fill == cell ** 3)
+    elif far == "surface":
+        keep = surface_cells(cells)
+    else:
+        keep = np.ones(len(cells), dtype=bool)
+
+    centres.append((origin[keep] + (cell - 1) / 2).astype(np.float32))
+    sizes.append(np.full(int(keep.sum()), cell, dtype=np.float32))
+    block_ids.append(top[keep].astype(np.uint16))
+    fills.append(np.ceil(fill[keep] * 255 / cell ** 3).astype(np.uint8))
+    return np.concatenate(centres), np.concatenate(sizes), np.concatenate(block_ids), np.concatenate(fills)
+
+
+def encode_query(version, centres, sizes, colors, fills, turtles):
+    """
+    Packs query_world's result into the response layout.
+
+    Args:
+        colors: (N, 3) uint8 RGB per instance.
+        turtles: (T, 3) turtle positions.
+    """
+    turtles = np.asarray(turtles, dtype=np.float32).reshape(-1, 3)
+    instances = np.empty((len(centres), 4), dtype="<f4")
+    instances[:, :3] = centres
+    instances[:, 3] = sizes
+    return b"".join([
+        QUERY_HEADER.pack(version, len(instances), len(turtles)),
+        instances.tobytes(),
+        turtles.astype("<f4").tobytes(),
+        np.ascontiguousarray(colors, dtype=np.uint8).tobytes(),
+        np.ascontiguousarray(fills, dtype=np.uint8).tobytes(),
+    ])
+
+
+def encode_unchanged(version, turtles):
+    """A response with only the turtles, for a viewer whose blocks are current."""
+    turtles = np.asarray(turtles, dtype="<f4").reshape(-1, 3)
+    return QUERY_HEADER.pack(version, UNCHANGED, len(turtles)) + turtles.tobytes()
@@ -0,0 +1,822 @@
+import functools
+import threading
+
+import numpy as np
+
+
+# --- Constants ---
+# Chunks are 16x16 columns (matching get_chunk_center in app.py), split
+# vertically into 16-block sections.
+SECTION_SIZE = 16
+SECTION_SHAPE = (SECTION_SIZE, SECTION_SIZE, SECTION_SIZE)
+# Bytes of observed bits per section (see ObservedMap).
+SECTION_BYTES = SECTION_SIZE ** 3 // 8
+# ObservedMap.observe numbers sections directly when the points span at
+# most this many (a 3x3x3 block of sections, more than one scan reaches).
+_DENSE_SECTIONS = 27
+
+# Palette index 0 is reserved for "nothing known here" / air.
+AIR_ID = 0
+AIR_NAMES = {"minecraft:air", "minecraft:cave_air", "minecraft:void_air"}
+
+# Packed coordinates: 26 bits for x and z, 12 bits for y. This covers the
+# whole +-30M Minecraft world border and every buildable y level.
+_XZ_OFFSET = 1 << 25
+_Y_OFFSET = 1 << 11
+
+
+def pack_coords(coords):
+    """Packs an (N, 3) array of x, y, z coordinates into single int64 keys."""
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    return (
+        ((coords[:, 0] + _XZ_OFFSET) << 38)
+        | ((coords[:, 2] + _XZ_OFFSET) << 12)
+        | (coords[:, 1] + _Y_OFFSET)
+    )
+
+
+def unpack_coords(packed):
+    """Inverse of pack_coords, returning an (N, 3) int64 array."""
+    packed = np.asarray(packed, dtype=np.int64).reshape(-1)
+    coords = np.empty((packed.shape[0], 3), dtype=np.int64)
+    coords[:, 0] = ((packed >> 38) & 0x3FFFFFF) - _XZ_OFFSET
+    coords[:, 1] = (packed & 0xFFF) - _Y_OFFSET
+    coords[:, 2] = ((packed >> 12) & 0x3FFFFFF) - _XZ_OFFSET
+    return coords
+
+
+def section_keys(coords):
+    """Returns the distinct (chunk_x, section_y, chunk_z) keys of the sections holding some blocks."""
+    keys = np.unique(pack_coords(np.asarray(coords, dtype=np.int64).reshape(-1, 3) >> 4))
+    return [tuple(key) for key in unpack_coords(keys).tolist()]
+
+
+def section_key(x, y, z):
+    """Returns the (chunk_x, section_y, chunk_z) key of the section holding a block."""
+    return (x >> 4, y >> 4, z >> 4)
+
+
+class BlockIndex:
+    """
+    Inverted index from palette index to the coordinates of every block of
+    that type.
+
+    Coordinates for each block type live in one growable (N, 3) array, with a
+    packed-coordinate -> row map so removals just move rows from the end
+    into the freed slots. Nearest-block queries are a single vectorized pass over the
+    rows of that block type, independent of how big the rest of the world is.
+
+    After restore() the row maps are only built for a block type once it is
+    first changed, so loading a snapshot creates no per-block objects.
+    """
+
+    def __init__(self):
+        self.coords = {}  # block_id -> (capacity, 3) int64 array
+        self.keys = {}    # block_id -> (capacity,) packed coords of those rows
+        self.counts = {}  # block_id -> number of rows in use
+        self.rows = {}    # block_id -> {packed coord: row}
+
+    def _rows(self, block_id):
+        rows = self.rows.get(block_id)
+        if rows is None:
+            rows = self.rows[block_id] = {}
+            store = self.coords.get(block_id)
+            if store is not None:
+                used = self.counts[block_id]
+                keys = self.keys[block_id] = np.empty(store.shape[0], dtype=np.int64)
+                keys[:used] = pack_coords(store[:used])
+                rows.update(zip(keys[:used].tolist(), range(used)))
+        return rows
+
+    def dump(self, palette_size):
+        """
+        Returns (coords, counts): every indexed coordinate ordered by block
+        ID, and the number of rows for each ID below palette_size.
+        """
+        counts = np.array([self.count(block_id) for block_id in range(palette_size)], dtype=np.int64)
+        coords = [self.get(block_id) for block_id in range(palette_size)]
+        return np.concatenate(coords) if coords else np.empty((0, 3), dtype=np.int64), counts
+
+    def restore(self, coords, counts):
+        """Loads the output of dump(). The rows of each block type are views into coords."""
+        ends = np.cumsum(counts).tolist()
+        for block_id, (count, end) in enumerate(zip(counts.tolist(), ends)):
+            if count:
+                self.coords[block_id] = coords[end - count:end]
+                self.counts[block_id] = count
+
+    def count(self, block_id):
+        return self.counts.get(block_id, 0)
+
+    def get(self, block_id):
+        """Returns the (N, 3) coordinates of every indexed block with this ID."""
+        coords = self.coords.get(block_id)
+        if coords is None:
+            return np.empty((0, 3), dtype=np.int64)
+        return coords[:self.counts[block_id]]
+
+    def add(self, block_id, coords):
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+        if block_id == AIR_ID or coords.shape[0] == 0:
+            return
+        rows = self._rows(block_id)
+        packed = pack_coords(coords)
+        fresh = [i for i, key in enumerate(packed.tolist()) if key not in rows]
+        if not fresh:
+            return
+        coords, packed = coords[fresh], packed[fresh]
+
+        used = self.counts.get(block_id, 0)
+        needed = used + coords.shape[0]
+        store = self.coords.get(block_id)
+        if store is None or store.shape[0] < needed:
+            capacity = max(needed, 2 * used, 16)
+            grown = np.empty((capacity, 3), dtype=np.int64)
+            grown_keys = np.empty(capacity, dtype=np.int64)
+            if store is not None:
+                grown[:used] = store[:used]
+                grown_keys[:used] = self.keys[block_id][:used]
+            store = self.coords[block_id] = grown
+            self.keys[block_id] = grown_keys
+        store[used:needed] = coords
+        self.keys[block_id][used:needed] = packed
+        rows.update(zip(packed.tolist(), range(used, needed)))
+        self.counts[block_id] = needed
+
+    def remove(self, block_id, coords):
+        if not self.count(block_id):
+            return
+        rows = self._rows(block_id)
+        removed = [rows.pop(key, None) for key in pack_coords(coords).tolist()]
+        removed = np.array([row for row in removed if row is not None], dtype=np.int64)
+        if not removed.size:
+            return
+
+        # Surviving rows past the new end move down into the freed rows
+        # below it; there are exactly as many of each.
+        used = self.counts[block_id]
+        remaining = used - removed.size
+        holes = np.sort(removed[removed < remaining])
+        tail = np.setdiff1d(np.arange(remaining, used), removed, assume_unique=True)
+        store, keys = self.coords[block_id], self.keys[block_id]
+        store[holes] = store[tail]
+        keys[holes] = keys[tail]
+        rows.update(zip(keys[holes].tolist(), holes.tolist()))
+        self.counts[block_id] = remaining
+
+    def nearest(self, block_id, point, k=None):
+        """
+        Returns indexed coordinates of this block type ordered by distance
+        from a point: the k nearest if k is given, otherwise all of them.
+        """
+        coords = self.get(block_id)
+        if coords.shape[0] == 0:
+            return coords
+        offsets = coords - np.asarray(point, dtype=np.int64)
+        dist = np.einsum('ij,ij->i', offsets, offsets)
+        if k is not None and k < coords.shape[0]:
+            nearest = np.argpartition(dist, k)[:k]
+            return coords[nearest[np.argsort(dist[nearest], kind="stable")]]
+        return coords[np.argsort(dist, kind="stable")]
+
+
+@functools.lru_cache(maxsize=None)
+def sphere_offsets(radius):
+    """(N, 3) offsets of every block within radius of a centre, the centre included."""
+    axis = np.arange(-radius, radius + 1, dtype=np.int64)
+    offsets = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1).reshape(-1, 3)
+    offsets = offsets[(offsets * offsets).sum(axis=1) <= radius * radius]
+    offsets.setflags(write=False)
+    return offsets
+
+
+class ObservedMap:
+    """
+    Which positions a turtle has observed, one bit per block, kept apart
+    from block identity.
+
+    The store holds AIR_ID both for scanned air and for space nobody has
+    looked at. This map tells the two apart, so planners can charge more
+    for unknown space, which is mostly rock a turtle would have to dig
+    through unplanned. Only positions that read as AIR_ID need their bit:
+    a stored block is known whatever its bit says.
+
+    Bits are kept per section of each chunk column, like the store's
+    sections: a (SECTION_BYTES,) uint8 array of the section's [x, y, z]
+    cells, packed eight to a byte, little-endian bit order. A section takes
+    no memory until something in it is observed. box() gathers the
+    overlapping sections and unpacks them in one call, so reading a
+    planning box costs about what WorldStore.box_ids does.
+
+    Shares the world store's lock. Listeners are called as listener(keys,
+    bits) under it, with the (N, 3) section keys that gained bits and the
+    (N, SECTION_BYTES) bits they gained.
+    """
+
+    def __init__(self, lock=None):
+        self.columns = {}  # (chunk_x, chunk_z) -> {section_y: (SECTION_BYTES,) uint8 bits}
+        self.section_count = 0
+        self.listeners = []
+        self.lock = lock if lock is not None else threading.RLock()
+
+    @classmethod
+    def from_sections(cls, sections):
+        """Builds a map from {(chunk_x, section_y, chunk_z): bits}, as returned by export_sections."""
+        observed = cls()
+        for (cx, sy, cz), bits in sections.items():
+            observed.columns.setdefault((cx, cz), {})[sy] = bits
+            observed.section_count += 1
+        return observed
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def sections(self):
+        """Yields ((chunk_x, section_y, chunk_z), bits) for every section with observed blocks."""
+        for (cx, cz), column in self.columns.items():
+            for sy, bits in column.items():
+                yield (cx, sy, cz), bits
+
+    def count(self):
+        """Observed positions, counted from the bits."""
+        with self.lock:
+            return sum(int(np.unpackbits(bits).sum()) for _, bits in self.sections())
+
+    # --- Snapshots ---
+    def dump(self):
+        """Returns (section keys, (N, SECTION_BYTES) bits) for snapshots."""
+        with self.lock:
+            keys, bits = [], []
+            for key, section in self.sections():
+                keys.append(key)
+                bits.append(section)
+            return (np.array(keys, dtype=np.int64).reshape(-1, 3),
+                    np.stack(bits) if bits else np.empty((0, SECTION_BYTES), dtype=np.uint8))
+
+    def restore(self, keys, bits):
+        """Loads the output of dump() into an empty map; sections stay views into bits."""
+        with self.lock:
+            for (cx, sy, cz), section in zip(keys.tolist(), bits):
+                self.columns.setdefault((cx, cz), {})[sy] = section
+                self.section_count += 1
+
+    # --- Updates ---
+    def observe(self, centres, radius=0):
+        """Marks every position within radius of any of the (N, 3) centres as observed."""
+        centres = np.asarray(centres, dtype=np.int64).reshape(-1, 3)
+        if centres.shape[0] == 0:
+            return
+        points = (centres[:, None, :] + sphere_offsets(radius)).reshape(-1, 3)
+        x, y, z = points.T
+        cells = ((x & 15) << 8) | ((y & 15) << 4) | (z & 15)
+        # Column by column: reducing an (N, 3) array along axis 0 is slower.
+        low = np.array([v.min() for v in (x, y, z)]) >> 4
+        span = (np.array([v.max() for v in (x, y, z)]) >> 4) - low + 1
+        if span.prod() <= _DENSE_SECTIONS:
+            # A scan's worth of sections: number them in their bounding box
+            # instead of sorting out the distinct ones.
+            slots = ((x >> 4) - low[0]) * (span[1] * span[2]) + ((y >> 4) - low[1]) * span[2] + ((z >> 4) - low[2])
+            masks = np.zeros((span.prod(), SECTION_SIZE ** 3), dtype=bool)
+            masks[slots, cells] = True
+            used = np.flatnonzero(masks.any(axis=1))
+            keys = np.stack(np.unravel_index(used, span), axis=1) + low
+            masks = masks[used]
+        else:
+            keys, slots = np.unique(pack_coords(points >> 4), return_inverse=True)
+            keys = unpack_coords(keys)
+            masks = np.zeros((len(keys), SECTION_SIZE ** 3), dtype=bool)
+            masks[slots.reshape(-1), cells] = True
+        self.merge(keys, np.packbits(masks, axis=1, bitorder="little"))
+
+    def merge(self, keys, bits):
+        """ORs (N, SECTION_BYTES) bits into the sections with (N, 3) keys."""
+        with self.lock:
+            changed_keys, changed_bits = [], []
+            for (cx, sy, cz), section_bits in zip(np.asarray(keys).tolist(), bits):
+                column = self.columns.setdefault((cx, cz), {})
+                old = column.get(sy)
+                if old is None:
+                    fresh = column[sy] = section_bits.copy()
+                    self.section_count += 1
+                else:
+                    fresh = section_bits & ~old
+                    if not fresh.any():
+                        continue
+                    old |= fresh
+                changed_keys.append((cx, sy, cz))
+                changed_bits.append(fresh)
+            if changed_keys and self.listeners:
+                changed_keys = np.array(changed_keys, dtype=np.int64)
+                changed_bits = np.stack(changed_bits)
+                for listener in self.listeners:
+                    listener(changed_keys, changed_bits)
+
+    # --- Reads ---
+    def export_sections(self, min_corner, max_corner):
+        """Copies of the bits of every section overlapping an inclusive box, keyed like WorldStore's."""
+        lo = [int(v) >> 4 for v in min_corner]
+        hi = [int(v) >> 4 for v in max_corner]
+        sections = {}
+        with self.lock:
+            for cx in range(lo[0], hi[0] + 1):
+                for cz in range(lo[2], hi[2] + 1):
+                    for sy, bits in self.columns.get((cx, cz), {}).items():
+                        if lo[1] <= sy <= hi[1]:
+                            sections[(cx, sy, cz)] = bits.copy()
+        return sections
+
+    def export_keys(self, keys):
+        """Copies of the bits of the sections with these keys that have any, like export_sections."""
+        sections = {}
+        with self.lock:
+            for cx, sy, cz in keys:
+                bits = self.columns.get((cx, cz), {}).get(sy)
+                if bits is not None:
+                    sections[(cx, sy, cz)] = bits.copy()
+        return sections
+
+    def observed_at(self, coords):
+        """Returns a bool array of whether each of the (N, 3) positions was observed."""
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+        out = np.zeros(coords.shape[0], dtype=bool)
+        if coords.shape[0] == 0:
+            return out
+        keys, inverse = np.unique(pack_coords(coords >> 4), return_inverse=True)
+        cells = ((coords[:, 0] & 15) << 8) | ((coords[:, 1] & 15) << 4) | (coords[:, 2] & 15)
+        with self.lock:
+            for n, (cx, sy, cz) in enumerate(unpack_coords(keys).tolist()):
+                bits = self.columns.get((cx, cz), {}).get(sy)
+                if bits is None:
+                    continue
+                rows = np.flatnonzero(inverse.reshape(-1) == n)
+                out[rows] = (bits[cells[rows] >> 3] >> (cells[rows] & 7)) & 1
+        return out
+
+    def box(self, min_corner, max_corner):
+        """
+        Returns a dense bool array of observed positions for an inclusive
+        bounding box, indexed [x - min_x, y - min_y, z - min_z] like
+        WorldStore.box_ids.
+
+        The bits of every overlapping section are gathered and unpacked in
+        one go, and the sections laid out side by side with one transpose,
+        so the cost barely depends on how many sections there are.
+        """
+        lo = np.asarray(min_corner, dtype=np.int64).reshape(3)
+        hi = np.asarray(max_corner, dtype=np.int64).reshape(3)
+        lo_key, hi_key = (lo >> 4).tolist(), (hi >> 4).tolist()
+        counts = [h - l + 1 for l, h in zip(lo_key, hi_key)]
+        packed = np.zeros(counts + [SECTION_BYTES], dtype=np.uint8)
+        found = False
+        with self.lock:
+            for cx in range(lo_key[0], hi_key[0] + 1):
+                for cz in range(lo_key[2], hi_key[2] + 1):
+                    column = self.columns.get((cx, cz))
+                    if not column:
+                        continue
+                    for sy, bits in column.items():
+                        if lo_key[1] <= sy <= hi_key[1]:
+                            packed[cx - lo_key[0], sy - lo_key[1], cz - lo_key[2]] = bits
+                            found = True
+        start = lo - np.array(lo_key) * SECTION_SIZE
+        stop = start + hi - lo + 1
+        if not found:
+            return np.zeros((stop - start).tolist(), dtype=bool)
+        cells = np.unpackbits(packed, axis=-1, bitorder="little").view(bool)
+        cells = cells.reshape(counts + [SECTION_SIZE] * 3).transpose(0, 3, 1, 4, 2, 5)
+        cells = cells.reshape([n * SECTION_SIZE for n in counts])
+        return cells[start[0]:stop[0], start[1]:stop[1], start[2]:stop[2]]
+
+
+def _locked(method):
+    """Runs a WorldStore method while holding the store's lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class WorldStore:
+    """
+    Sparse, chunk-partitioned storage for every block the turtles have seen.
+
+    Blocks are grouped into 16x16 chunk columns, and each column into
+    16x16x16 sections. A section is a dense uint16 array of palette indices,
+    so point upserts and lookups are O(1) and a whole scan can be written
+    with a handful of fancy-index assignments.
+
+    Writes and multi-section reads hold a reentrant lock, so the store can
+    be shared between request threads. Listeners run under the same lock.
+
+    Which positions have been observed at all, air included, is kept in
+    observed (an ObservedMap), under the same lock.
+    """
+
+    def __init__(self):
+        # Palette shared by every section: index -> block name and back.
+        self.palette = ["minecraft:air"]
+        self.palette_ids = {"minecraft:air": AIR_ID}
+        # (chunk_x, chunk_z) -> {section_y: uint16 array indexed [x, y, z]}
+        self.chunks = {}
+        # (chunk_x, section_y, chunk_z) -> number of non-air blocks
+        self.section_counts = {}
+        self.block_count = 0
+        # Block name lookups go through this instead of scanning sections.
+        self.index = BlockIndex()
+        # Called as listener(coords, old_ids, new_ids) after blocks change.
+        self.listeners = []
+        self.lock = threading.RLock()
+        # Positions scans have reached, whatever is stored there.
+        self.observed = ObservedMap(self.lock)
+
+    def __len__(self):
+        return self.block_count
+
+    @classmethod
+    def from_sections(cls, sections, observed=None):
+        """
+        Builds a store from {(chunk_x, section_y, chunk_z): uint16 array}, as
+        returned by export_sections, and optionally the observed bits from
+        ObservedMap.export_sections. The block name index is not populated,
+        so this is meant for read-only copies such as planning workers.
+        """
+        store = cls()
+        if observed:
+            store.observed = ObservedMap.from_sections(observed)
+        for (cx, sy, cz), section in sections.items():
+            count = int(np.count_nonzero(section))
+            if not count:
+                continue
+            store.chunks.setdefault((cx, cz), {})[sy] = section
+            store.section_counts[(cx, sy, cz)] = count
+            store.block_count += count
+        return store
+
+    @_locked
+    def dump(self):
+        """
+        Returns the whole store as a few flat arrays, for snapshots:
+        section keys, section contents, non-air counts per section, the
+        block name index as returned by BlockIndex.dump, and the observed
+        bits as returned by ObservedMap.dump.
+        """
+        keys, sections = [], []
+        for key, section in self.sections():
+            keys.append(key)
+            sections.append(section)
+        index_coords, index_counts = self.index.dump(len(self.palette))
+        observed_keys, observed = self.observed.dump()
+        return {
+            "section_keys": np.array(keys, dtype=np.int64).reshape(-1, 3),
+            "sections": np.stack(sections) if sections else np.empty((0,) + SECTION_SHAPE, dtype=np.uint16),
+            "section_counts": np.array([self.section_counts[key] for key in keys], dtype=np.int64),
+            "index_coords": index_coords,
+            "index_counts": index_counts,
+            "observed_keys": observed_keys,
+            "observed": observed,
+        }
+
+    @_locked
+    def restore(self, palette, section_keys, sections, section_counts, index_coords, index_counts,
+                observed_keys=None, observed=None):
+        """
+        Loads arrays from dump() into an empty store. The arrays can be
+        copy-on-write memory maps: sections and index rows stay views into
+        them, so only the pages that are actually touched get read.
+        Snapshots from before the observed bits were kept have none.
+        """
+        for name in palette[len(self.palette):]:
+            self.palette_ids[name] = len(self.palette)
+            self.palette.append(name)
+        for (cx, sy, cz), section, count in zip(section_keys.tolist(), sections, section_counts.tolist()):
+            self.chunks.setdefault((cx, cz), {})[sy] = section
+            self.section_counts[(cx, sy, cz)] = count
+            self.block_count += count
+        self.index.restore(index_coords, index_counts)
+        if observed_keys is not None:
+            self.observed.restore(observed_keys, observed)
+
+    def add_listener(self, listener):
+        """
+        Registers a callback for block changes. It receives (coords, old_ids,
+        new_ids) arrays for the positions whose stored value changed.
+        """
+        self.listeners.append(listener)
+
+    def _notify(self, coords, old_ids, new_ids):
+        for listener in self.listeners:
+            listener(coords, old_ids, new_ids)
+
+    # --- Palette ---
+    @_locked
+    def name_id(self, name):
+        """Returns the palette index for a block name, adding it if new."""
+        if not name or name in AIR_NAMES:
+            return AIR_ID
+        block_id = self.palette_ids.get(name)
+        if block_id is None:
+            block_id = len(self.palette)
+            self.palette.append(name)
+            self.palette_ids[name] = block_id
+        return block_id
+
+    def names_to_ids(self, names):
+        """Converts a sequence of block names into a uint16 array of palette indices."""
+        return np.fromiter((self.name_id(n) for n in names), dtype=np.uint16, count=len(names))
+
+    # --- Sections ---
+    def get_section(self, cx, sy, cz, create=False):
+        column = self.chunks.get((cx, cz))
+        if column is None:
+            if not create:
+                return None
+            column = self.chunks[(cx, cz)] = {}
+        section = column.get(sy)
+        if section is None and create:
+            section = column[sy] = np.zeros(SECTION_SHAPE, dtype=np.uint16)
+            self.section_counts[(cx, sy, cz)] = 0
+        return section
+
+    def _drop_section(self, cx, sy, cz):
+        column = self.chunks[(cx, cz)]
+        del column[sy]
+        if not column:
+            del self.chunks[(cx, cz)]
+        del self.section_counts[(cx, sy, cz)]
+
+    def sections(self):
+        """Yields ((chunk_x, section_y, chunk_z), section_array) for every stored section."""
+        for (cx, cz), column in self.chunks.items():
+            for sy, section in column.items():
+                yield (cx, sy, cz), section
+
+    # --- Point access ---
+    def get_id(self, x, y, z):
+        section = self.get_section(x >> 4, y >> 4, z >> 4)
+        if section is None:
+            return AIR_ID
+        return int(section[x & 15, y & 15, z & 15])
+
+    @_locked
+    def ids_at(self, coords):
+        """
+        Returns the palette indices at an (N, 3) array of positions, AIR_ID
+        where unknown, with one gather per section touched.
+        """
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+        out = np.zeros(coords.shape[0], dtype=np.uint16)
+        if coords.shape[0] == 0:
+            return out
+        keys = pack_coords(coords >> 4)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        for n, (cx, sy, cz) in enumerate(unpack_coords(unique).tolist()):
+            section = self.get_section(cx, sy, cz)
+            if section is None:
+                continue
+            rows = np.flatnonzero(inverse == n)
+            local = coords[rows] & 15
+            out[rows] = section[local[:, 0], local[:, 1], local[:, 2]]
+        return out
+
+    def get_name(self, x, y, z):
+        """Returns the block name at a position, or None if it is air or unknown."""
+        block_id = self.get_id(x, y, z)
+        return self.palette[block_id] if block_id != AIR_ID else None
+
+    @_locked
+    def set_block(self, x, y, z, name):
+        """
+        Upserts a single block. Passing an air name (or None) removes the block.
+
+        Returns:
+            int: The palette index that was previously stored at the position.
+        """
+        block_id = self.name_id(name)
+        cx, sy, cz = x >> 4, y >> 4, z >> 4
+        section = self.get_section(cx, sy, cz, create=block_id != AIR_ID)
+        if section is None:
+            return AIR_ID
+
+        local = (x & 15, y & 15, z & 15)
+        old_id = int(section[local])
+        if old_id == block_id:
+            return old_id
+
+        section[local] = block_id
+        point = ((x, y, z),)
+        self.index.remove(old_id, point)
+        self.index.add(block_id, point)
+        delta = (block_id != AIR_ID) - (old_id != AIR_ID)
+        if delta:
+            key = (cx, sy, cz)
+            self.section_counts[key] += delta
+            self.block_count += delta
+            if self.section_counts[key] == 0:
+                self._drop_section(cx, sy, cz)
+        if self.listeners:
+            self._notify(
+                np.array(point, dtype=np.int64),
+                np.array([old_id], dtype=np.uint16),
+                np.array([block_id], dtype=np.uint16),
+            )
+        return old_id
+
+    def remove_block(self, x, y, z):
+        return self.set_block(x, y, z, None)
+
+    # --- Bulk access ---
+    @_locked
+    def insert_many(self, coords, names):
+        """Bulk upsert of a whole scan given block names. See insert_ids."""
+        return self.insert_ids(coords, self.names_to_ids(names))
+
+    @_locked
+    def insert_ids(self, coords, ids):
+        """
+        Bulk upsert of palette indices at the given coordinates.
+
+        Duplicate coordinates within one batch resolve to the last entry,
+        and AIR_ID entries remove whatever was stored there.
+
+        Args:
+            coords: (N, 3) array-like of x, y, z block coordinates.
+            ids: (N,) array-like of palette indices.
+
+        Returns:
+            tuple: (coords, old_ids, new_ids) arrays for the blocks whose
+            stored value actually changed.
+        """
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+        ids = np.asarray(ids, dtype=np.uint16).reshape(-1)
+        empty = (np.empty((0, 3), dtype=np.int64), np.empty(0, dtype=np.uint16), np.empty(0, dtype=np.uint16))
+        if coords.shape[0] == 0:
+            return empty
+
+        # Keep only the last write for each coordinate.
+        packed = pack_coords(coords)
+        _, last = np.unique(packed[::-1], return_index=True)
+        keep = coords.shape[0] - 1 - last
+        coords, ids = coords[keep], ids[keep]
+
+        # Group the batch by section.
+        keys = coords >> 4
+        _, inverse = np.unique(pack_coords(keys), return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+
+        changed_coords, changed_old, changed_new = [], [], []
+        for group in np.split(order, bounds):
+            cx, sy, cz = (int(v) for v in keys[group[0]])
+            new = ids[group]
+            section = self.get_section(cx, sy, cz, create=bool(new.any()))
+            if section is None:
+                continue
+
+            local = coords[group] & 15
+            lx, ly, lz = local[:, 0], local[:, 1], local[:, 2]
+            old = section[lx, ly, lz]
+            diff = old != new
+            if not diff.any():
+                continue
+            section[lx, ly, lz] = new
+
+            delta = int(np.count_nonzero(new)) - int(np.count_nonzero(old))
+            if delta:
+                key = (cx, sy, cz)
+                self.section_counts[key] += delta
+                self.block_count += delta
+                if self.section_counts[key] == 0:
+                    self._drop_section(cx, sy, cz)
+
+            changed_coords.append(coords[group][diff])
+            changed_old.append(old[diff])
+            changed_new.append(new[diff])
+
+        if not changed_coords:
+            return empty
+        changed_coords = np.concatenate(changed_coords)
+        changed_old = np.concatenate(changed_old)
+        changed_new = np.concatenate(changed_new)
+        self._reindex(changed_coords, changed_old, changed_new)
+        self._notify(changed_coords, changed_old, changed_new)
+        return changed_coords, changed_old, changed_new
+
+    def _reindex(self, coords, old_ids, new_ids):
+        for block_id in np.unique(old_ids[old_ids != AIR_ID]).tolist():
+            self.index.remove(block_id, coords[old_ids == block_id])
+        for block_id in np.unique(new_ids[new_ids != AIR_ID]).tolist():
+            self.index.add(block_id, coords[new_ids == block_id])
+
+    def _collect(self, sections):
+        coords_list, ids_list = [], []
+        for (cx, sy, cz), section, mask in sections:
+            local = np.argwhere(mask)
+            if local.size == 0:
+                continue
+            ids_list.append(section[local[:, 0], local[:, 1], local[:, 2]])
+            coords_list.append(local + np.array([cx << 4, sy << 4, cz << 4], dtype=np.int64))
+        if not coords_list:
+            return np.empty((0, 3), dtype=np.int64), np.empty(0, dtype=np.uint16)
+        return np.concatenate(coords_list), np.concatenate(ids_list)
+
+    @_locked
+    def blocks(self):
+        """Returns (coords, ids) arrays for every known non-air block."""
+        return self._collect((key, s, s != AIR_ID) for key, s in self.sections())
+
+    @_locked
+    def find_blocks(self, name):
+        """Returns an (N, 3) array with the coordinates of every block with this name."""
+        block_id = self.palette_ids.get(name)
+        if block_id is None:
+            return np.empty((0, 3), dtype=np.int64)
+        return self.index.get(block_id).copy()
+
+    @_locked
+    def nearest_blocks(self, name, point, k=None):
+        """Returns coordinates of blocks with this name, nearest to a point first."""
+        block_id = self.palette_ids.get(name)
+        if block_id is None:
+            return np.empty((0, 3), dtype=np.int64)
+        return self.index.nearest(block_id, point, k)
+
+    @_locked
+    def export_sections(self, min_corner, max_corner):
+        """
+        Returns copies of every stored section overlapping an inclusive
+        bounding box, as {(chunk_x, section_y, chunk_z): uint16 array}.
+        """
+        lo = [int(v) >> 4 for v in min_corner]
+        hi = [int(v) >> 4 for v in max_corner]
+        sections = {}
+        for cx in range(lo[0], hi[0] + 1):
+            for cz in range(lo[2], hi[2] + 1):
+                for sy, section in self.chunks.get((cx, cz), {}).items():
+                    if lo[1] <= sy <= hi[1]:
+                        sections[(cx, sy, cz)] = section.copy()
+        return sections
+
+    @_locked
+    def export_keys(self, keys):
+        """Copies of the stored sections among these (chunk_x, section_y, chunk_z) keys, like export_sections."""
+        sections = {}
+        for cx, sy, cz in keys:
+            section = self.get_section(cx, sy, cz)
+            if section is not None:
+                sections[(cx, sy, cz)] = section.copy()
+        return sections
+
+    @_locked
+    def box_ids(self, min_corner, max_corner):
+        """
+        Returns a dense uint16 array of palette indices for an inclusive
+        bounding box, indexed [x - min_x, y - min_y, z - min_z]. Unknown
+        positions read as AIR_ID.
+
+        Each overlapping section is copied in with one slice assignment, so
+        the cost depends on the number of sections, not the number of blocks.
+        """
+        lo = [int(v) for v in min_corner]
+        hi = [int(v) for v in max_corner]
+        out = np.zeros((hi[0] - lo[0] + 1, hi[1] - lo[1] + 1, hi[2] - lo[2] + 1), dtype=np.uint16)
+        for cx in range(lo[0] >> 4, (hi[0] >> 4) + 1):
+            for cz in range(lo[2] >> 4, (hi[2] >> 4) + 1):
+                column = self.chunks.get((cx, cz))
+                if not column:
+                    continue
+                for sy, section in column.items():
+                    if not (lo[1] >> 4) <= sy <= (hi[1] >> 4):
+                        continue
+                    origin = (cx << 4, sy << 4, cz << 4)
+                    # Overlap of this section with the box, in world coordinates.
+                    start = [max(lo[i], origin[i]) for i in range(3)]
+                    stop = [min(hi[i], origin[i] + 15) + 1 for i in range(3)]
+                    out[start[0] - lo[0]:stop[0] - lo[0],
+                        start[1] - lo[1]:stop[1] - lo[1],
+                        start[2] - lo[2]:stop[2] - lo[2]] = section[
+                            start[0] - origin[0]:stop[0] - origin[0],
+                            start[1] - origin[1]:stop[1] - origin[1],
+                            start[2] - origin[2]:stop[2] - origin[2]]
+        return out
+
+    @_locked
+    def blocks_in_box(self, min_corner, max_corner):
+        """Returns (coords, ids) for known blocks inside an inclusive bounding box."""
+        lo = np.asarray(min_corner, dtype=np.int64)
+        hi = np.asarray(max_corner, dtype=np.int64)
+        lo_key, hi_key = lo >> 4, hi >> 4
+
+        def overlapping():
+            for cx in range(lo_key[0], hi_key[0] + 1):
+                for cz in range(lo_key[2], hi_key[2] + 1):
+                    column = self.chunks.get((cx, cz))
+                    if not column:
+                        continue
+                    for sy, section in column.items():
+                        if lo_key[1] <= sy <= hi_key[1]:
+                            yield (cx, sy, cz), section, section != AIR_ID
+
+        coords, ids = self._collect(overlapping())
+        inside = np.all((coords >= lo) & (coords <= hi), axis=1)
+        return coords[inside], ids[inside]